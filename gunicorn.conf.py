@@ -0,0 +1,52 @@
+# Pre-fork server configuration, used by docker compose: gunicorn -c gunicorn.conf.py
+# The app is imported once by the master (preload_app), MongoClient is only created in each worker after fork
+import logging
+import multiprocessing
+import os
+import time
+
+# config is loaded first by the master, start of the cold start logged once it listens
+STARTED_AT = time.perf_counter()
+
+wsgi_app = "src.server.flask.app:app"
+bind = f"0.0.0.0:{os.environ.get('FLASK_PORT', 5000)}"
+# one process per core, requests waiting on MongoDB are overlapped by the threads of each worker
+workers = int(os.environ.get('GUNICORN_WORKERS') or multiprocessing.cpu_count())
+worker_class = "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers to bound memory growth, jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+# heartbeat files on tmpfs, a slow container disk doesn't make the master kill healthy workers
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+errorlog = "-"
+
+
+def on_starting(server):
+    """
+    Check configuration in the master before loading the app, MongoDB isn't waited for
+    """
+    from src.server.flask.app import check_config
+    check_config()
+
+
+def when_ready(server):
+    """
+    Log cold start time of the master, from loading this config to listening
+    """
+    logging.info(f"Listening after {(time.perf_counter() - STARTED_AT) * 1000:.0f}ms")
+
+
+def post_worker_init(worker):
+    """
+    Warm up each worker before it accepts requests: create its MongoClient and repository layers,
+    which connect to MongoDB in the background
+    """
+    start = time.perf_counter()
+    from src.server.flask.app import init_server_repository
+    init_server_repository()
+    logging.info(f"Worker {worker.pid} ready in {(time.perf_counter() - start) * 1000:.0f}ms")
@@ -0,0 +1,212 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, List, Optional, Union
+from src.db.odm_blog import Comment, EncodedMessage, Like, Message, MessageThread, NewMessage, Post, User
+from src.db.repository import encode_message
+from src.server.flask.exceptions import BlogAppException
+
+SERVER_ASYNC_REPOSITORY:Optional['AsyncRepository'] = None
+
+
+class AsyncRepository(ABC):
+    """
+    Coroutine version of Repository, used by the ASGI app so a request waiting on the db doesn't hold a thread.
+    Every method has the arguments, result and errors of the Repository method of the same name
+    """
+
+    @abstractmethod
+    async def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
+        """
+        Get Lists of up to posts_limit posts from the db, newest first, see Repository.get_posts_blog
+        """
+        pass
+
+
+    async def iter_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->AsyncIterator[Post]:
+        """
+        Iterate over the same posts as get_posts_blog, for streaming responses, see Repository.iter_posts_blog
+        """
+        for post in await self.get_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor):
+            yield post
+
+
+    async def get_posts_json_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[EncodedMessage]:
+        """
+        Get the posts of get_posts_blog encoded as the json objects returned by the API,
+        see Repository.get_posts_json_blog
+        """
+        return [encode_message(post) for post in
+                await self.get_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)]
+
+
+    @abstractmethod
+    async def get_message_blog(self, message_id:str, user_id_owner:str='')->Message:
+        """
+        Get message from db, see Repository.get_message_blog
+        """
+        pass
+
+
+    async def get_message_json_blog(self, message_id:str)->EncodedMessage:
+        """
+        Get message encoded as the json object returned by the API, see Repository.get_message_json_blog
+        """
+        return encode_message(await self.get_message_blog(message_id))
+
+
+    @abstractmethod
+    async def get_message_version_blog(self, message_id:str)->int:
+        """
+        Get only the version of message, see Repository.get_message_version_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_feed_version_blog(self)->int:
+        """
+        Get the posts feed version, see Repository.get_feed_version_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_messages_blog(self, message_ids:List[str])->List[Optional[Message]]:
+        """
+        Get messages of several message_ids at once, see Repository.get_messages_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_comments_blog(self, message_id:str, comments_limit:int, cursor:str = '')->List[Comment]:
+        """
+        Get up to comments_limit direct replies of message, oldest first, see Repository.get_comments_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_thread_blog(self, message_id:str, max_depth:int, limit:int)->MessageThread:
+        """
+        Get message with the tree of its replies, see Repository.get_thread_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_message_descendant_ids_blog(self, message_id:str)->List[str]:
+        """
+        Get message_id of every reply in the thread under message, see Repository.get_message_descendant_ids_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def create_message_blog(self, content:str, user_id_owner: str, reply_to_message_id:str)->Message:
+        """
+        Create message and return Message with db message_id, see Repository.create_message_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
+        """
+        Create a batch of messages, each message is created or fails on its own, see Repository.create_messages_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
+        """
+        Change content field of message, see Repository.edit_message_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
+        """
+        Delete message from db with its whole thread, see Repository.delete_message_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def add_message_like(self, message_id:str, user_id:str)->bool:
+        """
+        Add a like of user_id to message, see Repository.add_message_like
+        """
+        pass
+
+
+    @abstractmethod
+    async def remove_message_like(self, message_id:str, user_id:str)->bool:
+        """
+        Remove the like of user_id from message, see Repository.remove_message_like
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_message_likes_blog(self, message_id:str, likes_limit:int, cursor:str = '')->List[Like]:
+        """
+        Get up to likes_limit likes of message, newest first, see Repository.get_message_likes_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def is_message_liked(self, message_id:str, user_id:str)->bool:
+        """
+        Check if user_id likes message, see Repository.is_message_liked
+        """
+        pass
+
+
+    @abstractmethod
+    async def create_user_blog(self, user_id: str, password:str, email:str, name:str, roles:List[str])->User:
+        """
+        Create new user_id in Database, see Repository.create_user_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def get_user_blog(self, user_id:str)->User:
+        """
+        Get User object from Database, see Repository.get_user_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def update_user_details_blog(self, user_id: str,password:str = '', email:str = '', name:str= '')->User:
+        """
+        Update fields for user_id inserted, see Repository.update_user_details_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def delete_user_blog(self, user_id:str)->Union[User,None]:
+        """
+        Delete user from Database, see Repository.delete_user_blog
+        """
+        pass
+
+
+    @abstractmethod
+    async def add_user_role(self, user_id:str, role: str)->bool:
+        """
+        Add role to user, see Repository.add_user_role
+        """
+        pass
+
+    @abstractmethod
+    async def remove_user_role(self, user_id:str, role:str)->bool:
+        """
+        Remove role from user, see Repository.remove_user_role
+        """
+        pass
@@ -0,0 +1,305 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from src.db.delegating_repository import DelegatingRepository
+from src.db.odm_blog import EncodedMessage, Message
+from src.db.repository import Repository
+from src.server.flask.exceptions import ResourceNotFoundError
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+REPOSITORY_CACHE_ENABLED:bool = os.environ.get('REPOSITORY_CACHE_ENABLED', 'true').lower()=='true'
+REPOSITORY_CACHE_MAX_SIZE:int = int(os.environ.get('REPOSITORY_CACHE_MAX_SIZE', 10000))
+REPOSITORY_CACHE_TTL_SECONDS:float = float(os.environ.get('REPOSITORY_CACHE_TTL_SECONDS', 60))
+# the cache is process local and writes of other workers don't invalidate it: a cached message is served without
+# checking its version against the db for at most this long, 0 is a strict mode checking it on every read
+REPOSITORY_CACHE_REVALIDATE_SECONDS:float = float(os.environ.get('REPOSITORY_CACHE_REVALIDATE_SECONDS', 1))
+
+
+class EncodedMessageCache:
+    """
+    Bounded LRU cache of encoded messages keyed by message_id, entries expire after ttl_seconds
+    and must be revalidated against the db version of their message after revalidate_seconds.
+    Every invalidation advances a generation, a value read from the db before an invalidation isn't cached,
+    so a read racing with a write can't put back the message as it was before the write
+    """
+    def __init__(self, max_size:int = REPOSITORY_CACHE_MAX_SIZE, ttl_seconds:float = REPOSITORY_CACHE_TTL_SECONDS,
+                 revalidate_seconds:float = REPOSITORY_CACHE_REVALIDATE_SECONDS):
+        self._max_size:int = max_size
+        self._ttl_seconds:float = ttl_seconds
+        self._revalidate_seconds:float = revalidate_seconds
+        # message_id to encoded message, expiry time and time it must be revalidated
+        self._entries:OrderedDict[str, Tuple[EncodedMessage, float, float]] = OrderedDict()
+        # reply_to_message_id to the cached messages replying to it
+        self._replies:Dict[str, Set[str]] = {}
+        self._lock:Lock = Lock()
+        self._generation:int = 0
+        self.hits:int = 0
+        self.misses:int = 0
+        self.evictions:int = 0
+        self.expirations:int = 0
+        self.invalidations:int = 0
+        self.stale_puts:int = 0
+        self.revalidations:int = 0
+        self.stale_entries:int = 0
+
+    @property
+    def generation(self)->int:
+        """
+        Number of invalidations so far, taken before a db read and passed to put
+        """
+        return self._generation
+
+    def get(self, message_id:str)->Optional[Tuple[EncodedMessage, bool]]:
+        """
+        Get cached encoded message
+        :param message_id: unique identifier for message
+        :return: EncodedMessage and True if it must be revalidated before it is served,
+            or None if message_id isn't cached or entry expired
+        """
+        with self._lock:
+            entry = self._entries.get(message_id)
+            now:float = time.monotonic()
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    self.__remove(message_id)
+                    self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(message_id)
+            self.hits += 1
+            return entry[0], entry[2] <= now
+
+    def revalidate(self, encoded_message:EncodedMessage, version:int)->bool:
+        """
+        Check a cached message against the version of its message read from the db,
+        a message with another version is removed from cache
+        :param encoded_message: cached message returned by get
+        :param version: version of message in db
+        :return: True if the cached message is up to date
+        """
+        with self._lock:
+            self.revalidations += 1
+            entry = self._entries.get(encoded_message.message_id)
+            if entry is None or entry[0] is not encoded_message:
+                return encoded_message.version==version
+            if encoded_message.version!=version:
+                self.__remove(encoded_message.message_id)
+                self.stale_entries += 1
+                return False
+            self._entries[encoded_message.message_id] = (encoded_message, entry[1],
+                                                         time.monotonic() + self._revalidate_seconds)
+            return True
+
+    def put(self, encoded_message:EncodedMessage, generation:int)->None:
+        """
+        Cache encoded message read from the db, unless an invalidation happened since the read started
+        :param encoded_message: message read from the db
+        :param generation: generation taken before the db read
+        :return: None
+        """
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            if generation!=self._generation:
+                self.stale_puts += 1
+                return
+            now:float = time.monotonic()
+            self.__remove(encoded_message.message_id)
+            self._entries[encoded_message.message_id] = (encoded_message, now + self._ttl_seconds,
+                                                         now + self._revalidate_seconds)
+            if encoded_message.reply_to_message_id is not None:
+                self._replies.setdefault(encoded_message.reply_to_message_id, set()).add(encoded_message.message_id)
+            while len(self._entries) > self._max_size:
+                self.__remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, message_ids:Iterable[str])->None:
+        """
+        Remove messages from cache, no error for messages that aren't cached
+        :param message_ids: unique identifiers for messages
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            for message_id in message_ids:
+                if self.__remove(message_id):
+                    self.invalidations += 1
+
+    def invalidate_thread(self, message_id:str)->None:
+        """
+        Remove message and its cached replies at any depth from cache, following cached replies down from message.
+        A reply cached without its parent isn't found, it fails its next revalidation once deleted from the db
+        :param message_id: unique identifier for message
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            thread_ids:List[str] = [message_id]
+            while thread_ids:
+                thread_id:str = thread_ids.pop()
+                thread_ids.extend(self._replies.pop(thread_id, ()))
+                if self.__remove(thread_id):
+                    self.invalidations += 1
+
+    def __remove(self, message_id:str)->bool:
+        """
+        Remove message entry and its reply index entry, called holding the lock
+        :return: True if message was cached
+        """
+        entry = self._entries.pop(message_id, None)
+        if entry is None:
+            return False
+        reply_to_message_id:Optional[str] = entry[0].reply_to_message_id
+        if reply_to_message_id is not None and reply_to_message_id in self._replies:
+            self._replies[reply_to_message_id].discard(message_id)
+            if not self._replies[reply_to_message_id]:
+                del self._replies[reply_to_message_id]
+        return True
+
+    def clear(self)->None:
+        """
+        Remove all entries from cache
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._replies.clear()
+
+    def __len__(self)->int:
+        return len(self._entries)
+
+    def stats(self)->Dict[str, float]:
+        """
+        Cache counters, used to follow how many db reads are saved
+        :return: dict of counter name to value
+        """
+        with self._lock:
+            lookups:int = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+                "revalidations": self.revalidations,
+                "stale_entries": self.stale_entries,
+            }
+
+
+class CachingRepository(DelegatingRepository):
+    """
+    Read-through cache of single message reads around another repository.
+    Messages are kept encoded as json, so a cached read costs a dict lookup without decoding or serialization,
+    and a projection-only version read once per revalidate_seconds.
+    Writes go to the wrapped repository first, then invalidate the messages they changed.
+    The cache is process local: writes of other processes are caught by checking the version of a cached message
+    once it wasn't checked for revalidate_seconds, so other processes' writes show within that window
+    """
+    def __init__(self, repository:Repository, cache:Optional[EncodedMessageCache] = None):
+        super().__init__(repository)
+        self._cache:EncodedMessageCache = EncodedMessageCache() if cache is None else cache
+
+    def __get_cached(self, message_id:str)->Optional[EncodedMessage]:
+        """
+        Get cached encoded message, revalidated against its db version if due
+        :param message_id: unique identifier for message in db
+        :return: EncodedMessage or None if it isn't cached or is stale
+        :raises:
+            ResourceNotFoundError if message was deleted from db
+            DatabaseError for DB operation fail
+        """
+        cached:Optional[Tuple[EncodedMessage, bool]] = self._cache.get(message_id)
+        if cached is None:
+            return None
+        encoded_message, revalidate = cached
+        if not revalidate:
+            return encoded_message
+        try:
+            version:int = self._repository.get_message_version_blog(message_id)
+        except ResourceNotFoundError:
+            self._cache.invalidate([message_id])
+            raise
+        return encoded_message if self._cache.revalidate(encoded_message, version) else None
+
+    def get_message_json_blog(self, message_id:str)->EncodedMessage:
+        """
+        Get encoded message from cache, or from the wrapped repository on cache miss
+        :param message_id: unique identifier for message in db
+        :return: EncodedMessage with the json bytes and version of message
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        encoded_message:Optional[EncodedMessage] = self.__get_cached(message_id)
+        if encoded_message is not None:
+            return encoded_message
+        generation:int = self._cache.generation
+        encoded_message = self._repository.get_message_json_blog(message_id)
+        self._cache.put(encoded_message, generation)
+        return encoded_message
+
+    def get_message_version_blog(self, message_id:str)->int:
+        """
+        Get message version from cache if it was revalidated less than revalidate_seconds ago,
+        or from the wrapped repository
+        :param message_id: unique identifier for message in db
+        :return: message version
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        cached:Optional[Tuple[EncodedMessage, bool]] = self._cache.get(message_id)
+        if cached is not None and not cached[1]:
+            return cached[0].version
+        version:int = self._repository.get_message_version_blog(message_id)
+        if cached is not None:
+            self._cache.revalidate(cached[0], version)
+        return version
+
+    def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
+        try:
+            return self._repository.edit_message_blog(message_id, edited_content, owner=owner)
+        finally:
+            self._cache.invalidate([message_id])
+
+    def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
+        """
+        Delete message with the wrapped repository and invalidate it with its cached replies
+        :param message_id: unique identifier for message
+        :param owner: user_id that must own the message, '' to skip the ownership check
+        :return: Message object of deleted message, or None if already doesn't exist
+        :raises:
+            UnauthorizedError if message isn't owned by owner
+            DatabaseError for DB operation fail
+        """
+        try:
+            return self._repository.delete_message_blog(message_id, owner=owner)
+        finally:
+            self._cache.invalidate_thread(message_id)
+
+    def add_message_like(self, message_id:str, user_id:str)->bool:
+        try:
+            return self._repository.add_message_like(message_id, user_id)
+        finally:
+            self._cache.invalidate([message_id])
+
+    def remove_message_like(self, message_id:str, user_id:str)->bool:
+        try:
+            return self._repository.remove_message_like(message_id, user_id)
+        finally:
+            self._cache.invalidate([message_id])
+
+    def stats(self)->Dict[str, float]:
+        """
+        Hit ratio, eviction and invalidation counters of the encoded message cache
+        :return: dict of counter name to value
+        """
+        return self._cache.stats()
@@ -0,0 +1,109 @@
+from typing import Dict, Iterator, List, Optional, Union
+from src.db.odm_blog import Comment, EncodedMessage, Like, Message, MessageThread, NewMessage, Post, User
+from src.db.repository import Repository
+from src.server.flask.exceptions import BlogAppException
+
+
+class DelegatingRepository(Repository):
+    """
+    Repository forwarding every operation to a wrapped repository.
+    Base of repository decorators, which override only the operations they change
+    """
+    def __init__(self, repository:Repository):
+        self._repository:Repository = repository
+
+    @property
+    def wrapped_repository(self)->Repository:
+        """
+        Repository operations are forwarded to
+        """
+        return self._repository
+
+    def stats(self)->Optional[Dict[str, float]]:
+        """
+        Counters of this repository layer, reported on /metrics
+        :return: dict of counter name to value, or None for layers without counters
+        """
+        return None
+
+    def ping(self)->None:
+        return self._repository.ping()
+
+    def indexes_created(self)->bool:
+        return self._repository.indexes_created()
+
+    def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
+        return self._repository.get_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+
+    def iter_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->Iterator[Post]:
+        return self._repository.iter_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+
+    def get_posts_json_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[EncodedMessage]:
+        return self._repository.get_posts_json_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+
+    def get_message_blog(self, message_id:str, user_id_owner:str='')->Message:
+        return self._repository.get_message_blog(message_id, user_id_owner=user_id_owner)
+
+    def get_message_json_blog(self, message_id:str)->EncodedMessage:
+        return self._repository.get_message_json_blog(message_id)
+
+    def get_message_version_blog(self, message_id:str)->int:
+        return self._repository.get_message_version_blog(message_id)
+
+    def get_feed_version_blog(self)->int:
+        return self._repository.get_feed_version_blog()
+
+    def get_messages_blog(self, message_ids:List[str])->List[Optional[Message]]:
+        return self._repository.get_messages_blog(message_ids)
+
+    def get_comments_blog(self, message_id:str, comments_limit:int, cursor:str = '')->List[Comment]:
+        return self._repository.get_comments_blog(message_id, comments_limit=comments_limit, cursor=cursor)
+
+    def get_thread_blog(self, message_id:str, max_depth:int, limit:int)->MessageThread:
+        return self._repository.get_thread_blog(message_id, max_depth=max_depth, limit=limit)
+
+    def get_message_descendant_ids_blog(self, message_id:str)->List[str]:
+        return self._repository.get_message_descendant_ids_blog(message_id)
+
+    def create_message_blog(self, content:str, user_id_owner: str, reply_to_message_id:str)->Message:
+        return self._repository.create_message_blog(content=content, user_id_owner=user_id_owner,
+                                                    reply_to_message_id=reply_to_message_id)
+
+    def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
+        return self._repository.create_messages_blog(new_messages)
+
+    def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
+        return self._repository.edit_message_blog(message_id, edited_content, owner=owner)
+
+    def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
+        return self._repository.delete_message_blog(message_id, owner=owner)
+
+    def add_message_like(self, message_id:str, user_id:str)->bool:
+        return self._repository.add_message_like(message_id, user_id)
+
+    def remove_message_like(self, message_id:str, user_id:str)->bool:
+        return self._repository.remove_message_like(message_id, user_id)
+
+    def get_message_likes_blog(self, message_id:str, likes_limit:int, cursor:str = '')->List[Like]:
+        return self._repository.get_message_likes_blog(message_id, likes_limit=likes_limit, cursor=cursor)
+
+    def is_message_liked(self, message_id:str, user_id:str)->bool:
+        return self._repository.is_message_liked(message_id, user_id)
+
+    def create_user_blog(self, user_id: str, password:str, email:str, name:str, roles:List[str])->User:
+        return self._repository.create_user_blog(user_id=user_id, password=password, email=email, name=name, roles=roles)
+
+    def get_user_blog(self, user_id:str)->User:
+        return self._repository.get_user_blog(user_id)
+
+    def update_user_details_blog(self, user_id: str,password:str = '', email:str = '', name:str= '')->User:
+        return self._repository.update_user_details_blog(user_id, password=password, email=email, name=name)
+
+    def delete_user_blog(self, user_id:str)->Union[User,None]:
+        return self._repository.delete_user_blog(user_id)
+
+    def add_user_role(self, user_id:str, role: str)->bool:
+        return self._repository.add_user_role(user_id, role)
+
+    def remove_user_role(self, user_id:str, role:str)->bool:
+        return self._repository.remove_user_role(user_id, role)
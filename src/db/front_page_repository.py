@@ -0,0 +1,324 @@
+from bson import ObjectId
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from src.db.delegating_repository import DelegatingRepository
+from src.db.odm_blog import EncodedMessage, Message, NewMessage, Post
+from src.db.pagination import decode_cursor
+from src.db.repository import Repository, encode_message
+from src.server.flask.exceptions import BlogAppException
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+# newest posts kept in memory, 0 disables the front page
+FRONT_PAGE_SIZE:int = int(os.environ.get('FRONT_PAGE_SIZE', 1000))
+# longest time the front page is used without comparing its feed version with the db,
+# bounds how long posts created or deleted by other processes are missing from it
+FRONT_PAGE_REVALIDATE_SECONDS:float = float(os.environ.get('FRONT_PAGE_REVALIDATE_SECONDS', 1))
+# edits and likes don't change the feed version, the window is reloaded at least this often to show those of other processes
+FRONT_PAGE_MAX_AGE_SECONDS:float = float(os.environ.get('FRONT_PAGE_MAX_AGE_SECONDS', 30))
+
+
+class FrontPageRepository(DelegatingRepository):
+    """
+    In memory materialized view of the newest front_page_size posts, with each post kept encoded as json.
+    Pages that fall entirely inside the window are served from memory, others are read from the wrapped repository.
+    Creates, edits, deletes and likes of posts by this process update the window at once.
+    The window is only used while its feed version matches the last feed version read from the db,
+    so posts created or deleted by other processes make pages fall back to the db until the window is reloaded
+    by a background thread, at most every revalidate_seconds. Edits and likes of other processes don't change
+    the feed version and show once the window is older than max_age_seconds
+    """
+    def __init__(self, repository:Repository, front_page_size:int = FRONT_PAGE_SIZE,
+                 revalidate_seconds:float = FRONT_PAGE_REVALIDATE_SECONDS,
+                 max_age_seconds:float = FRONT_PAGE_MAX_AGE_SECONDS, warm:bool = True):
+        super().__init__(repository)
+        self._front_page_size:int = front_page_size
+        self._revalidate_seconds:float = revalidate_seconds
+        self._max_age_seconds:float = max_age_seconds
+        # (_id, Post, EncodedMessage) sorted by _id, newest first
+        self._window:List[Tuple[ObjectId, Post, EncodedMessage]] = []
+        # True if the window holds every post, so pages past its end are empty
+        self._window_complete:bool = False
+        self._window_version:Optional[int] = None
+        self._db_version:Optional[int] = None
+        self._revalidated_at:float = 0
+        self._loaded_at:float = 0
+        self._revalidating:bool = False
+        self._lock:Lock = Lock()
+        self._reload_lock:Lock = Lock()
+        self.hits:int = 0
+        self.misses:int = 0
+        self.reloads:int = 0
+        if warm and front_page_size > 0:
+            Thread(target=self.__warm, name='front_page_warmup', daemon=True).start()
+
+    def __warm(self)->None:
+        try:
+            self.reload()
+        except Exception as e:
+            logging.error(f"Front page warmup failed, posts are read from the db until it is loaded: {e}")
+
+    def reload(self, feed_version:Optional[int] = None)->None:
+        """
+        Load the newest front_page_size posts from the wrapped repository.
+        The feed version is read before the posts, so a write in between leaves the window behind the db version
+        and it is reloaded again
+        :param feed_version: feed version already read, read from the wrapped repository if None
+        :return: None
+        :raises: DatabaseError if db operation fail
+        """
+        with self._reload_lock:
+            loaded_at:float = time.monotonic()
+            self._revalidated_at = loaded_at
+            if feed_version is None:
+                feed_version = self._repository.get_feed_version_blog()
+            posts:List[Post] = self._repository.get_posts_blog(posts_limit=self._front_page_size)
+            window:List[Tuple[ObjectId, Post, EncodedMessage]] = [(ObjectId(post.message_id), post, encode_message(post))
+                                                                   for post in posts]
+            with self._lock:
+                self._loaded_at = loaded_at
+                self._window = window
+                self._window_complete = len(window) < self._front_page_size
+                self._window_version = feed_version
+                self.reloads += 1
+        self.__observe_feed_version(feed_version)
+        logging.info(f"Front page loaded with {len(window)} posts at feed version {feed_version}")
+
+    def __revalidate_if_due(self, feed_version:Optional[int] = None)->None:
+        """
+        Start a background revalidation if revalidate_seconds passed since the last check,
+        requests never wait for it and read posts from the db until the window is reloaded.
+        Skipped while another revalidation runs
+        :param feed_version: feed version already read, read from the wrapped repository if None
+        :return: None
+        """
+        with self._lock:
+            if self._revalidating or time.monotonic() - self._revalidated_at < self._revalidate_seconds:
+                return
+            self._revalidating = True
+            self._revalidated_at = time.monotonic()
+        Thread(target=self.__revalidate, args=(feed_version,), name='front_page_revalidation', daemon=True).start()
+
+    def __revalidate(self, feed_version:Optional[int])->None:
+        """
+        Reload the window if its version differs from the db or it is older than max_age_seconds
+        :param feed_version: feed version already read, read from the wrapped repository if None
+        :return: None
+        """
+        try:
+            if feed_version is None:
+                feed_version = self._repository.get_feed_version_blog()
+                self.__observe_feed_version(feed_version)
+            if feed_version!=self._window_version or time.monotonic() - self._loaded_at >= self._max_age_seconds:
+                self.reload(feed_version)
+        except Exception as e:
+            logging.error(f"Front page revalidation failed, posts are read from the db: {e}")
+        finally:
+            with self._lock:
+                self._revalidating = False
+
+    def __page(self, posts_limit:int, start_index:int, cursor:str)->Optional[List[Tuple[ObjectId, Post, EncodedMessage]]]:
+        """
+        Get a page from the window
+        :param posts_limit: post limit for pagination
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
+        :return: window entries of the page, or None if the page isn't entirely inside an up to date window or unlimited
+        :raises: InputValidationError if cursor is malformed
+        """
+        cursor_id:Optional[ObjectId] = decode_cursor(cursor) if cursor!='' else None
+        # a posts_limit of 0 means no limit to the db
+        if self._front_page_size <= 0 or posts_limit <= 0:
+            return None
+        self.__revalidate_if_due()
+        with self._lock:
+            if self._window_version is None or self._window_version!=self._db_version:
+                self.misses += 1
+                return None
+            # the window is sorted newest first, a page after cursor starts at the first post older than it
+            page_start:int = start_index if cursor_id is None \
+                else self.__first_index_older_than(cursor_id, include_equal=False)
+            page_end:int = page_start + posts_limit
+            if page_end > len(self._window) and not self._window_complete:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._window[page_start:page_end]
+
+    def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
+        page = self.__page(posts_limit, start_index, cursor)
+        if page is None:
+            return self._repository.get_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+        return [post for _, post, _ in page]
+
+    def get_posts_json_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[EncodedMessage]:
+        page = self.__page(posts_limit, start_index, cursor)
+        if page is None:
+            return self._repository.get_posts_json_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+        return [encoded_post for _, _, encoded_post in page]
+
+    def iter_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->Iterator[Post]:
+        page = self.__page(posts_limit, start_index, cursor)
+        if page is None:
+            return self._repository.iter_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+        return iter([post for _, post, _ in page])
+
+    def get_feed_version_blog(self)->int:
+        """
+        Get posts feed version from the wrapped repository, the window is only used while it has that version
+        :return: feed version
+        :raises: DatabaseError for DB operation fail
+        """
+        feed_version:int = self._repository.get_feed_version_blog()
+        self.__observe_feed_version(feed_version)
+        if feed_version!=self._window_version:
+            self.__revalidate_if_due(feed_version)
+        return feed_version
+
+    def __observe_feed_version(self, feed_version:int)->None:
+        """
+        Record a feed version read from the db, versions only grow so an older concurrent read is ignored
+        :param feed_version: feed version read from the db
+        :return: None
+        """
+        with self._lock:
+            if self._db_version is None or self._db_version < feed_version:
+                self._db_version = feed_version
+
+    def __apply_post_write(self, apply_write:Callable[[], None])->None:
+        """
+        Apply a post create or delete of this process to the window. Each of them bumps the feed version once,
+        so a window that was up to date stays so, otherwise it is left to be reloaded
+        :param apply_write: function changing self._window, called under lock
+        :return: None
+        """
+        with self._lock:
+            in_sync:bool = self._window_version is not None and self._window_version==self._db_version
+            apply_write()
+            if in_sync:
+                self._window_version += 1
+                self._db_version += 1
+
+    def __first_index_older_than(self, post_id:ObjectId, include_equal:bool)->int:
+        """
+        Binary search of the window sorted newest first, bisect key= needs Python 3.10 and the image ships 3.8.
+        Called under lock
+        :param post_id: post _id
+        :param include_equal: True to also stop at the entry of post_id itself
+        :return: index of the first entry older than post_id, or of post_id if include_equal, len(window) if none
+        """
+        low:int = 0
+        high:int = len(self._window)
+        while low < high:
+            middle:int = (low + high) // 2
+            entry_id:ObjectId = self._window[middle][0]
+            if entry_id < post_id or (include_equal and entry_id==post_id):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def __put_post(self, post:Post)->None:
+        """
+        Add or replace a post in the window, keeping it sorted newest first and bounded to front_page_size.
+        Called under lock
+        :param post: created or edited post
+        :return: None
+        """
+        post_id:ObjectId = ObjectId(post.message_id)
+        entry:Tuple[ObjectId, Post, EncodedMessage] = (post_id, post, encode_message(post))
+        index:int = self.__first_index_older_than(post_id, include_equal=True)
+        if index < len(self._window) and self._window[index][0]==post_id:
+            self._window[index] = entry
+        elif index < len(self._window) or self._window_complete:
+            self._window.insert(index, entry)
+            if len(self._window) > self._front_page_size:
+                self._window.pop()
+                self._window_complete = False
+        # otherwise the post is older than every post of an incomplete window, so it isn't one of the newest posts
+
+    def __remove_post(self, message_id:str)->None:
+        """
+        Remove a post from the window, which keeps covering the newest posts with one post less.
+        Called under lock
+        :param message_id: deleted post message_id
+        :return: None
+        """
+        post_id:ObjectId = ObjectId(message_id)
+        self._window = [entry for entry in self._window if entry[0]!=post_id]
+
+    def create_message_blog(self, content:str, user_id_owner: str, reply_to_message_id:str)->Message:
+        message:Message = self._repository.create_message_blog(content=content, user_id_owner=user_id_owner,
+                                                               reply_to_message_id=reply_to_message_id)
+        if isinstance(message, Post):
+            self.__apply_post_write(lambda: self.__put_post(message))
+        return message
+
+    def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
+        results:List[Union[Message,BlogAppException]] = self._repository.create_messages_blog(new_messages)
+        posts:List[Post] = [result for result in results if isinstance(result, Post)]
+        if posts:
+            self.__apply_post_write(lambda: [self.__put_post(post) for post in posts])
+        return results
+
+    def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
+        message:Message = self._repository.edit_message_blog(message_id, edited_content, owner=owner)
+        if isinstance(message, Post):
+            # edits don't change the feed version
+            with self._lock:
+                self.__put_post(message)
+        return message
+
+    def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
+        message:Union[Message,None] = self._repository.delete_message_blog(message_id, owner=owner)
+        if isinstance(message, Post):
+            self.__apply_post_write(lambda: self.__remove_post(message_id))
+        return message
+
+    def __update_liked_post(self, message_id:str)->None:
+        """
+        Replace a liked post of the window with its db value if it is newer, likes don't change the feed version
+        :param message_id: liked or unliked message_id
+        :return: None
+        """
+        post_id:ObjectId = ObjectId(message_id)
+        with self._lock:
+            window_post:Optional[Post] = next((post for entry_id, post, _ in self._window if entry_id==post_id), None)
+        if window_post is None:
+            return
+        try:
+            post:Message = self._repository.get_message_blog(message_id)
+        except BlogAppException as e:
+            logging.error(f"Front page update of liked post failed, it is left for the window reload: {e.message}")
+            return
+        if isinstance(post, Post) and post.version > window_post.version:
+            with self._lock:
+                self.__put_post(post)
+
+    def add_message_like(self, message_id:str, user_id:str)->bool:
+        liked:bool = self._repository.add_message_like(message_id, user_id)
+        self.__update_liked_post(message_id)
+        return liked
+
+    def remove_message_like(self, message_id:str, user_id:str)->bool:
+        unliked:bool = self._repository.remove_message_like(message_id, user_id)
+        self.__update_liked_post(message_id)
+        return unliked
+
+    def stats(self)->Dict[str, float]:
+        """
+        Window size, hit and reload counters of the front page
+        :return: dict of counter name to value
+        """
+        with self._lock:
+            return {
+                "size": len(self._window),
+                "complete": self._window_complete,
+                "feed_version": self._window_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+            }
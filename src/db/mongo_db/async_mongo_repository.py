@@ -0,0 +1,397 @@
+from pymongo import AsyncMongoClient, ReturnDocument
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.command_cursor import AsyncCommandCursor
+from pymongo.asynchronous.cursor import AsyncCursor
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import DeleteResult, InsertOneResult, UpdateResult
+from src.server.flask.exceptions import ResourceNotFoundError, DatabaseError, BlogAppException, UnauthorizedError
+from src.db.odm_blog import Post, Comment, Message, MessageThread, NewMessage, User, Like
+from src.db.async_repository import AsyncRepository
+from src.db.mongo_db.mongo_repository import mongo_connection_string, THREAD_MESSAGES_LIMIT, POSTS_STREAM_BATCH_SIZE
+from src.db.mongo_db.thread_builder import ThreadBuilder
+import src.db.mongo_db.odm_mapping as odm_mapping
+from typing import AsyncIterator, Dict, List, Mapping, Optional, Union
+from bson import ObjectId
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+
+class AsyncMongoDBRepository(AsyncRepository):
+    """
+    AsyncRepository on the pymongo asyncio client, reading and writing the same documents as MongoDBRepository.
+    Indexes are created by MongoDBRepository. Likes are always written directly, LIKE_WRITE_BEHIND isn't supported.
+    The client belongs to the event loop it is first used on, so create one repository per loop
+    """
+    def __init__(self, connection_string:Optional[str] = None):
+        self._client:AsyncMongoClient = AsyncMongoClient(mongo_connection_string() if connection_string is None
+                                                         else connection_string)
+        messages_db:AsyncDatabase = self._client["messages"]
+        users_db:AsyncDatabase = self._client["users"]
+        self._messages_collection:AsyncCollection = messages_db["comments"]
+        self._likes_collection:AsyncCollection = messages_db["likes"]
+        self._feeds_collection:AsyncCollection = messages_db["feeds"]
+        self._users_collection:AsyncCollection = users_db["users"]
+
+    async def ping(self)->None:
+        """
+        Check MongoDB is reachable
+        :return: None
+        :raises: DatabaseError if MongoDB can't be reached
+        """
+        try:
+            await self._client.admin.command('ping')
+        except Exception as e:
+            raise DatabaseError("MongoDB Connection Error") from e
+
+    async def close(self)->None:
+        """
+        Close the client connections
+        :return: None
+        """
+        await self._client.close()
+
+    def __find_posts(self, posts_limit:int, start_index:int, cursor:str)->AsyncCursor:
+        """
+        Build the cursor of a posts page, no document is read until it is iterated
+        :param posts_limit: post limit for pagination
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
+        :return: pymongo cursor of post documents, newest first
+        :raises: InputValidationError if cursor is malformed
+        """
+        posts:AsyncCursor = self._messages_collection.find(odm_mapping.posts_query(cursor)).sort("_id", -1)
+        if cursor=='':
+            posts = posts.skip(start_index)
+        return posts.limit(posts_limit)
+
+    async def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
+        posts:AsyncCursor = self.__find_posts(posts_limit, start_index, cursor)
+        try:
+            return [odm_mapping.message_data_to_post_object(post_data) async for post_data in posts]
+        except Exception as e:
+            raise DatabaseError from e
+
+    async def iter_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->AsyncIterator[Post]:
+        posts:AsyncCursor = self.__find_posts(posts_limit, start_index, cursor).batch_size(POSTS_STREAM_BATCH_SIZE)
+        try:
+            async for post_data in posts:
+                yield odm_mapping.message_data_to_post_object(post_data)
+        except Exception as e:
+            raise DatabaseError from e
+        finally:
+            await posts.close()
+
+    async def get_message_blog(self, message_id:str, user_id_owner:str='')->Message:
+        filter_criteria:dict = {"_id": ObjectId(message_id)}
+        if user_id_owner!='':
+            filter_criteria["user_id_owner"] = user_id_owner
+        try:
+            message_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one(filter_criteria)
+        except Exception as e:
+            raise DatabaseError from e
+        if message_data is None:
+            if user_id_owner!='':
+                raise ResourceNotFoundError(f"Message ID {message_id} with user_id_owner {user_id_owner} not found")
+            raise ResourceNotFoundError(f"Message ID {message_id} not found")
+        return odm_mapping.message_data_to_message_object(message_data)
+
+    async def get_message_version_blog(self, message_id:str)->int:
+        try:
+            message_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one(
+                {"_id": ObjectId(message_id)}, projection={"version": 1})
+        except Exception as e:
+            raise DatabaseError from e
+        if message_data is None:
+            raise ResourceNotFoundError(f"Message ID {message_id} not found")
+        return message_data.get("version", 0)
+
+    async def get_feed_version_blog(self)->int:
+        try:
+            feed_data:Optional[Mapping[str,any]] = await self._feeds_collection.find_one({"_id": "posts"})
+        except Exception as e:
+            raise DatabaseError from e
+        return 0 if feed_data is None else feed_data["version"]
+
+    async def __bump_feed_version(self)->None:
+        """
+        Increment posts feed version, called after posts are created or deleted
+        :return: None
+        """
+        await self._feeds_collection.update_one({"_id": "posts"}, {"$inc": {"version": 1}}, upsert=True)
+
+    async def get_messages_blog(self, message_ids:List[str])->List[Optional[Message]]:
+        try:
+            messages:AsyncCursor = self._messages_collection.find(
+                {"_id": {"$in": list({ObjectId(message_id) for message_id in message_ids})}})
+            message_objects:Dict[str, Message] = {
+                str(message_data["_id"]): odm_mapping.message_data_to_message_object(message_data)
+                async for message_data in messages}
+        except Exception as e:
+            raise DatabaseError from e
+        return [message_objects.get(str(ObjectId(message_id))) for message_id in message_ids]
+
+    async def get_comments_blog(self, message_id:str, comments_limit:int, cursor:str = '')->List[Comment]:
+        query:dict = odm_mapping.comments_query(message_id, cursor)
+        try:
+            comments:AsyncCursor = self._messages_collection.find(query).sort("_id", 1).limit(comments_limit)
+            return [odm_mapping.message_data_to_comment_object(comment_data)
+                    async for comment_data in comments]
+        except Exception as e:
+            raise DatabaseError from e
+
+    async def get_thread_blog(self, message_id:str, max_depth:int, limit:int)->MessageThread:
+        try:
+            message_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one(
+                {"_id": ObjectId(message_id)}, projection={"ancestor_ids": 0})
+            if message_data is None:
+                raise ResourceNotFoundError(f"Message ID {message_id} not found")
+            thread:MessageThread = MessageThread(
+                message=odm_mapping.message_data_to_message_object(message_data), replies=[])
+            thread_builder:ThreadBuilder = ThreadBuilder(thread, max_depth, limit, THREAD_MESSAGES_LIMIT,
+                                                         self._messages_collection.name,
+                                                         odm_mapping.message_data_to_message_object)
+            pipeline:Optional[List[dict]] = thread_builder.next_pipeline()
+            while pipeline is not None:
+                replies:AsyncCommandCursor = await self._messages_collection.aggregate(pipeline)
+                thread_builder.add_replies(await replies.to_list())
+                pipeline = thread_builder.next_pipeline()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+        return thread
+
+    async def get_message_descendant_ids_blog(self, message_id:str)->List[str]:
+        try:
+            return [str(reply_id) for reply_id in await self.__get_descendant_ids(ObjectId(message_id))]
+        except Exception as e:
+            raise DatabaseError from e
+
+    async def __get_descendant_ids(self, message_id_obj:ObjectId)->List[ObjectId]:
+        """
+        Get _id of every reply in the thread under message
+        :param message_id_obj: message _id
+        :return: list of reply _id values
+        """
+        return [reply["_id"] async for reply in
+                self._messages_collection.find({"ancestor_ids": message_id_obj}, projection={"_id": 1})]
+
+    async def create_message_blog(self, content:str, user_id_owner:str, reply_to_message_id:str)->Message:
+        new_message:dict = odm_mapping.new_message_document(
+            content, user_id_owner, None if reply_to_message_id=='' else ObjectId(reply_to_message_id), [])
+        try:
+            if new_message["reply_to_message_id"] is not None:
+                parent_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one(
+                    {"_id": new_message["reply_to_message_id"]}, projection={"ancestor_ids": 1})
+                if parent_data is None:
+                    raise ResourceNotFoundError(f"Message ID {reply_to_message_id} not found")
+                new_message["ancestor_ids"] = parent_data.get("ancestor_ids", []) + [new_message["reply_to_message_id"]]
+            insert_one_result:InsertOneResult = await self._messages_collection.insert_one(new_message)
+            if new_message["reply_to_message_id"] is None:
+                await self.__bump_feed_version()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        new_message["_id"] = insert_one_result.inserted_id
+        return odm_mapping.message_data_to_message_object(new_message)
+
+    async def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
+        replied_message_ids:List[ObjectId] = odm_mapping.replied_message_ids(new_messages)
+        results:List[Union[Message,BlogAppException,None]] = [None] * len(new_messages)
+        try:
+            parent_ancestor_ids:Dict[ObjectId, List[ObjectId]] = {} if not replied_message_ids else {
+                parent_data["_id"]: parent_data.get("ancestor_ids", []) async for parent_data in
+                self._messages_collection.find({"_id": {"$in": replied_message_ids}}, projection={"ancestor_ids": 1})}
+            documents, document_indexes = odm_mapping.new_message_documents(new_messages, parent_ancestor_ids, results)
+            write_errors:Dict[int, dict] = {}
+            if documents:
+                try:
+                    await self._messages_collection.insert_many(documents, ordered=False)
+                except BulkWriteError as e:
+                    write_errors = {write_error["index"]: write_error for write_error in e.details.get("writeErrors", [])}
+            if odm_mapping.inserted_post(documents, write_errors):
+                await self.__bump_feed_version()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return odm_mapping.created_messages_results(results, documents, document_indexes, write_errors)
+
+    async def __raise_if_not_owner(self, message_id_obj:ObjectId, owner:str)->None:
+        """
+        Called when an owner conditional write matched nothing, to tell a missing message from one with another owner
+        :param message_id_obj: message _id
+        :param owner: user_id that was required to own the message
+        :return: None if message doesn't exist
+        :raises: UnauthorizedError if message exists and isn't owned by owner
+        """
+        if owner!='' and await self._messages_collection.find_one({"_id": message_id_obj}, projection={"_id": 1}) is not None:
+            raise UnauthorizedError(f"User ID {owner} is not owner of message_id {message_id_obj}")
+
+    async def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
+        message_id_obj:ObjectId = ObjectId(message_id)
+        try:
+            edited_message_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one_and_update(
+                filter=odm_mapping.message_filter(message_id_obj, owner),
+                update={"$set": {"content": edited_content}, "$inc": {"version": 1}},
+                upsert=False,
+                return_document=ReturnDocument.AFTER)
+            if edited_message_data is None:
+                await self.__raise_if_not_owner(message_id_obj, owner)
+                raise ResourceNotFoundError(f"Message ID {message_id} not found")
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return odm_mapping.message_data_to_message_object(edited_message_data)
+
+    async def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
+        message_id_obj:ObjectId = ObjectId(message_id)
+        try:
+            message_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one_and_delete(
+                filter=odm_mapping.message_filter(message_id_obj, owner))
+            if message_data is None:
+                await self.__raise_if_not_owner(message_id_obj, owner)
+                return None
+            await self._messages_collection.delete_many({"ancestor_ids": message_id_obj})
+            await self._likes_collection.delete_many({"thread_ids": message_id_obj})
+            if message_data["reply_to_message_id"] is None:
+                await self.__bump_feed_version()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return odm_mapping.message_data_to_message_object(message_data)
+
+    async def add_message_like(self, message_id:str, user_id:str)->bool:
+        message_id_obj:ObjectId = ObjectId(message_id)
+        try:
+            liked_message_data:Optional[Mapping[str,any]] = await self._messages_collection.find_one(
+                {"_id": message_id_obj}, projection={"ancestor_ids": 1})
+            if liked_message_data is None:
+                raise ResourceNotFoundError(f"Message ID {message_id} not found")
+            await self._likes_collection.insert_one(odm_mapping.new_like_document(
+                message_id_obj, user_id, odm_mapping.like_thread_ids(liked_message_data)))
+            update_result:UpdateResult = await self._messages_collection.update_one(
+                {"_id": message_id_obj}, {"$inc": {"like_count": 1, "version": 1}})
+            if update_result.matched_count==0:
+                await self._likes_collection.delete_one({"message_id": message_id_obj, "user_id": user_id})
+                raise ResourceNotFoundError(f"Message ID {message_id} not found")
+        except DuplicateKeyError:
+            return True
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return True
+
+    async def remove_message_like(self, message_id:str, user_id:str)->bool:
+        message_id_obj:ObjectId = ObjectId(message_id)
+        try:
+            delete_result:DeleteResult = await self._likes_collection.delete_one(
+                {"message_id": message_id_obj, "user_id": user_id})
+            if delete_result.deleted_count==0:
+                if await self._messages_collection.find_one({"_id": message_id_obj}, projection={"_id": 1}) is None:
+                    raise ResourceNotFoundError(f"Message ID {message_id_obj} not found")
+            else:
+                await self._messages_collection.update_one({"_id": message_id_obj},
+                                                          {"$inc": {"like_count": -1, "version": 1}})
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return True
+
+    async def get_message_likes_blog(self, message_id:str, likes_limit:int, cursor:str = '')->List[Like]:
+        query:dict = odm_mapping.likes_query(message_id, cursor)
+        try:
+            likes:AsyncCursor = self._likes_collection.find(query).sort("_id", -1).limit(likes_limit)
+            return [odm_mapping.like_data_to_like_object(like_data) async for like_data in likes]
+        except Exception as e:
+            raise DatabaseError from e
+
+    async def is_message_liked(self, message_id:str, user_id:str)->bool:
+        try:
+            return await self._likes_collection.find_one({"message_id": ObjectId(message_id), "user_id": user_id},
+                                                         projection={"_id": 1}) is not None
+        except Exception as e:
+            raise DatabaseError from e
+
+    async def create_user_blog(self, user_id: str, password:str, email:str, name:str, roles:List[str])->User:
+        new_user:dict = odm_mapping.new_user_document(user_id, password, email, name, roles)
+        try:
+            await self._users_collection.insert_one(new_user)
+        except DuplicateKeyError as e:
+            raise DatabaseError(f"User Id {user_id} already exists") from e
+        except Exception as e:
+            raise DatabaseError(e.args[0]) from e
+
+        return odm_mapping.user_data_to_user_object(new_user)
+
+    async def get_user_blog(self, user_id:str)->User:
+        try:
+            user_data:Optional[Mapping[str,any]] = await self._users_collection.find_one(filter={"user_id": user_id})
+        except Exception as e:
+            raise DatabaseError from e
+        if user_data is None:
+            raise ResourceNotFoundError(f"User ID {user_id} not found")
+        return odm_mapping.user_data_to_user_object(user_data)
+
+    async def update_user_details_blog(self, user_id: str,password:str = '', email:str = '', name:str= '')->User:
+        try:
+            updated_user_data:Optional[Mapping[str,any]] = await self._users_collection.find_one_and_update(
+                filter={"user_id": user_id}, update=odm_mapping.user_details_update(password, email, name), upsert=False,
+                return_document=ReturnDocument.AFTER)
+            if updated_user_data is None:
+                raise ResourceNotFoundError(f"User ID {user_id} not found")
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return odm_mapping.user_data_to_user_object(updated_user_data)
+
+    async def delete_user_blog(self, user_id:str)->Union[User,None]:
+        try:
+            user_data:Optional[Mapping[str,any]] = await self._users_collection.find_one_and_delete(
+                filter={"user_id": user_id})
+        except Exception as e:
+            raise DatabaseError from e
+
+        return None if user_data is None else odm_mapping.user_data_to_user_object(user_data)
+
+    async def __update_user_role(self, update_type:str, user_id:str, role:str)->bool:
+        """
+        update operation on roles array field of document based on user_id
+        :param update_type: $push or $pull DB operation
+        :param user_id:  unique identifier for user
+        :param role: role that will be added/removed from roles field
+        :return: True
+        :raises: DatabaseError for MongoDB fail
+        """
+        try:
+            update_result:UpdateResult = await self._users_collection.update_one(
+                filter={"user_id": user_id}, update={update_type: {"roles": role}}, upsert=False)
+            if update_result.matched_count==0:
+                raise ResourceNotFoundError(f"User ID {user_id} not found")
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return True
+
+    async def add_user_role(self, user_id:str, role:str)->bool:
+        return await self.__update_user_role("$push", user_id, role)
+
+    async def remove_user_role(self, user_id:str, role:str)->bool:
+        return await self.__update_user_role("$pull", user_id, role)
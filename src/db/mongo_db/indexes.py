@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from pymongo import IndexModel, MongoClient
+from typing import Dict, List, Mapping, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+
+@dataclass
+class IndexSpec:
+    """
+    Index declared for a collection.
+    name is the index name in MongoDB, the default name of keys for indexes created before they were named
+    used_by lists the MongoDBRepository methods whose queries need the index
+    """
+    name:str
+    keys:List[Tuple[str, int]]
+    used_by:List[str]
+    unique:bool = False
+    partial_filter:Optional[dict] = None
+
+    def index_model(self)->IndexModel:
+        """
+        :return: pymongo IndexModel creating this index
+        """
+        options:dict = {"name": self.name}
+        if self.unique:
+            options["unique"] = True
+        if self.partial_filter is not None:
+            options["partialFilterExpression"] = self.partial_filter
+        return IndexModel(self.keys, **options)
+
+    def matches(self, index_info:Mapping[str, any])->bool:
+        """
+        Check an index listed by MongoDB has the keys and options of this spec
+        :param index_info: index document of list_indexes
+        :return: True if they are the same
+        """
+        return (list(index_info["key"].items())==[(key, direction) for key, direction in self.keys]
+                and bool(index_info.get("unique", False))==self.unique
+                and index_info.get("partialFilterExpression")==self.partial_filter)
+
+
+# (database, collection) to its indexes, _id_ is left out as MongoDB always creates it
+COLLECTION_INDEXES:Dict[Tuple[str, str], List[IndexSpec]] = {
+    ("messages", "comments"): [
+        # posts feed newest first, keyset pages after a cursor _id
+        IndexSpec(name="posts_feed", keys=[("reply_to_message_id", 1), ("_id", -1)],
+                  partial_filter={"reply_to_message_id": {"$eq": None}},
+                  used_by=["get_posts_blog", "iter_posts_blog", "backfill_ancestor_ids"]),
+        # replies of a message in creation order, keyset pages after a cursor _id
+        IndexSpec(name="comments_by_parent", keys=[("reply_to_message_id", 1), ("_id", 1)],
+                  used_by=["get_comments_blog", "get_thread_blog", "backfill_ancestor_ids"]),
+        # every reply stores the _id of all messages above it, a whole thread is deleted at once
+        IndexSpec(name="ancestor_ids_1", keys=[("ancestor_ids", 1)],
+                  used_by=["get_message_descendant_ids_blog", "delete_message_blog"]),
+        # messages filtered by user_id_owner always filter by _id too and are served by _id_
+    ],
+    ("messages", "likes"): [
+        # one document per like, a duplicate like fails on insert
+        IndexSpec(name="message_id_1_user_id_1", keys=[("message_id", 1), ("user_id", 1)], unique=True,
+                  used_by=["add_message_like", "remove_message_like", "is_message_liked"]),
+        # likes of a message newest first, keyset pages after a cursor _id
+        IndexSpec(name="message_id_1__id_-1", keys=[("message_id", 1), ("_id", -1)],
+                  used_by=["get_message_likes_blog"]),
+        # every like stores the _id of its message and all messages above it, likes of a whole thread are deleted at once
+        IndexSpec(name="likes_by_thread", keys=[("thread_ids", 1)],
+                  used_by=["delete_message_blog", "backfill_like_thread_ids"]),
+    ],
+    # single document per feed read by _id
+    ("messages", "feeds"): [],
+    ("users", "users"): [
+        IndexSpec(name="user_id_1", keys=[("user_id", 1)], unique=True,
+                  used_by=["get_user_blog", "create_user_blog", "update_user_details_blog", "delete_user_blog",
+                           "add_user_role", "remove_user_role"]),
+    ],
+}
+
+
+def create_indexes(client:MongoClient)->None:
+    """
+    Create the indexes of COLLECTION_INDEXES missing in MongoDB, existing indexes are left as they are
+    :param client: MongoClient
+    :return: None
+    :raises: pymongo errors if MongoDB can't be reached or an index conflicts with an existing one
+    """
+    for (database, collection), index_specs in COLLECTION_INDEXES.items():
+        if index_specs:
+            client[database][collection].create_indexes(
+                [index_spec.index_model() for index_spec in index_specs])
+
+
+def index_drift(client:MongoClient)->Dict[str, Dict[str, List[str]]]:
+    """
+    Compare indexes in MongoDB with COLLECTION_INDEXES
+    :param client: MongoClient
+    :return: dict of "database.collection" to lists of missing, extra and changed (same name, other keys or options)
+        index names, only for collections with a difference
+    :raises: pymongo errors if MongoDB can't be reached
+    """
+    drift:Dict[str, Dict[str, List[str]]] = {}
+    for (database, collection), index_specs in COLLECTION_INDEXES.items():
+        existing:Dict[str, Mapping[str, any]] = {index_info["name"]: index_info for index_info in
+                                                  client[database][collection].list_indexes()}
+        declared:Dict[str, IndexSpec] = {index_spec.name: index_spec for index_spec in index_specs}
+        collection_drift:Dict[str, List[str]] = {
+            "missing": [name for name in declared if name not in existing],
+            "extra": [name for name in existing if name not in declared and name!="_id_"],
+            "changed": [name for name, index_spec in declared.items()
+                        if name in existing and not index_spec.matches(existing[name])]}
+        if any(collection_drift.values()):
+            drift[f"{database}.{collection}"] = collection_drift
+    return drift
+
+
+def log_index_drift(client:MongoClient)->None:
+    """
+    Log a warning for every collection whose indexes differ from COLLECTION_INDEXES.
+    Extra and changed indexes are never dropped automatically
+    :param client: MongoClient
+    :return: None
+    :raises: pymongo errors if MongoDB can't be reached
+    """
+    for collection, collection_drift in index_drift(client).items():
+        logging.warning(f"Index drift of {collection}: {collection_drift}")
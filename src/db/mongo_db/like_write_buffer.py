@@ -0,0 +1,257 @@
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
+from pymongo.synchronous.collection import Collection
+from bson import ObjectId
+from threading import Event, Lock, Thread
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import src.db.mongo_db.odm_mapping as odm_mapping
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+LIKE_WRITE_BEHIND:bool = os.environ.get('LIKE_WRITE_BEHIND', 'false').lower()=='true'
+# durability window: likes acknowledged to clients are kept in memory for up to this long before written
+LIKE_FLUSH_INTERVAL_MS:int = int(os.environ.get('LIKE_FLUSH_INTERVAL_MS', 200))
+LIKE_FLUSH_MAX_OPERATIONS:int = int(os.environ.get('LIKE_FLUSH_MAX_OPERATIONS', 1000))
+DUPLICATE_KEY_ERROR_CODE:int = 11000
+
+
+class LikeWriteBuffer:
+    """
+    Write-behind buffer of like/unlike operations.
+    Only the last like state of each (message_id, user_id) is kept, so an add/remove burst of the same user
+    is written once. Buffered likes are flushed with bulk writes every flush_interval_ms,
+    or as soon as flush_max_operations (message_id, user_id) pairs are waiting.
+    """
+    def __init__(self, messages_collection:Collection, likes_collection:Collection,
+                 flush_interval_ms:int = LIKE_FLUSH_INTERVAL_MS, flush_max_operations:int = LIKE_FLUSH_MAX_OPERATIONS):
+        self._messages_collection:Collection = messages_collection
+        self._likes_collection:Collection = likes_collection
+        self._flush_interval_seconds:float = flush_interval_ms / 1000
+        self._flush_max_operations:int = flush_max_operations
+        self._pending_likes:Dict[ObjectId, Dict[str, bool]] = {}
+        self._pending_operations:int = 0
+        # like_count changes whose likes were written but the count update failed, retried on next flush
+        self._pending_like_counts:Dict[ObjectId, int] = {}
+        self._lock:Lock = Lock()
+        self._flush_lock:Lock = Lock()
+        self._flush_requested:Event = Event()
+        self._closed:bool = False
+        self.received_operations:int = 0
+        self.written_operations:int = 0
+        self.flushes:int = 0
+        self.failed_flushes:int = 0
+        self.last_flush_ms:float = 0
+        self.max_flush_ms:float = 0
+        self._flusher:Thread = Thread(target=self.__run_flusher, name='like_write_buffer', daemon=True)
+        self._flusher.start()
+
+    def add(self, message_id:ObjectId, user_id:str, liked:bool)->None:
+        """
+        Buffer like state of user_id for message_id, replacing any buffered state of the same pair
+        :param message_id: message _id
+        :param user_id: unique user identifier
+        :param liked: True for a like, False for removing a like
+        :return: None
+        """
+        with self._lock:
+            message_likes:Dict[str, bool] = self._pending_likes.setdefault(message_id, {})
+            if user_id not in message_likes:
+                self._pending_operations += 1
+            message_likes[user_id] = liked
+            self.received_operations += 1
+            if self._pending_operations >= self._flush_max_operations:
+                self._flush_requested.set()
+
+    def pending_like(self, message_id:ObjectId, user_id:str)->Optional[bool]:
+        """
+        Buffered like state of user_id for message_id
+        :param message_id: message _id
+        :param user_id: unique user identifier
+        :return: buffered like state or None if nothing is buffered for the pair
+        """
+        with self._lock:
+            return self._pending_likes.get(message_id, {}).get(user_id)
+
+    def discard(self, message_ids:Iterable[ObjectId])->None:
+        """
+        Drop buffered likes of deleted messages.
+        Likes of messages not given are skipped by the flush once their message is deleted,
+        likes already taken by a running flush are deleted by its check of deleted messages
+        :param message_ids: _id of deleted messages
+        :return: None
+        """
+        with self._lock:
+            for message_id in message_ids:
+                self._pending_operations -= len(self._pending_likes.pop(message_id, {}))
+                self._pending_like_counts.pop(message_id, None)
+
+    def flush(self)->None:
+        """
+        Write buffered likes: upsert/delete like documents and apply the resulting like_count changes.
+        like_count changes are counted from the like writes that succeeded only, so a retry never counts them twice.
+        Only the writes that failed are buffered again, unless a newer state of the same like was buffered meanwhile
+        :return: None
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending_likes, self._pending_likes = self._pending_likes, {}
+                pending_like_counts, self._pending_like_counts = self._pending_like_counts, {}
+                self._pending_operations = 0
+            if not pending_likes and not pending_like_counts:
+                return
+            start:float = time.perf_counter()
+            like_counts, failed_likes = self.__write_likes(pending_likes)
+            for message_id, like_count in pending_like_counts.items():
+                like_counts[message_id] = like_counts.get(message_id, 0) + like_count
+            failed_like_counts = self.__write_like_counts(like_counts)
+            if failed_likes or failed_like_counts:
+                self.failed_flushes += 1
+                self.__requeue(failed_likes, failed_like_counts)
+            self.flushes += 1
+            self.written_operations += sum(len(message_likes) for message_likes in pending_likes.values()) \
+                - sum(len(message_likes) for message_likes in failed_likes.values())
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+
+    def close(self)->None:
+        """
+        Stop the flusher thread and flush what is still buffered, called on shutdown
+        :return: None
+        """
+        self._closed = True
+        self._flush_requested.set()
+        self._flusher.join()
+        self.flush()
+
+    def stats(self)->Dict[str, float]:
+        """
+        Buffer depth and flush counters
+        :return: dict of counter name to value
+        """
+        with self._lock:
+            return {
+                "depth": self._pending_operations,
+                "received_operations": self.received_operations,
+                "written_operations": self.written_operations,
+                "flushes": self.flushes,
+                "failed_flushes": self.failed_flushes,
+                "last_flush_ms": round(self.last_flush_ms, 3),
+                "max_flush_ms": round(self.max_flush_ms, 3),
+            }
+
+    def __run_flusher(self)->None:
+        while not self._closed:
+            self._flush_requested.wait(self._flush_interval_seconds)
+            self._flush_requested.clear()
+            self.flush()
+
+    def __requeue(self, pending_likes:Dict[ObjectId, Dict[str, bool]], pending_like_counts:Dict[ObjectId, int])->None:
+        with self._lock:
+            for message_id, message_likes in pending_likes.items():
+                buffered_likes:Dict[str, bool] = self._pending_likes.setdefault(message_id, {})
+                for user_id, liked in message_likes.items():
+                    if user_id not in buffered_likes:
+                        buffered_likes[user_id] = liked
+                        self._pending_operations += 1
+            for message_id, like_count in pending_like_counts.items():
+                self._pending_like_counts[message_id] = self._pending_like_counts.get(message_id, 0) + like_count
+
+    def __existing_thread_ids(self, message_ids:Iterable[ObjectId])->Dict[ObjectId, List[ObjectId]]:
+        """
+        :param message_ids: message _ids
+        :return: thread_ids of the likes of every message of message_ids that exists, by message _id
+        """
+        return {message_data["_id"]: odm_mapping.like_thread_ids(message_data) for message_data in
+                self._messages_collection.find({"_id": {"$in": list(message_ids)}}, projection={"ancestor_ids": 1})}
+
+    def __write_likes(self, pending_likes:Dict[ObjectId, Dict[str, bool]])\
+            ->Tuple[Dict[ObjectId, int], Dict[ObjectId, Dict[str, bool]]]:
+        """
+        Upsert added likes in one bulk write and delete removed likes with one delete_many per message.
+        Likes of deleted messages are dropped: they are skipped if the message is already deleted,
+        and deleted again if the message was deleted while they were upserted
+        :param pending_likes: message _id to user_id to like state
+        :return: message _id to like_count change, counting only likes that were really added or removed,
+            and the likes whose write failed, message _id to user_id to like state
+        """
+        like_counts:Dict[ObjectId, int] = {}
+        failed_likes:Dict[ObjectId, Dict[str, bool]] = {}
+        try:
+            thread_ids:Dict[ObjectId, List[ObjectId]] = self.__existing_thread_ids(pending_likes)
+        except Exception as e:
+            logging.error(f"Like write buffer flush failed, likes are buffered again: {e}")
+            return like_counts, pending_likes
+        upserts:List[Tuple[ObjectId, str, UpdateOne]] = []
+        for message_id, message_likes in pending_likes.items():
+            if message_id not in thread_ids:
+                continue
+            upserts.extend((message_id, user_id, UpdateOne({"message_id": message_id, "user_id": user_id},
+                                                           {"$setOnInsert": odm_mapping.new_like_document(
+                                                               message_id, user_id, thread_ids[message_id])},
+                                                           upsert=True))
+                           for user_id, liked in message_likes.items() if liked)
+            removed_user_ids:List[str] = [user_id for user_id, liked in message_likes.items() if not liked]
+            if removed_user_ids:
+                try:
+                    deleted_count:int = self._likes_collection.delete_many(
+                        {"message_id": message_id, "user_id": {"$in": removed_user_ids}}).deleted_count
+                    like_counts[message_id] = like_counts.get(message_id, 0) - deleted_count
+                except Exception as e:
+                    logging.error(f"Like write buffer like delete failed, likes are buffered again: {e}")
+                    failed_likes.setdefault(message_id, {}).update((user_id, False) for user_id in removed_user_ids)
+        if not upserts:
+            return like_counts, failed_likes
+        try:
+            result:BulkWriteResult = self._likes_collection.bulk_write([upsert for _, _, upsert in upserts], ordered=False)
+            upserted_indexes:List[int] = list(result.upserted_ids)
+            failed_indexes:List[int] = []
+        except BulkWriteError as e:
+            upserted_indexes = [upserted["index"] for upserted in e.details.get("upserted", [])]
+            # duplicate key of a like inserted concurrently by another process, that like isn't counted again
+            failed_indexes = [write_error["index"] for write_error in e.details.get("writeErrors", [])
+                              if write_error.get("code")!=DUPLICATE_KEY_ERROR_CODE]
+        except Exception as e:
+            # outcome unknown: retried, an upsert of a like already written matches it and isn't counted
+            logging.error(f"Like write buffer like upsert failed, likes are buffered again: {e}")
+            upserted_indexes, failed_indexes = [], list(range(len(upserts)))
+        for index in upserted_indexes:
+            like_counts[upserts[index][0]] = like_counts.get(upserts[index][0], 0) + 1
+        for index in failed_indexes:
+            failed_likes.setdefault(upserts[index][0], {})[upserts[index][1]] = True
+        upserted_message_ids:Set[ObjectId] = {upserts[index][0] for index in upserted_indexes}
+        if upserted_message_ids:
+            try:
+                # delete_message_blog deletes likes after the message, likes upserted after that are deleted here
+                deleted_message_ids:Set[ObjectId] = upserted_message_ids - set(self.__existing_thread_ids(upserted_message_ids))
+                if deleted_message_ids:
+                    self._likes_collection.delete_many({"message_id": {"$in": list(deleted_message_ids)}})
+            except Exception as e:
+                logging.error(f"Like write buffer check of deleted messages failed: {e}")
+        return like_counts, failed_likes
+
+    def __write_like_counts(self, like_counts:Dict[ObjectId, int])->Dict[ObjectId, int]:
+        """
+        Apply like_count changes with one bulk write, bumping the version of every changed message
+        :param like_counts: message _id to like_count change
+        :return: the like_count changes that failed
+        """
+        changed_message_ids:List[ObjectId] = [message_id for message_id, like_count in like_counts.items() if like_count!=0]
+        if not changed_message_ids:
+            return {}
+        try:
+            self._messages_collection.bulk_write([UpdateOne({"_id": message_id},
+                                                            {"$inc": {"like_count": like_counts[message_id], "version": 1}})
+                                                  for message_id in changed_message_ids], ordered=False)
+            failed_indexes:Set[int] = set()
+        except BulkWriteError as e:
+            failed_indexes = {write_error["index"] for write_error in e.details.get("writeErrors", [])}
+            logging.error(f"Like write buffer like_count update failed for {len(failed_indexes)} messages, retried on next flush")
+        except Exception as e:
+            # outcome unknown: retried, which applies the changes twice if they were written
+            logging.error(f"Like write buffer like_count update failed, retried on next flush: {e}")
+            failed_indexes = set(range(len(changed_message_ids)))
+        return {changed_message_ids[index]: like_counts[changed_message_ids[index]] for index in failed_indexes}
@@ -0,0 +1,118 @@
+from pymongo import UpdateMany, UpdateOne
+from pymongo.synchronous.collection import Collection
+from bson import ObjectId
+from typing import Dict, List
+import src.db.mongo_db.odm_mapping as odm_mapping
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+MIGRATION_BATCH_SIZE:int = 1000
+
+
+def backfill_ancestor_ids(messages_collection:Collection, batch_size:int = MIGRATION_BATCH_SIZE)->int:
+    """
+    Set ancestor_ids on messages created before it was stored.
+    Threads are walked one reply level at a time starting from posts,
+    so the number of queries grows with thread depth and not with message count.
+    Safe to run again, existing ancestor_ids are overwritten with the same value
+    :param messages_collection: messages collection
+    :param batch_size: number of parent messages handled per bulk write
+    :return: number of messages updated
+    """
+    updated_count:int = messages_collection.update_many({"reply_to_message_id": None},
+                                                        {"$set": {"ancestor_ids": []}}).modified_count
+    parent_ids:List[ObjectId] = [post["_id"] for post in
+                                 messages_collection.find({"reply_to_message_id": None}, projection={"_id": 1})]
+    parent_ancestor_ids:Dict[ObjectId, List[ObjectId]] = {parent_id: [] for parent_id in parent_ids}
+    depth:int = 0
+    while parent_ancestor_ids:
+        depth += 1
+        next_parent_ancestor_ids:Dict[ObjectId, List[ObjectId]] = {}
+        parent_ids = list(parent_ancestor_ids)
+        for batch_start in range(0, len(parent_ids), batch_size):
+            batch:List[ObjectId] = parent_ids[batch_start:batch_start + batch_size]
+            updates = [UpdateMany({"reply_to_message_id": parent_id},
+                                  {"$set": {"ancestor_ids": parent_ancestor_ids[parent_id] + [parent_id]}})
+                       for parent_id in batch]
+            updated_count += messages_collection.bulk_write(updates, ordered=False).modified_count
+            for reply in messages_collection.find({"reply_to_message_id": {"$in": batch}},
+                                                  projection={"_id": 1, "reply_to_message_id": 1}):
+                next_parent_ancestor_ids[reply["_id"]] = parent_ancestor_ids[reply["reply_to_message_id"]] \
+                                                         + [reply["reply_to_message_id"]]
+        logging.info(f"Backfilled ancestor_ids of reply depth {depth}")
+        parent_ancestor_ids = next_parent_ancestor_ids
+
+    return updated_count
+
+
+def migrate_user_likes(messages_collection:Collection, likes_collection:Collection,
+                       batch_size:int = MIGRATION_BATCH_SIZE)->int:
+    """
+    Move user_likes arrays of messages to one likes collection document per (message_id, user_id),
+    set like_count from the distinct likers and remove user_likes.
+    Safe to run again, likes are upserted and migrated messages no longer have user_likes
+    :param messages_collection: messages collection
+    :param likes_collection: likes collection with unique (message_id, user_id) index
+    :param batch_size: number of messages handled per bulk write
+    :return: number of messages migrated
+    """
+    migrated_count:int = 0
+    like_upserts:List[UpdateOne] = []
+    message_updates:List[UpdateOne] = []
+    for message in messages_collection.find({"user_likes": {"$exists": True}},
+                                            projection={"user_likes": 1, "ancestor_ids": 1}):
+        user_ids = set(message["user_likes"])
+        like_upserts.extend(UpdateOne({"message_id": message["_id"], "user_id": user_id},
+                                      {"$setOnInsert": odm_mapping.new_like_document(
+                                          message["_id"], user_id, odm_mapping.like_thread_ids(message))},
+                                      upsert=True) for user_id in user_ids)
+        message_updates.append(UpdateOne({"_id": message["_id"]},
+                                         {"$set": {"like_count": len(user_ids)}, "$unset": {"user_likes": ""}}))
+        if len(message_updates) >= batch_size:
+            migrated_count += _write_migrated_likes(messages_collection, likes_collection, like_upserts, message_updates)
+            like_upserts, message_updates = [], []
+    if message_updates:
+        migrated_count += _write_migrated_likes(messages_collection, likes_collection, like_upserts, message_updates)
+    logging.info(f"Migrated user_likes of {migrated_count} messages")
+
+    return migrated_count
+
+
+def backfill_like_thread_ids(messages_collection:Collection, likes_collection:Collection,
+                             batch_size:int = MIGRATION_BATCH_SIZE)->int:
+    """
+    Set thread_ids on likes created before it was stored, from the ancestor_ids of their message,
+    so run it after backfill_ancestor_ids. Likes of messages that no longer exist are deleted.
+    Safe to run again, only likes without thread_ids are read
+    :param messages_collection: messages collection
+    :param likes_collection: likes collection
+    :param batch_size: number of liked messages handled per bulk write
+    :return: number of likes updated
+    """
+    updated_count:int = 0
+    message_ids:List[ObjectId] = likes_collection.distinct("message_id", {"thread_ids": {"$exists": False}})
+    for batch_start in range(0, len(message_ids), batch_size):
+        batch:List[ObjectId] = message_ids[batch_start:batch_start + batch_size]
+        thread_ids:Dict[ObjectId, List[ObjectId]] = {
+            message["_id"]: odm_mapping.like_thread_ids(message) for message in
+            messages_collection.find({"_id": {"$in": batch}}, projection={"ancestor_ids": 1})}
+        updates = [UpdateMany({"message_id": message_id, "thread_ids": {"$exists": False}},
+                              {"$set": {"thread_ids": thread_ids[message_id]}})
+                   for message_id in batch if message_id in thread_ids]
+        if updates:
+            updated_count += likes_collection.bulk_write(updates, ordered=False).modified_count
+        deleted_message_ids:List[ObjectId] = [message_id for message_id in batch if message_id not in thread_ids]
+        if deleted_message_ids:
+            likes_collection.delete_many({"message_id": {"$in": deleted_message_ids}})
+    logging.info(f"Backfilled thread_ids of {updated_count} likes")
+
+    return updated_count
+
+
+def _write_migrated_likes(messages_collection:Collection, likes_collection:Collection,
+                          like_upserts:List[UpdateOne], message_updates:List[UpdateOne])->int:
+    # likes are written first, so an interrupted run keeps user_likes of messages to retry
+    if like_upserts:
+        likes_collection.bulk_write(like_upserts, ordered=False)
+    return messages_collection.bulk_write(message_updates, ordered=False).modified_count
@@ -1,17 +1,53 @@
-from pymongo.results import UpdateResult, InsertOneResult
+from pymongo.results import UpdateResult, InsertOneResult, DeleteResult
 from pymongo.synchronous.collection import Collection
 from pymongo.synchronous.database import Database
-from src.server.flask.exceptions import ResourceNotFoundError, DatabaseError, BlogAppException
-from src.db.odm_blog import Post, Comment, Message, User
+from src.server.flask.exceptions import ResourceNotFoundError, DatabaseError, BlogAppException, UnauthorizedError
+from src.db.odm_blog import Post, Comment, Message, MessageThread, NewMessage, User, Like
 from src.db.repository import Repository
-from typing import List, Mapping, Optional, Union
-from pymongo import MongoClient
+import src.db.mongo_db.migrations as migrations
+import src.db.mongo_db.indexes as indexes
+import src.db.mongo_db.odm_mapping as odm_mapping
+from src.db.mongo_db.like_write_buffer import LikeWriteBuffer, LIKE_WRITE_BEHIND
+from src.db.mongo_db.thread_builder import ThreadBuilder
+from typing import Dict, Iterator, List, Mapping, Optional, Union
+from pymongo import MongoClient, ReturnDocument
+import pymongo
+from pymongo.synchronous.cursor import Cursor
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson import ObjectId
+from threading import Event, Thread
+import atexit
 import os
 import logging
+import time
 
 logging.basicConfig(level=logging.INFO)
 
+# replies read for a single thread request, bounds its memory whatever the thread size
+THREAD_MESSAGES_LIMIT:int = int(os.environ.get('THREAD_MESSAGES_LIMIT', 1000))
+# posts read per getMore of a streamed feed page, bounds the documents held in memory by a streaming request
+POSTS_STREAM_BATCH_SIZE:int = int(os.environ.get('POSTS_STREAM_BATCH_SIZE', 100))
+# longest wait of a readiness ping, a ping of an unreachable MongoDB fails after it instead of the server selection timeout
+MONGO_PING_TIMEOUT_SECONDS:float = float(os.environ.get('MONGO_PING_TIMEOUT_SECONDS', 2))
+# wait between attempts of background index creation while MongoDB is unreachable
+MONGO_INDEX_RETRY_SECONDS:float = float(os.environ.get('MONGO_INDEX_RETRY_SECONDS', 5))
+
+
+def mongo_connection_string()->str:
+    """
+    Build MongoDB connection string from environment variables SERVER_API_USER, SERVER_API_PASSWORD, MONGO_HOST, MONGO_PORT
+    :return: connection string
+    """
+    MONGO_USER:str = str(os.getenv("SERVER_API_USER"))
+    MONGO_PASSWORD:str = str(os.getenv("SERVER_API_PASSWORD"))
+    MONGO_HOST:str = str(os.getenv("MONGO_HOST"))
+    MONGO_PORT:str = str(os.getenv("MONGO_PORT"))
+    logging.info(f"User: {MONGO_USER}")
+    logging.info(f"Password: {MONGO_PASSWORD}")
+    logging.info(f"Host: {MONGO_HOST}")
+    logging.info(f"Port: {MONGO_PORT}")
+    return f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/"
+
 
 class MongoDBRepository(Repository):
     _instance: Optional['MongoDBRepository'] = None
@@ -23,90 +59,186 @@ class MongoDBRepository(Repository):
             cls.__init_mongo_client()  # Initialize MongoDB client
         return cls._instance
 
+    @classmethod
+    def close(cls)->None:
+        """
+        Flush buffered likes and close MongoClient, the next MongoDBRepository() creates a new client.
+        Called by a pre-fork server master before forking workers
+        :return: None
+        """
+        if cls._instance is None:
+            return
+        cls._closed.set()
+        if cls._like_write_buffer is not None:
+            cls._like_write_buffer.close()
+        cls._client.close()
+        cls._instance = None
+
+    @classmethod
+    def reset_after_fork(cls)->None:
+        """
+        Forget the MongoClient inherited from the parent process, without using it, as pymongo requires.
+        The next MongoDBRepository() in the child creates its own client
+        :return: None
+        """
+        cls._instance = None
+
     @classmethod
     def __init_mongo_client(cls):
         """
-        Create MongoClient and setup databases and collections
+        Create MongoClient and setup databases and collections.
+        Doesn't wait for MongoDB: MongoClient connects in the background and indexes are created by a background thread,
+        so the app starts whatever MongoDB latency is, and requests fail with DatabaseError until it is reachable
         :return: None
         """
-        MONGO_USER:str = str(os.getenv("SERVER_API_USER"))
-        MONGO_PASSWORD:str = str(os.getenv("SERVER_API_PASSWORD"))
-        MONGO_HOST:str = str(os.getenv("MONGO_HOST"))
-        MONGO_PORT:str = str(os.getenv("MONGO_PORT"))
-        logging.info(f"User: {MONGO_USER}")
-        logging.info(f"Password: {MONGO_PASSWORD}")
-        logging.info(f"Host: {MONGO_HOST}")
-        logging.info(f"Port: {MONGO_PORT}")
-        CONNECTION_STRING = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}/"
+        CONNECTION_STRING = mongo_connection_string()
         logging.info(f"ConnectionString: {CONNECTION_STRING}")
         cls._client:MongoClient = MongoClient(CONNECTION_STRING)
-        try:
-            cls._client.server_info()
-        except Exception as e:
-            raise DatabaseError("MongoDB Connection Error") from e
         cls._messages_db:Database = cls._client["messages"]
         cls._users_db:Database = cls._client["users"]
         cls._messages_collection:Collection = cls._messages_db["comments"]
-        cls._messages_collection.create_index(
-        [("reply_to_message_id", 1)],
-            partialFilterExpression={"reply_to_message_id": {"$eq": None}}
-        )
+        # one document per like, like_count on the message is kept in sync with it
+        cls._likes_collection:Collection = cls._messages_db["likes"]
+        # single document per feed holding its version, bumped when a post is created or deleted
+        cls._feeds_collection:Collection = cls._messages_db["feeds"]
+        cls._like_write_buffer:Optional[LikeWriteBuffer] = None
+        if LIKE_WRITE_BEHIND:
+            cls._like_write_buffer = LikeWriteBuffer(cls._messages_collection, cls._likes_collection)
+            atexit.register(cls._like_write_buffer.close)
         cls._users_collection:Collection = cls._users_db["users"]
-        cls._users_collection.create_index("user_id", unique=True)
+        cls._indexes_created:Event = Event()
+        cls._closed:Event = Event()
+        Thread(target=cls.__create_indexes_in_background, name='mongo_indexes', daemon=True).start()
+
+    @classmethod
+    def create_indexes(cls)->None:
+        """
+        Create indexes of indexes.COLLECTION_INDEXES, indexes that already exist are left as they are
+        :return: None
+        :raises: DatabaseError if MongoDB can't be reached
+        """
+        try:
+            indexes.create_indexes(cls._client)
+        except Exception as e:
+            raise DatabaseError("MongoDB Connection Error") from e
+        cls._indexes_created.set()
+
+    @classmethod
+    def __create_indexes_in_background(cls)->None:
+        """
+        Create indexes, retried every MONGO_INDEX_RETRY_SECONDS until MongoDB is reachable or the client is closed,
+        then log indexes differing from the registry
+        :return: None
+        """
+        start:float = time.perf_counter()
+        closed:Event = cls._closed
+        while not closed.is_set() and not cls._indexes_created.is_set():
+            try:
+                cls.create_indexes()
+                logging.info(f"MongoDB indexes created in {(time.perf_counter() - start) * 1000:.0f}ms")
+                indexes.log_index_drift(cls._client)
+            except DatabaseError as e:
+                logging.warning(f"MongoDB index creation failed, retrying in {MONGO_INDEX_RETRY_SECONDS}s: {e.__cause__}")
+                closed.wait(MONGO_INDEX_RETRY_SECONDS)
+            except Exception as e:
+                logging.warning(f"MongoDB index drift check failed: {e}")
 
-    @staticmethod
-    def __message_data_to_message_object(message_data:Mapping[str,any])->Message:
+    def indexes_created(self)->bool:
         """
-        create Post or Comment object from message_data
-        :param message_data: message data from MongoDB
-        :return: Message object representing message
+        :return: True once indexes of all collections were created
         """
-        if message_data["reply_to_message_id"] is None:
-            return MongoDBRepository.__message_data_to_post_object(message_data)
-        else:
-            return MongoDBRepository.__message_data_to_comment_object(message_data)
+        return self._indexes_created.is_set()
 
-    @staticmethod
-    def __message_data_to_post_object(message_data:Mapping[str,any])->Post:
+    def index_drift(self)->Dict[str, Dict[str, List[str]]]:
         """
-        create Post object from message_data
-        :param message_data: message data from MongoDB
-        :return: Post object representing message
+        Indexes in MongoDB differing from indexes.COLLECTION_INDEXES, see indexes.index_drift
+        :return: dict of "database.collection" to lists of missing, extra and changed index names
+        :raises: DatabaseError if MongoDB can't be reached
         """
-        return Post(message_id=str(message_data["_id"]), content=message_data["content"],
-                    user_id_owner=message_data["user_id_owner"],
-                    user_likes=message_data["user_likes"])
+        try:
+            return indexes.index_drift(self._client)
+        except Exception as e:
+            raise DatabaseError("MongoDB Connection Error") from e
 
-    @staticmethod
-    def __message_data_to_comment_object(message_data:Mapping[str,any])->Comment:
+    def ping(self)->None:
         """
-        create Comment object from message_data
-        :param message_data: message data from MongoDB
-        :return: Comment object representing message
+        Check MongoDB is reachable, waiting at most MONGO_PING_TIMEOUT_SECONDS
+        :return: None
+        :raises: DatabaseError if MongoDB can't be reached
         """
-        return Comment(message_id=str(message_data["_id"]), content=message_data["content"],
-                user_id_owner=message_data["user_id_owner"],
-                user_likes=message_data["user_likes"],
-                reply_to_message_id=str(message_data["reply_to_message_id"]))
+        try:
+            with pymongo.timeout(MONGO_PING_TIMEOUT_SECONDS):
+                self._client.admin.command('ping')
+        except Exception as e:
+            raise DatabaseError("MongoDB Connection Error") from e
 
+    def backfill_ancestor_ids(self)->int:
+        """
+        Migration setting ancestor_ids on messages created before it was stored
+        :return: number of messages updated
+        :raises DatabaseError for DB operation fail
+        """
+        try:
+            return migrations.backfill_ancestor_ids(self._messages_collection)
+        except Exception as e:
+            raise DatabaseError from e
 
-    def get_posts_blog(self, posts_limit:int, start_index:int = 0)->List[Post]:
+    def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
         """
-        Get up to posts_limit Post messages from start_index
+        Get up to posts_limit Post messages sorted by _id, newest first.
+        With a cursor the page starts right after the cursor _id using the posts_feed index,
+        so the cost of a page doesn't grow with its depth. Otherwise skip start_index posts
         :param posts_limit: post limit for pagination
-        :param start_index: starting post index
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
         :return: list of Post objects retrieved from db
-        :raises DatabaseError if db operation fail
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
         """
+        posts:Cursor = self.__find_posts(posts_limit, start_index, cursor)
         try:
-            query = {"reply_to_message_id": {"$eq": None}}
-            posts = self._messages_collection.find(query).skip(start_index).limit(posts_limit)
-            posts_objects:List[Post] = [MongoDBRepository.__message_data_to_post_object(post_data) for post_data in posts]
+            posts_objects:List[Post] = [odm_mapping.message_data_to_post_object(post_data) for post_data in posts]
         except Exception as e:
             raise DatabaseError from e
 
         return posts_objects
 
+    def iter_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->Iterator[Post]:
+        """
+        Iterate over the posts of get_posts_blog reading POSTS_STREAM_BATCH_SIZE documents per round trip,
+        so only one batch is held in memory whatever posts_limit is
+        :param posts_limit: post limit for pagination
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
+        :return: iterator of Post objects retrieved from db
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
+        """
+        posts:Cursor = self.__find_posts(posts_limit, start_index, cursor).batch_size(POSTS_STREAM_BATCH_SIZE)
+        try:
+            for post_data in posts:
+                yield odm_mapping.message_data_to_post_object(post_data)
+        except Exception as e:
+            raise DatabaseError from e
+        finally:
+            posts.close()
+
+    def __find_posts(self, posts_limit:int, start_index:int, cursor:str)->Cursor:
+        """
+        Build the cursor of a posts page, no document is read until it is iterated
+        :param posts_limit: post limit for pagination
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
+        :return: pymongo cursor of post documents, newest first
+        :raises: InputValidationError if cursor is malformed
+        """
+        posts:Cursor = self._messages_collection.find(odm_mapping.posts_query(cursor)).sort("_id", -1)
+        if cursor=='':
+            posts = posts.skip(start_index)
+        return posts.limit(posts_limit)
+
     def get_message_blog(self, message_id:str, user_id_owner:str='') ->Message:
         """
         Get message using message_id as document identifier
@@ -133,108 +265,332 @@ class MongoDBRepository(Repository):
         except Exception as e:
             raise DatabaseError from e
 
-        return MongoDBRepository.__message_data_to_message_object(message_data)
+        return odm_mapping.message_data_to_message_object(message_data)
+
+
+    def get_message_version_blog(self, message_id:str)->int:
+        """
+        Get message version with a projection of the _id index lookup, without reading the message content
+        :param message_id: unique identifier for message in db
+        :return: message version
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        try:
+            message_data:Mapping[str,any] = self._messages_collection.find_one({"_id": ObjectId(message_id)},
+                                                                               projection={"version": 1})
+        except Exception as e:
+            raise DatabaseError from e
+        if message_data is None:
+            raise ResourceNotFoundError(f"Message ID {message_id} not found")
+        return message_data.get("version", 0)
+
+    def get_feed_version_blog(self)->int:
+        """
+        Get posts feed version from its feeds collection document
+        :return: feed version, 0 until the first post is created
+        :raises: DatabaseError for DB operation fail
+        """
+        try:
+            feed_data:Mapping[str,any] = self._feeds_collection.find_one({"_id": "posts"})
+        except Exception as e:
+            raise DatabaseError from e
+        return 0 if feed_data is None else feed_data["version"]
+
+    @classmethod
+    def __bump_feed_version(cls)->None:
+        """
+        Increment posts feed version, called after posts are created or deleted.
+        Edits and likes only change the version of their message, feed pages show them within the weak feed ETag staleness
+        :return: None
+        """
+        cls._feeds_collection.update_one({"_id": "posts"}, {"$inc": {"version": 1}}, upsert=True)
+
+    def get_messages_blog(self, message_ids:List[str])->List[Optional[Message]]:
+        """
+        Get messages of all message_ids with a single $in query
+        :param message_ids: unique identifiers for messages in db
+        :return: list with the Message of each message_id in input order, None for messages that don't exist
+        :raises: DatabaseError for DB operation fail
+        """
+        try:
+            messages = self._messages_collection.find({"_id": {"$in": list({ObjectId(message_id) for message_id in message_ids})}})
+            message_objects:Dict[str, Message] = {str(message_data["_id"]): odm_mapping.message_data_to_message_object(message_data)
+                                                  for message_data in messages}
+        except Exception as e:
+            raise DatabaseError from e
+
+        return [message_objects.get(str(ObjectId(message_id))) for message_id in message_ids]
+
+    def get_comments_blog(self, message_id:str, comments_limit:int, cursor:str = '')->List[Comment]:
+        """
+        Get up to comments_limit replies of message sorted by _id, oldest first.
+        Pages are read from the comments_by_parent index starting right after the cursor _id
+        :param message_id: unique identifier for replied message
+        :param comments_limit: comment limit for pagination
+        :param cursor: opaque cursor of the last comment of the previous page
+        :return: list of Comment objects
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
+        """
+        query:dict = odm_mapping.comments_query(message_id, cursor)
+        try:
+            comments = self._messages_collection.find(query).sort("_id", 1).limit(comments_limit)
+            comment_objects:List[Comment] = [odm_mapping.message_data_to_comment_object(comment_data)
+                                             for comment_data in comments]
+        except Exception as e:
+            raise DatabaseError from e
+
+        return comment_objects
 
+    def get_thread_blog(self, message_id:str, max_depth:int, limit:int)->MessageThread:
+        """
+        Get message and its replies level by level, each level with one query on the comments_by_parent index
+        bounded to limit replies per message and all levels to THREAD_MESSAGES_LIMIT replies.
+        Replies are read oldest first, a single extra reply is only read to mark truncated messages
+        :param message_id: unique identifier for message in db
+        :param max_depth: number of reply levels to return
+        :param limit: maximum replies returned for each message
+        :return: MessageThread of message, with truncated set on every message whose replies were left out
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        try:
+            message_data:Mapping[str,any] = self._messages_collection.find_one({"_id": ObjectId(message_id)},
+                                                                               projection={"ancestor_ids": 0})
+            if message_data is None:
+                raise ResourceNotFoundError(f"Message ID {message_id} not found")
+            thread:MessageThread = MessageThread(message=odm_mapping.message_data_to_message_object(message_data),
+                                                 replies=[])
+            thread_builder:ThreadBuilder = ThreadBuilder(thread, max_depth, limit, THREAD_MESSAGES_LIMIT,
+                                                         self._messages_collection.name,
+                                                         odm_mapping.message_data_to_message_object)
+            pipeline:Optional[List[dict]] = thread_builder.next_pipeline()
+            while pipeline is not None:
+                thread_builder.add_replies(list(self._messages_collection.aggregate(pipeline)))
+                pipeline = thread_builder.next_pipeline()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return thread
+
+    def __get_reply_ancestor_ids(self, reply_to_message_id:ObjectId)->List[ObjectId]:
+        """
+        Get ancestor_ids of a reply to reply_to_message_id: the ancestors of the replied message and itself
+        :param reply_to_message_id: _id of message being replied
+        :return: list of ancestor _id values, root post first
+        :raises: ResourceNotFoundError if reply_to_message_id doesn't exist in DB
+        """
+        parent_data:Mapping[str,any] = self._messages_collection.find_one({"_id": reply_to_message_id},
+                                                                          projection={"ancestor_ids": 1})
+        if parent_data is None:
+            raise ResourceNotFoundError(f"Message ID {reply_to_message_id} not found")
+        return parent_data.get("ancestor_ids", []) + [reply_to_message_id]
 
     def create_message_blog(self, content:str, user_id_owner:str, reply_to_message_id:str)->Message:
         """
-        Create message and return Message object
+        Create message and return Message object built from the inserted document
         :param content: message text field
         :param user_id_owner: unique user_id of message creator
         :param reply_to_message_id: message_id of message being replied
         :return: Message object with message_id
-        :raises: DatabaseError for DB operation fail
+        :raises:
+            ResourceNotFoundError if reply_to_message_id doesn't exist in DB
+            DatabaseError for DB operation fail
         """
-        new_message = {
-            "content": content,
-            "user_id_owner": user_id_owner,
-            "user_likes": [],
-            "reply_to_message_id": None if reply_to_message_id =='' else ObjectId(reply_to_message_id)
-        }
+        new_message:dict = odm_mapping.new_message_document(
+            content, user_id_owner, None if reply_to_message_id=='' else ObjectId(reply_to_message_id), [])
         try:
+            if new_message["reply_to_message_id"] is not None:
+                new_message["ancestor_ids"] = self.__get_reply_ancestor_ids(new_message["reply_to_message_id"])
             insert_one_result:InsertOneResult = self._messages_collection.insert_one(new_message)
-            created_message_data = self._messages_collection.find_one({"_id": insert_one_result.inserted_id})
+            if new_message["reply_to_message_id"] is None:
+                self.__bump_feed_version()
         except BlogAppException as e:
             raise e
         except Exception as e:
             raise DatabaseError from e
 
-        return MongoDBRepository.__message_data_to_message_object(created_message_data)
+        new_message["_id"] = insert_one_result.inserted_id
+        return odm_mapping.message_data_to_message_object(new_message)
 
-    def edit_message_blog(self, message_id: str, new_content:str)->Message:
+    def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
         """
-        Change message content using update_one command
+        Create messages with one unordered insert_many, after checking all replied messages with one $in query
+        :param new_messages: messages to create
+        :return: list with the created Message or the error of each new message, in input order
+        :raises: DatabaseError for DB operation fail
+        """
+        replied_message_ids:List[ObjectId] = odm_mapping.replied_message_ids(new_messages)
+        results:List[Union[Message,BlogAppException,None]] = [None] * len(new_messages)
+        try:
+            parent_ancestor_ids:Dict[ObjectId, List[ObjectId]] = {} if not replied_message_ids else {
+                parent_data["_id"]: parent_data.get("ancestor_ids", []) for parent_data in
+                self._messages_collection.find({"_id": {"$in": replied_message_ids}}, projection={"ancestor_ids": 1})}
+            documents, document_indexes = odm_mapping.new_message_documents(new_messages, parent_ancestor_ids, results)
+            write_errors:Dict[int, dict] = {}
+            if documents:
+                try:
+                    self._messages_collection.insert_many(documents, ordered=False)
+                except BulkWriteError as e:
+                    write_errors = {write_error["index"]: write_error for write_error in e.details.get("writeErrors", [])}
+            if odm_mapping.inserted_post(documents, write_errors):
+                self.__bump_feed_version()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
+
+        return odm_mapping.created_messages_results(results, documents, document_indexes, write_errors)
+
+    def __raise_if_not_owner(self, message_id_obj:ObjectId, owner:str)->None:
+        """
+        Called when an owner conditional write matched nothing, to tell a missing message from one with another owner
+        :param message_id_obj: message _id
+        :param owner: user_id that was required to own the message
+        :return: None if message doesn't exist
+        :raises: UnauthorizedError if message exists and isn't owned by owner
+        """
+        if owner!='' and self._messages_collection.find_one({"_id": message_id_obj}, projection={"_id": 1}) is not None:
+            raise UnauthorizedError(f"User ID {owner} is not owner of message_id {message_id_obj}")
+
+    def edit_message_blog(self, message_id: str, new_content:str, owner:str = '')->Message:
+        """
+        Change message content using find_one_and_update command returning the edited document.
+        Ownership is part of the update filter, so owner checked edit is a single round trip.
+        Message version is incremented, the feed version isn't
         Manually raise Error if message isn't found
         :param message_id: unique identifier for message
         :param edited_content: message text field to be updated
+        :param owner: user_id that must own the message, '' to skip the ownership check
         :return: Message object with edited content
         :raises:
             ResourceNotFoundError if message_id doesn't exist in DB
+            UnauthorizedError if message isn't owned by owner
             DatabaseError for DB operation fail
         """
         message_id_obj:ObjectId = ObjectId(message_id)
         try:
-            update_result:UpdateResult = self._messages_collection.update_one(filter={"_id": message_id_obj},
-                                           update={"$set": {"content": new_content}},
-                                           upsert=False)
-            if update_result.matched_count == 0:
+            edited_message_data:Mapping[str,any] = self._messages_collection.find_one_and_update(
+                filter=odm_mapping.message_filter(message_id_obj, owner),
+                update={"$set": {"content": new_content}, "$inc": {"version": 1}},
+                upsert=False,
+                return_document=ReturnDocument.AFTER)
+            if edited_message_data is None:
+                self.__raise_if_not_owner(message_id_obj, owner)
                 raise ResourceNotFoundError(f"Message ID {message_id} not found")
-            if update_result.modified_count == 0:
-                raise DatabaseError(f"Edit message ID {message_id} fail")
-            edited_message_data = self._messages_collection.find_one({"_id": message_id_obj})
         except BlogAppException as e:
             raise e
         except Exception as e:
             raise DatabaseError from e
 
-        return MongoDBRepository.__message_data_to_message_object(edited_message_data)
+        return odm_mapping.message_data_to_message_object(edited_message_data)
 
 
-    def delete_message_blog(self, message_id:str)->Union[Message,None]:
+    def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
         """
-        Delete message using delete_one command
+        Delete message with find_one_and_delete, ownership is part of the delete filter.
+        Every reply in its thread is then deleted with a single delete_many on ancestor_ids,
+        followed by the likes of all deleted messages with a single delete_many on their thread_ids
         No error if message doesn't exist
         :param message_id: unique identifier for message
+        :param owner: user_id that must own the message, '' to skip the ownership check
         :return: Message object of deleted message, or None if already doesn't exist
-        :raises DatabaseError for DB operation fail
+        :raises:
+            UnauthorizedError if message isn't owned by owner
+            DatabaseError for DB operation fail
         """
+        message_id_obj:ObjectId = ObjectId(message_id)
+        try:
+            message_data:Mapping[str,any] = self._messages_collection.find_one_and_delete(
+                filter=odm_mapping.message_filter(message_id_obj, owner))
+            if message_data is None:
+                self.__raise_if_not_owner(message_id_obj, owner)
+                return None
+            self._messages_collection.delete_many({"ancestor_ids": message_id_obj})
+            self._likes_collection.delete_many({"thread_ids": message_id_obj})
+            if self._like_write_buffer is not None:
+                # buffered likes of deleted replies are dropped by the flush, their messages no longer exist
+                self._like_write_buffer.discard([message_id_obj])
+            if message_data["reply_to_message_id"] is None:
+                self.__bump_feed_version()
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
 
-        filter_message:dict = {"_id": ObjectId(message_id)}
-        message_data:Mapping[str,any] = self._messages_collection.find_one(filter=filter_message)
-        if message_data:
-            try:
-                # delete messages that replied to original message being deleted
-                reply_comments_to_delete = self._messages_collection.find({"reply_to_message_id": ObjectId(message_id)})
-                if reply_comments_to_delete != None:
-                    for comment_data in reply_comments_to_delete:
-                        self.delete_message_blog(comment_data["_id"])
-                self._messages_collection.delete_one({"_id": ObjectId(message_id)})
-            except BlogAppException as e:
-                raise e
-            except Exception as e:
-                raise DatabaseError from e
+        return odm_mapping.message_data_to_message_object(message_data)
 
-            return None if message_data is None \
-                else MongoDBRepository.__message_data_to_message_object(message_data)
+    def get_message_descendant_ids_blog(self, message_id:str)->List[str]:
+        """
+        Get message_id of every reply in the thread under message with the ancestor_ids index
+        :param message_id: unique identifier for message in db
+        :return: list of reply message_id values
+        :raises: DatabaseError for DB operation fail
+        """
+        try:
+            return [str(reply_id) for reply_id in self.__get_descendant_ids(ObjectId(message_id))]
+        except Exception as e:
+            raise DatabaseError from e
 
-    def __update_message_like(self, update_type:str, message_id:str, user_id:str)->bool:
+    def __get_descendant_ids(self, message_id_obj:ObjectId)->List[ObjectId]:
         """
-        update operation on likes array field of document based on message id
-        :param update_type:  $push or $pull DB operation
-        :param message_id: unique identifier for message_id
-        :param user_id: unique identifier for user that will be added/remove from likes field array
-        :return: True
-        :raises: DatabaseError for MongoDB fail
+        Get _id of every reply in the thread under message
+        :param message_id_obj: message _id
+        :return: list of reply _id values
+        """
+        return [reply["_id"] for reply in
+                self._messages_collection.find({"ancestor_ids": message_id_obj}, projection={"_id": 1})]
+
+    def __raise_if_message_not_found(self, message_id_obj:ObjectId)->None:
         """
-        message_id_obj = ObjectId(message_id)
+        Verify message exists
+        :param message_id_obj: message _id
+        :return: None
+        :raises: ResourceNotFoundError if message doesn't exist in DB
+        """
+        if self._messages_collection.find_one({"_id": message_id_obj}, projection={"_id": 1}) is None:
+            raise ResourceNotFoundError(f"Message ID {message_id_obj} not found")
+
+    def add_message_like(self, message_id: str, user_id: str) -> bool:
+        """
+        Insert like document and increment message like_count and version, the feed version isn't changed.
+        The like stores the thread_ids of the message read first, the unique (message_id, user_id) index
+        makes a repeated like a no-op
+        Does not verify user_id.
+        No error if user_id already likes message
+        With LIKE_WRITE_BEHIND the like is buffered and message_id isn't verified
+        :param message_id: unique identifier for message
+        :param user_id: unique user identifier to add to likes
+        :return: True if operation succeeded
+        :raises
+            ResourceNotFoundError if message_id doesn't exist in DB
+            DatabaseError for DB operation fail
+        """
+        message_id_obj:ObjectId = ObjectId(message_id)
+        if self._like_write_buffer is not None:
+            self._like_write_buffer.add(message_id_obj, user_id, True)
+            return True
         try:
+            liked_message_data:Optional[Mapping[str,any]] = self._messages_collection.find_one(
+                {"_id": message_id_obj}, projection={"ancestor_ids": 1})
+            if liked_message_data is None:
+                raise ResourceNotFoundError(f"Message ID {message_id} not found")
+            self._likes_collection.insert_one(odm_mapping.new_like_document(
+                message_id_obj, user_id, odm_mapping.like_thread_ids(liked_message_data)))
             update_result:UpdateResult = self._messages_collection.update_one(
-                upsert=False,
-                filter = {"_id": message_id_obj},
-                update={update_type: {"user_likes": user_id}}
-            )
+                {"_id": message_id_obj}, {"$inc": {"like_count": 1, "version": 1}})
             if update_result.matched_count==0:
+                # message deleted after it was read, the like may have been inserted after its likes were deleted
+                self._likes_collection.delete_one({"message_id": message_id_obj, "user_id": user_id})
                 raise ResourceNotFoundError(f"Message ID {message_id} not found")
+        except DuplicateKeyError:
+            return True
         except BlogAppException as e:
             raise e
         except Exception as e:
@@ -242,46 +598,108 @@ class MongoDBRepository(Repository):
 
         return True
 
-    def add_message_like(self, message_id: str, user_id: str) -> bool:
+
+    def remove_message_like(self, message_id: str, user_id: str) -> bool:
         """
-        Add the user_id to message Likes list
+        Delete like document and decrement message like_count if it existed, bumping versions as add_message_like does
         Does not verify user_id.
-        No error if user_id exists in like list
+        No error if user_id doesn't like message
+        With LIKE_WRITE_BEHIND the removal is buffered and message_id isn't verified
         :param message_id: unique identifier for message
-        :param user_id: unique user identifier to add to likes
+        :param user_id: unique user identifier to remove from likes
         :return: True if operation succeeded
         :raises
+            ResourceNotFoundError if message_id doesn't exist in DB
             DatabaseError for DB operation fail
         """
-        return self.__update_message_like("$push", message_id, user_id)
+        message_id_obj:ObjectId = ObjectId(message_id)
+        if self._like_write_buffer is not None:
+            self._like_write_buffer.add(message_id_obj, user_id, False)
+            return True
+        try:
+            delete_result:DeleteResult = self._likes_collection.delete_one({"message_id": message_id_obj, "user_id": user_id})
+            if delete_result.deleted_count==0:
+                self.__raise_if_message_not_found(message_id_obj)
+            else:
+                self._messages_collection.update_one({"_id": message_id_obj},
+                                                    {"$inc": {"like_count": -1, "version": 1}})
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise DatabaseError from e
 
+        return True
 
-    def remove_message_like(self, message_id: str, user_id: str) -> bool:
+    def get_message_likes_blog(self, message_id:str, likes_limit:int, cursor:str = '')->List[Like]:
         """
-        remove user_id from message Likes property
-        Does not verify user_id.
-        No error if user_id exists in like list
+        Get up to likes_limit likes of message sorted by _id, newest first, using the (message_id, _id) index
         :param message_id: unique identifier for message
-        :param user_id: unique user identifier to add to likes
-        :return: True if operation succeeded
-        :raises
+        :param likes_limit: like limit for pagination
+        :param cursor: opaque cursor of the last like of the previous page
+        :return: list of Like objects
+        :raises:
+            InputValidationError if cursor is malformed
             DatabaseError for DB operation fail
         """
-        return self.__update_message_like("$pull", message_id, user_id)
+        query:dict = odm_mapping.likes_query(message_id, cursor)
+        try:
+            likes = self._likes_collection.find(query).sort("_id", -1).limit(likes_limit)
+            like_objects:List[Like] = [odm_mapping.like_data_to_like_object(like_data) for like_data in likes]
+        except Exception as e:
+            raise DatabaseError from e
+
+        return like_objects
+
+    def is_message_liked(self, message_id:str, user_id:str)->bool:
+        """
+        Check if user_id likes message with a lookup on the unique (message_id, user_id) index
+        :param message_id: unique identifier for message
+        :param user_id: unique user identifier
+        :return: True if user_id likes message
+        :raises DatabaseError for DB operation fail
+        """
+        if self._like_write_buffer is not None:
+            pending_like:Optional[bool] = self._like_write_buffer.pending_like(ObjectId(message_id), user_id)
+            if pending_like is not None:
+                return pending_like
+        try:
+            return self._likes_collection.find_one({"message_id": ObjectId(message_id), "user_id": user_id},
+                                                   projection={"_id": 1}) is not None
+        except Exception as e:
+            raise DatabaseError from e
+
+    def like_write_buffer_stats(self)->Optional[Dict[str, float]]:
+        """
+        Depth and flush counters of the like write buffer
+        :return: dict of counter name to value, or None if LIKE_WRITE_BEHIND is off
+        """
+        return None if self._like_write_buffer is None else self._like_write_buffer.stats()
 
-    @staticmethod
-    def __user_data_to_user_object(user_data:Mapping[str,any]):
+    def backfill_like_thread_ids(self)->int:
         """
-         create User object from user_data
-        :param user_data: user data from MongoDB
-        :return: User object representing user in database
+        Migration setting thread_ids on likes created before it was stored, needs ancestor_ids of messages
+        :return: number of likes updated
+        :raises DatabaseError for DB operation fail
         """
-        return User(user_id=user_data["user_id"],password=user_data["password"], email=user_data["email"],name=user_data["name"], roles=user_data["roles"])
+        try:
+            return migrations.backfill_like_thread_ids(self._messages_collection, self._likes_collection)
+        except Exception as e:
+            raise DatabaseError from e
 
+    def migrate_user_likes(self)->int:
+        """
+        Migration moving user_likes arrays of messages to the likes collection and like_count
+        :return: number of messages migrated
+        :raises DatabaseError for DB operation fail
+        """
+        try:
+            return migrations.migrate_user_likes(self._messages_collection, self._likes_collection)
+        except Exception as e:
+            raise DatabaseError from e
 
     def create_user_blog(self, user_id: str,password:str, email:str, name:str, roles:List[str]) -> User:
         """
-        Add new user to users collection
+        Add new user to users collection, duplicate user_id is rejected by the unique user_id index
         :param user_id: unique identifier for user
         :param password: hashed password
         :param email: email address
@@ -291,24 +709,17 @@ class MongoDBRepository(Repository):
         :raises:
             DatabaseError for operation fail or if user already exists
         """
-        new_user = {
-            "user_id": user_id,
-            "password": password,
-            "email":email,
-            "name": name,
-            "roles": roles,
-        }
+        new_user:dict = odm_mapping.new_user_document(user_id, password, email, name, roles)
         try:
-            if self._users_collection.find_one(filter={"user_id": user_id}):
-                raise Exception(f"User Id {user_id} already exists")
-            insert_one_result: InsertOneResult = self._users_collection.insert_one(new_user)
-            created_user_data = self._users_collection.find_one({"_id": insert_one_result.inserted_id})
+            self._users_collection.insert_one(new_user)
+        except DuplicateKeyError as e:
+            raise DatabaseError(f"User Id {user_id} already exists") from e
         except BlogAppException as e:
             raise e
         except Exception as e:
             raise DatabaseError(e.args[0]) from e
 
-        return MongoDBRepository.__user_data_to_user_object(created_user_data)
+        return odm_mapping.user_data_to_user_object(new_user)
 
     def get_user_blog(self, user_id: str) -> User:
         """
@@ -329,12 +740,12 @@ class MongoDBRepository(Repository):
         except Exception as e:
             raise DatabaseError from e
 
-        return MongoDBRepository.__user_data_to_user_object(user_data)
+        return odm_mapping.user_data_to_user_object(user_data)
 
 
     def update_user_details_blog(self, user_id: str,password:str = '', email:str = '', name:str= '')->User:
         """
-        Update fields for user_id with update_one command
+        Update fields for user_id with find_one_and_update command returning the updated document
         Default '' value won't be updated
         :param user_id: unique identifier for user
         :param password: hashed password
@@ -346,27 +757,18 @@ class MongoDBRepository(Repository):
             ResourceNotFound for user_id that isn't found
         """
         filter:dict = {"user_id": user_id}
-        set_dict: dict = {}
-        if password!='':
-            set_dict['password'] = password
-        if email != '':
-            set_dict['email'] = email
-        if name!='':
-            set_dict['name'] = name
-        update: dict = {"$set": set_dict}
+        update:dict = odm_mapping.user_details_update(password, email, name)
         try:
-            update_result: UpdateResult = (self._users_collection.
-                    update_one(filter=filter,update=update,upsert=False))
-            if update_result.matched_count==0:
+            updated_user_data:Mapping[str,any] = self._users_collection.find_one_and_update(
+                filter=filter, update=update, upsert=False, return_document=ReturnDocument.AFTER)
+            if updated_user_data is None:
                 raise ResourceNotFoundError(f"User ID {user_id} not found")
-
-            updated_user_data = self._users_collection.find_one(filter=filter)
         except BlogAppException as e:
             raise e
         except Exception as e:
             raise DatabaseError from e
 
-        return MongoDBRepository.__user_data_to_user_object(updated_user_data)
+        return odm_mapping.user_data_to_user_object(updated_user_data)
 
 
     def delete_user_blog(self, user_id: str) -> Union[User,None]:
@@ -385,7 +787,7 @@ class MongoDBRepository(Repository):
             except Exception as e:
                 raise DatabaseError from e
 
-            return MongoDBRepository.__user_data_to_user_object(user_data)
+            return odm_mapping.user_data_to_user_object(user_data)
 
     def __update_user_role(self,update_type:str, user_id:str, role:str)->bool:
         """
@@ -0,0 +1,255 @@
+from bson import ObjectId
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+from src.db.odm_blog import Post, Comment, Message, NewMessage, User, Like
+from src.db.pagination import decode_cursor
+from src.server.flask.exceptions import ResourceNotFoundError, DatabaseError, BlogAppException
+
+# Mapping between MongoDB documents and ODM objects, with the filters and queries built from request values,
+# shared by MongoDBRepository and AsyncMongoDBRepository which only differ in how they run them
+
+
+def message_data_to_message_object(message_data:Mapping[str,any])->Message:
+    """
+    create Post or Comment object from message_data
+    :param message_data: message data from MongoDB
+    :return: Message object representing message
+    """
+    if message_data["reply_to_message_id"] is None:
+        return message_data_to_post_object(message_data)
+    return message_data_to_comment_object(message_data)
+
+
+def message_data_to_post_object(message_data:Mapping[str,any])->Post:
+    """
+    create Post object from message_data
+    :param message_data: message data from MongoDB
+    :return: Post object representing message
+    """
+    return Post(message_id=str(message_data["_id"]), content=message_data["content"],
+                user_id_owner=message_data["user_id_owner"],
+                like_count=message_data.get("like_count", 0),
+                version=message_data.get("version", 0))
+
+
+def message_data_to_comment_object(message_data:Mapping[str,any])->Comment:
+    """
+    create Comment object from message_data
+    :param message_data: message data from MongoDB
+    :return: Comment object representing message
+    """
+    return Comment(message_id=str(message_data["_id"]), content=message_data["content"],
+                   user_id_owner=message_data["user_id_owner"],
+                   like_count=message_data.get("like_count", 0),
+                   reply_to_message_id=str(message_data["reply_to_message_id"]),
+                   version=message_data.get("version", 0))
+
+
+def like_data_to_like_object(like_data:Mapping[str,any])->Like:
+    """
+    create Like object from like_data
+    :param like_data: like data from MongoDB
+    :return: Like object representing like
+    """
+    return Like(like_id=str(like_data["_id"]), message_id=str(like_data["message_id"]), user_id=like_data["user_id"])
+
+
+def user_data_to_user_object(user_data:Mapping[str,any])->User:
+    """
+    create User object from user_data
+    :param user_data: user data from MongoDB
+    :return: User object representing user in database
+    """
+    return User(user_id=user_data["user_id"], password=user_data["password"], email=user_data["email"],
+                name=user_data["name"], roles=user_data["roles"])
+
+
+def message_filter(message_id_obj:ObjectId, owner:str)->dict:
+    """
+    Filter matching message _id, and user_id_owner if owner is given
+    :param message_id_obj: message _id
+    :param owner: user_id that must own the message, '' to match any owner
+    :return: MongoDB filter
+    """
+    filter_message:dict = {"_id": message_id_obj}
+    if owner!='':
+        filter_message["user_id_owner"] = owner
+    return filter_message
+
+
+def posts_query(cursor:str)->dict:
+    """
+    Query of posts served by the posts_feed index, sorted by _id newest first
+    :param cursor: opaque cursor of the last post of the previous page, '' for the first page
+    :return: MongoDB query
+    :raises: InputValidationError if cursor is malformed
+    """
+    query:dict = {"reply_to_message_id": {"$eq": None}}
+    if cursor!='':
+        query["_id"] = {"$lt": decode_cursor(cursor)}
+    return query
+
+
+def comments_query(message_id:str, cursor:str)->dict:
+    """
+    Query of replies of message served by the comments_by_parent index, sorted by _id oldest first
+    :param message_id: unique identifier for replied message
+    :param cursor: opaque cursor of the last comment of the previous page, '' for the first page
+    :return: MongoDB query
+    :raises: InputValidationError if cursor is malformed
+    """
+    query:dict = {"reply_to_message_id": ObjectId(message_id)}
+    if cursor!='':
+        query["_id"] = {"$gt": decode_cursor(cursor)}
+    return query
+
+
+def likes_query(message_id:str, cursor:str)->dict:
+    """
+    Query of likes of message served by the (message_id, _id) index, sorted by _id newest first
+    :param message_id: unique identifier for message
+    :param cursor: opaque cursor of the last like of the previous page, '' for the first page
+    :return: MongoDB query
+    :raises: InputValidationError if cursor is malformed
+    """
+    query:dict = {"message_id": ObjectId(message_id)}
+    if cursor!='':
+        query["_id"] = {"$lt": decode_cursor(cursor)}
+    return query
+
+
+def new_message_document(content:str, user_id_owner:str, reply_to_message_id:Optional[ObjectId],
+                         ancestor_ids:List[ObjectId])->dict:
+    """
+    Document of a new message, without _id unless given by the caller
+    :param content: message text field
+    :param user_id_owner: unique user_id of message creator
+    :param reply_to_message_id: _id of message being replied, None for a post
+    :param ancestor_ids: _id of every message above it, root post first, the replied message last
+    :return: message document
+    """
+    return {
+        "content": content,
+        "user_id_owner": user_id_owner,
+        "like_count": 0,
+        "reply_to_message_id": reply_to_message_id,
+        "ancestor_ids": ancestor_ids,
+        "version": 0
+    }
+
+
+def replied_message_ids(new_messages:List[NewMessage])->List[ObjectId]:
+    """
+    :param new_messages: messages to create
+    :return: _id of every message replied by new_messages, once each
+    """
+    return list({ObjectId(new_message.reply_to_message_id) for new_message in new_messages
+                 if new_message.reply_to_message_id!=''})
+
+
+def new_message_documents(new_messages:List[NewMessage], parent_ancestor_ids:Dict[ObjectId, List[ObjectId]],
+                          results:List[Union[Message,BlogAppException,None]])->Tuple[List[dict], List[int]]:
+    """
+    Documents of new_messages whose replied message exists, the others get a ResourceNotFoundError in results
+    :param new_messages: messages to create
+    :param parent_ancestor_ids: ancestor_ids of every existing replied message by _id
+    :param results: result of each new message, in input order
+    :return: documents with their _id, and the index in new_messages of each document
+    """
+    documents:List[dict] = []
+    document_indexes:List[int] = []
+    for index, new_message in enumerate(new_messages):
+        reply_to_message_id:Optional[ObjectId] = None if new_message.reply_to_message_id=='' \
+            else ObjectId(new_message.reply_to_message_id)
+        if reply_to_message_id is not None and reply_to_message_id not in parent_ancestor_ids:
+            results[index] = ResourceNotFoundError(f"Message ID {reply_to_message_id} not found")
+            continue
+        document:dict = new_message_document(new_message.content, new_message.user_id_owner, reply_to_message_id,
+                                             [] if reply_to_message_id is None
+                                             else parent_ancestor_ids[reply_to_message_id] + [reply_to_message_id])
+        documents.append({"_id": ObjectId(), **document})
+        document_indexes.append(index)
+    return documents, document_indexes
+
+
+def inserted_post(documents:List[dict], write_errors:Dict[int, dict])->bool:
+    """
+    :param documents: documents of an insert_many
+    :param write_errors: write error of each failed document by index
+    :return: True if a post was inserted
+    """
+    return any(document["reply_to_message_id"] is None for document_index, document in enumerate(documents)
+               if document_index not in write_errors)
+
+
+def created_messages_results(results:List[Union[Message,BlogAppException,None]], documents:List[dict],
+                             document_indexes:List[int], write_errors:Dict[int, dict])->List[Union[Message,BlogAppException]]:
+    """
+    Fill results with the created Message or the DatabaseError of each inserted document
+    :param results: result of each new message, in input order
+    :param documents: documents of the insert_many
+    :param document_indexes: index in results of each document
+    :param write_errors: write error of each failed document by index
+    :return: results
+    """
+    for document_index, (index, document) in enumerate(zip(document_indexes, documents)):
+        results[index] = DatabaseError(write_errors[document_index].get("errmsg", "Insert failed")) \
+            if document_index in write_errors else message_data_to_message_object(document)
+    return results
+
+
+def like_thread_ids(message_data:Mapping[str,any])->List[ObjectId]:
+    """
+    _id of the liked message and of every message above it, stored on its likes
+    so deleting a thread deletes their likes with one query on the likes_by_thread index
+    :param message_data: liked message data from MongoDB, with _id and ancestor_ids
+    :return: thread_ids of its likes
+    """
+    return message_data.get("ancestor_ids", []) + [message_data["_id"]]
+
+
+def new_like_document(message_id_obj:ObjectId, user_id:str, thread_ids:List[ObjectId])->dict:
+    """
+    Document of a new like
+    :param message_id_obj: liked message _id
+    :param user_id: unique user identifier
+    :param thread_ids: _id of the liked message and of every message above it
+    :return: like document
+    """
+    return {"message_id": message_id_obj, "user_id": user_id, "thread_ids": thread_ids}
+
+
+def new_user_document(user_id:str, password:str, email:str, name:str, roles:List[str])->dict:
+    """
+    Document of a new user
+    :param user_id: unique identifier for user
+    :param password: hashed password
+    :param email: email address
+    :param name: username
+    :param roles: list of permitted roles for user
+    :return: user document
+    """
+    return {
+        "user_id": user_id,
+        "password": password,
+        "email": email,
+        "name": name,
+        "roles": roles,
+    }
+
+
+def user_details_update(password:str, email:str, name:str)->dict:
+    """
+    Update setting the given user details, '' values aren't updated
+    :param password: hashed password
+    :param email: email address
+    :param name: username
+    :return: MongoDB update
+    """
+    set_dict:dict = {}
+    if password!='':
+        set_dict['password'] = password
+    if email!='':
+        set_dict['email'] = email
+    if name!='':
+        set_dict['name'] = name
+    return {"$set": set_dict}
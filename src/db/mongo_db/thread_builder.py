@@ -0,0 +1,85 @@
+from bson import ObjectId
+from typing import Callable, Dict, List, Mapping, Optional
+from src.db.odm_blog import Message, MessageThread
+
+
+class ThreadBuilder:
+    """
+    Builds the reply tree of a thread one level at a time, without doing any io:
+    next_pipeline gives the aggregation reading the next level, add_replies takes its result.
+    Every level is read with one query bounded to limit + 1 replies per message from the comments_by_parent index,
+    and all levels together to messages_limit replies.
+    The reply after the limit of a message, or a single reply of messages whose replies aren't read
+    (at max_depth, or once messages_limit is reached), is only read to set truncated
+    """
+    def __init__(self, thread:MessageThread, max_depth:int, limit:int, messages_limit:int,
+                 collection_name:str, message_data_to_message_object:Callable[[Mapping[str, any]], Message]):
+        self._max_depth:int = max_depth
+        self._limit:int = limit
+        self._budget:int = messages_limit
+        self._collection_name:str = collection_name
+        self._message_data_to_message_object:Callable[[Mapping[str, any]], Message] = message_data_to_message_object
+        # messages of the level whose replies are read next, sorted by _id
+        self._level:Dict[ObjectId, MessageThread] = {ObjectId(thread.message.message_id): thread}
+        self._depth:int = 0
+        # messages whose replies are only checked for existence, read before the next level
+        self._probed:Dict[ObjectId, MessageThread] = {}
+        self._done:bool = False
+
+    def next_pipeline(self)->Optional[List[dict]]:
+        """
+        :return: aggregation pipeline on the messages collection reading the next replies, None once the tree is built
+        """
+        if self._probed:
+            return self.__replies_pipeline(list(self._probed), 0, len(self._probed))
+        if self._done or not self._level:
+            return None
+        if self._depth==self._max_depth or self._budget==0:
+            self._probed, self._level, self._done = self._level, {}, True
+            return self.__replies_pipeline(list(self._probed), 0, len(self._probed))
+        return self.__replies_pipeline(list(self._level), self._limit, self._budget)
+
+    def add_replies(self, replies_data:List[Mapping[str, any]])->None:
+        """
+        Add the replies read by the last next_pipeline to the tree
+        :param replies_data: documents returned by the pipeline, in their order
+        :return: None
+        """
+        if self._probed:
+            for reply_data in replies_data:
+                self._probed[reply_data["reply_to_message_id"]].truncated = True
+            self._probed = {}
+            return
+        next_level:Dict[ObjectId, MessageThread] = {}
+        for reply_data in replies_data:
+            parent:MessageThread = self._level[reply_data["reply_to_message_id"]]
+            if len(parent.replies)==self._limit or self._budget==0:
+                parent.truncated = True
+                continue
+            reply_thread:MessageThread = MessageThread(message=self._message_data_to_message_object(reply_data),
+                                                       replies=[])
+            parent.replies.append(reply_thread)
+            next_level[reply_data["_id"]] = reply_thread
+            self._budget -= 1
+        if self._budget==0 and replies_data:
+            # messages after the one whose replies hit messages_limit had none of their replies read
+            last_parent_id:ObjectId = replies_data[-1]["reply_to_message_id"]
+            self._probed = {parent_id: parent for parent_id, parent in self._level.items() if parent_id > last_parent_id}
+        self._level = next_level
+        self._depth += 1
+
+    def __replies_pipeline(self, parent_ids:List[ObjectId], replies_per_parent:int, max_replies:int)->List[dict]:
+        """
+        Replies of parent_ids in _id order of their parent then their own, up to replies_per_parent + 1 per parent
+        and max_replies + 1 in all, replies of later parents aren't looked up once max_replies + 1 are read
+        """
+        return [{"$match": {"_id": {"$in": parent_ids}}},
+                {"$project": {"_id": 1}},
+                {"$sort": {"_id": 1}},
+                {"$lookup": {"from": self._collection_name, "localField": "_id", "foreignField": "reply_to_message_id",
+                             "pipeline": [{"$sort": {"_id": 1}}, {"$limit": replies_per_parent + 1},
+                                          {"$project": {"ancestor_ids": 0}}],
+                             "as": "replies"}},
+                {"$unwind": "$replies"},
+                {"$limit": max_replies + 1},
+                {"$replaceWith": "$replies"}]
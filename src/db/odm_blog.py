@@ -9,8 +9,10 @@ class Message:
     message_id:str
     user_id_owner:str
     content:str
-    user_likes:List[str]
+    like_count:int
     reply_to_message_id:str = None
+    # bumped on every change of the message, used for its ETag
+    version:int = 0
 
 @dataclass
 class Post(Message):
@@ -26,6 +28,45 @@ class Comment(Message):
     """
     reply_to_message_id:str
 
+@dataclass
+class NewMessage:
+    """
+    A message to be created, reply_to_message_id is '' for a Post
+    """
+    content:str
+    user_id_owner:str
+    reply_to_message_id:str = ''
+
+@dataclass
+class MessageThread:
+    """
+    A message with the tree of replies under it
+    truncated is True if some of its replies were left out by the depth or replies limits
+    """
+    message:Message
+    replies:List['MessageThread']
+    truncated:bool = False
+
+@dataclass
+class EncodedMessage:
+    """
+    A message already encoded as a json object, with its version for the ETag
+    and the message it replies to, used to find cached replies of a deleted message
+    """
+    message_id:str
+    version:int
+    data:bytes
+    reply_to_message_id:str = None
+
+@dataclass
+class Like:
+    """
+    A like of a message by a user
+    """
+    like_id:str
+    message_id:str
+    user_id:str
+
 @dataclass
 class User:
     """
@@ -0,0 +1,28 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from src.server.flask.exceptions import InputValidationError
+import base64
+import binascii
+
+
+def encode_cursor(message_id:str)->str:
+    """
+    Encode a message_id into an opaque pagination cursor
+    :param message_id: message_id of the last message in the returned page
+    :return: url safe cursor string
+    """
+    return base64.urlsafe_b64encode(ObjectId(message_id).binary).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor:str)->ObjectId:
+    """
+    Decode an opaque pagination cursor back to the ObjectId it was created from
+    :param cursor: cursor string created by encode_cursor
+    :return: ObjectId of the last message in the previous page
+    :raises: InputValidationError if cursor is malformed
+    """
+    try:
+        padding:str = '=' * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(cursor + padding))
+    except (binascii.Error, InvalidId, TypeError, ValueError) as e:
+        raise InputValidationError(f"Invalid cursor {cursor}") from e
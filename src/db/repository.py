@@ -1,22 +1,90 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional, Union
-from src.db.odm_blog import Message, Post, User
+from dataclasses import asdict
+from typing import Iterator, List, Optional, Union
+from src.db.odm_blog import Comment, EncodedMessage, Like, Message, MessageThread, NewMessage, Post, User
+import json
+from src.server.flask.exceptions import BlogAppException
 
 SERVER_REPOSITORY:Optional['Repository'] = None
 
+
+def encode_message(message:Message)->EncodedMessage:
+    """
+    Encode message as the compact, key sorted json object returned by the API
+    :param message: Message object
+    :return: EncodedMessage with the json bytes, version and replied message of message
+    """
+    return EncodedMessage(message_id=message.message_id, version=message.version,
+                          data=json.dumps(asdict(message), separators=(',', ':'), sort_keys=True).encode('utf-8'),
+                          reply_to_message_id=message.reply_to_message_id)
+
+
 class Repository(ABC):
 
     @abstractmethod
-    def get_posts_blog(self, posts_limit:int, start_index:int = 0)->List[Post]:
+    def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
         """
-        Get Lists of up to posts_limit posts from the db starting from start_index position
+        Get Lists of up to posts_limit posts from the db, newest first.
+        Pages are read after cursor when given, start_index is only used as a fallback
         :param posts_limit: post limit for pagination
-        :param start_index: starting post index
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
         :return: list of Post objects retrieved from db
-        :raises DatabaseError if db operation fail
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
+        """
+        pass
+
+
+    def iter_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->Iterator[Post]:
+        """
+        Iterate over the same posts as get_posts_blog, for streaming responses.
+        Repositories that can read posts in batches override it to keep memory flat whatever posts_limit is
+        :param posts_limit: post limit for pagination
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
+        :return: iterator of Post objects retrieved from db
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
+        """
+        yield from self.get_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)
+
+
+    def get_posts_json_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[EncodedMessage]:
+        """
+        Get the posts of get_posts_blog encoded as the json objects returned by the API,
+        for repositories that keep encoded posts
+        :param posts_limit: post limit for pagination
+        :param start_index: starting post index, ignored if cursor is given
+        :param cursor: opaque cursor of the last post of the previous page
+        :return: list of EncodedMessage of posts, newest first
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
+        """
+        return [encode_message(post) for post in
+                self.get_posts_blog(posts_limit=posts_limit, start_index=start_index, cursor=cursor)]
+
+
+    def ping(self)->None:
+        """
+        Check the db is reachable, used by readiness checks.
+        Repositories without a db server are always reachable
+        :return: None
+        :raises: DatabaseError if the db can't be reached
         """
         pass
 
+    def indexes_created(self)->bool:
+        """
+        Check the indexes the repository queries rely on exist, used by readiness checks.
+        Repositories without indexes are always ready
+        :return: True once indexes are created
+        """
+        return True
+
 
     @abstractmethod
     def get_message_blog(self, message_id:str, user_id_owner:str='')->Message:
@@ -32,6 +100,95 @@ class Repository(ABC):
         pass
 
 
+    def get_message_json_blog(self, message_id:str)->EncodedMessage:
+        """
+        Get message encoded as the json object returned by the API, for repositories that cache encoded messages
+        :param message_id: unique identifier for message in db
+        :return: EncodedMessage with the json bytes and version of message
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        return encode_message(self.get_message_blog(message_id))
+
+
+    @abstractmethod
+    def get_message_version_blog(self, message_id:str)->int:
+        """
+        Get only the version of message, to answer conditional requests without reading the whole message
+        :param message_id: unique identifier for message in db
+        :return: message version
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def get_feed_version_blog(self)->int:
+        """
+        Get the posts feed version, bumped whenever a post is created or deleted.
+        Edits and likes only bump the version of their message
+        :return: feed version
+        :raises: DatabaseError for DB operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def get_messages_blog(self, message_ids:List[str])->List[Optional[Message]]:
+        """
+        Get messages of several message_ids at once
+        :param message_ids: unique identifiers for messages in db
+        :return: list with the Message of each message_id in input order, None for messages that don't exist
+        :raises: DatabaseError for DB operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def get_comments_blog(self, message_id:str, comments_limit:int, cursor:str = '')->List[Comment]:
+        """
+        Get up to comments_limit direct replies of message, oldest first
+        :param message_id: unique identifier for replied message
+        :param comments_limit: comment limit for pagination
+        :param cursor: opaque cursor of the last comment of the previous page
+        :return: list of Comment objects
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError if db operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def get_thread_blog(self, message_id:str, max_depth:int, limit:int)->MessageThread:
+        """
+        Get message with the tree of its replies, up to max_depth reply levels below it
+        and up to limit replies of each message, oldest first
+        :param message_id: unique identifier for message in db
+        :param max_depth: number of reply levels to return
+        :param limit: maximum replies returned for each message
+        :return: MessageThread of message, with truncated set where replies were left out
+        :raises:
+            ResourceNotFoundError if message doesn't exist in db
+            DatabaseError for DB operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def get_message_descendant_ids_blog(self, message_id:str)->List[str]:
+        """
+        Get message_id of every reply in the thread under message, deleted along with it
+        :param message_id: unique identifier for message in db
+        :return: list of reply message_id values
+        :raises: DatabaseError for DB operation fail
+        """
+        pass
+
+
     @abstractmethod
     def create_message_blog(self, content:str, user_id_owner: str, reply_to_message_id:str)->Message:
         """
@@ -46,27 +203,43 @@ class Repository(ABC):
 
 
     @abstractmethod
-    def edit_message_blog(self, message_id: str, edited_content:str)->Message:
+    def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
+        """
+        Create a batch of messages, each message is created or fails on its own
+        :param new_messages: messages to create
+        :return: list with the created Message or the error of each new message, in input order
+        :raises: DatabaseError for DB operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
         """
         Change content field of message, and updated message
         :param message_id: unique identifier for message
         :param edited_content: message text field to be updated
+        :param owner: user_id that must own the message, '' to skip the ownership check
         :return: Message object with edited content
         :raises:
             ResourceNotFoundError if message_id doesn't exist in DB
+            UnauthorizedError if message isn't owned by owner
             DatabaseError for DB operation fail
         """
         pass
 
 
     @abstractmethod
-    def delete_message_blog(self, message_id:str)->Union[Message,None]:
+    def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
         """
         Delete message from db, and any other comments that replied to that message
         No error if message doesn't exist
         :param message_id: unique identifier for message
+        :param owner: user_id that must own the message, '' to skip the ownership check
         :return: Message object of deleted message, or None if already doesn't exist
-        :raises DatabaseError for DB operation fail
+        :raises:
+            UnauthorizedError if message isn't owned by owner
+            DatabaseError for DB operation fail
         """
         pass
 
@@ -74,13 +247,14 @@ class Repository(ABC):
     @abstractmethod
     def add_message_like(self, message_id:str, user_id:str)->bool:
         """
-        Add the user_id to message Likes.
+        Add a like of user_id to message and increment its like_count.
         Does not verify user_id.
-        No error if user_id exists in like list
+        No error if user_id already likes message
         :param message_id: unique identifier for message
         :param user_id: unique user identifier to add to likes
         :return: True if operation succeeded
         :raises
+            ResourceNotFoundError if message_id doesn't exist in DB
             DatabaseError for DB operation fail
         """
         pass
@@ -89,18 +263,46 @@ class Repository(ABC):
     @abstractmethod
     def remove_message_like(self, message_id:str, user_id:str)->bool:
         """
-        Remove the user_id from message Likes
+        Remove the like of user_id from message and decrement its like_count
         Does not verify user_id.
-        No error if user_id doesn't exist in like list
+        No error if user_id doesn't like message
         :param message_id: unique identifier for message
         :param user_id: unique user identifier to remove from likes
         :return: True if operation succeeded
         :raises
+            ResourceNotFoundError if message_id doesn't exist in DB
             DatabaseError for DB operation fail
         """
         pass
 
 
+    @abstractmethod
+    def get_message_likes_blog(self, message_id:str, likes_limit:int, cursor:str = '')->List[Like]:
+        """
+        Get up to likes_limit likes of message, newest first
+        :param message_id: unique identifier for message
+        :param likes_limit: like limit for pagination
+        :param cursor: opaque cursor of the last like of the previous page
+        :return: list of Like objects
+        :raises:
+            InputValidationError if cursor is malformed
+            DatabaseError for DB operation fail
+        """
+        pass
+
+
+    @abstractmethod
+    def is_message_liked(self, message_id:str, user_id:str)->bool:
+        """
+        Check if user_id likes message
+        :param message_id: unique identifier for message
+        :param user_id: unique user identifier
+        :return: True if user_id likes message
+        :raises DatabaseError for DB operation fail
+        """
+        pass
+
+
     @abstractmethod
     def create_user_blog(self, user_id: str, password:str, email:str, name:str, roles:List[str])->User:
         """
@@ -0,0 +1,178 @@
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, List, Optional, Union
+from src.db.delegating_repository import DelegatingRepository
+from src.db.odm_blog import Comment, EncodedMessage, Like, Message, MessageThread, NewMessage, Post
+from src.db.repository import Repository
+from src.server.flask.exceptions import BlogAppException, TimeoutError
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+SINGLE_FLIGHT_ENABLED:bool = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower()=='true'
+# longest time a request waits for a read started by another request, counted from the start of that read
+SINGLE_FLIGHT_TIMEOUT_SECONDS:float = float(os.environ.get('SINGLE_FLIGHT_TIMEOUT_SECONDS', 5))
+
+
+class InFlightCall:
+    """
+    A db read shared by every request asking for the same key while it runs
+    """
+    def __init__(self, deadline:float):
+        self.done:Event = Event()
+        self.deadline:float = deadline
+        self.result:Any = None
+        self.exception:Optional[BaseException] = None
+
+
+class SingleFlightRepository(DelegatingRepository):
+    """
+    Coalesces identical concurrent reads: while a read with the same method and arguments is running,
+    other requests wait for it and get its result, or its exception, instead of running their own db call.
+    Results are shared between requests, they must not be changed by their callers.
+    Every message write advances a write epoch once it returns, reads only join calls started in the same epoch,
+    so a read started after a write never gets a result read before it.
+    Streamed reads are forwarded as they are
+    """
+    def __init__(self, repository:Repository, timeout_seconds:float = SINGLE_FLIGHT_TIMEOUT_SECONDS):
+        super().__init__(repository)
+        self._timeout_seconds:float = timeout_seconds
+        self._calls:Dict[Hashable, InFlightCall] = {}
+        self._lock:Lock = Lock()
+        self._write_epoch:int = 0
+        self.calls:int = 0
+        self.coalesced:int = 0
+        self.timeouts:int = 0
+
+    def __single_flight(self, key:Hashable, read:Callable[[], Any])->Any:
+        """
+        Run read, or wait for the identical read already running
+        :param key: method name and arguments of the read
+        :param read: function running the read on the wrapped repository
+        :return: result of the read
+        :raises:
+            TimeoutError if the running read didn't finish within timeout_seconds of its start
+            any exception raised by the read
+        """
+        with self._lock:
+            key = key + (self._write_epoch,)
+            call:Optional[InFlightCall] = self._calls.get(key)
+            if call is None:
+                call = InFlightCall(time.monotonic() + self._timeout_seconds)
+                self._calls[key] = call
+                self.calls += 1
+                leader:bool = True
+            else:
+                self.coalesced += 1
+                leader = False
+        if leader:
+            try:
+                call.result = read()
+                return call.result
+            except BaseException as e:
+                call.exception = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        if not call.done.wait(max(call.deadline - time.monotonic(), 0)):
+            with self._lock:
+                self.timeouts += 1
+            logging.error(f"Timeout waiting for in flight {key[0]}")
+            raise TimeoutError(f"Timeout waiting for {key[0]}")
+        if call.exception is not None:
+            raise call.exception
+        return call.result
+
+    def __write(self, write:Callable[[], Any])->Any:
+        """
+        Run write on the wrapped repository, then advance the write epoch whatever its outcome,
+        so reads started from now on don't join reads that may have started before the write
+        :param write: function running the write on the wrapped repository
+        :return: result of the write
+        :raises: any exception raised by the write
+        """
+        try:
+            return write()
+        finally:
+            with self._lock:
+                self._write_epoch += 1
+
+    def get_posts_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[Post]:
+        return self.__single_flight(('get_posts_blog', posts_limit, start_index, cursor),
+                                    lambda: self._repository.get_posts_blog(posts_limit=posts_limit,
+                                                                            start_index=start_index, cursor=cursor))
+
+    def get_posts_json_blog(self, posts_limit:int, start_index:int = 0, cursor:str = '')->List[EncodedMessage]:
+        return self.__single_flight(('get_posts_json_blog', posts_limit, start_index, cursor),
+                                    lambda: self._repository.get_posts_json_blog(posts_limit=posts_limit,
+                                                                                 start_index=start_index, cursor=cursor))
+
+    def get_message_blog(self, message_id:str, user_id_owner:str='')->Message:
+        return self.__single_flight(('get_message_blog', message_id, user_id_owner),
+                                    lambda: self._repository.get_message_blog(message_id, user_id_owner=user_id_owner))
+
+    def get_message_json_blog(self, message_id:str)->EncodedMessage:
+        return self.__single_flight(('get_message_json_blog', message_id),
+                                    lambda: self._repository.get_message_json_blog(message_id))
+
+    def get_message_version_blog(self, message_id:str)->int:
+        return self.__single_flight(('get_message_version_blog', message_id),
+                                    lambda: self._repository.get_message_version_blog(message_id))
+
+    def get_feed_version_blog(self)->int:
+        return self.__single_flight(('get_feed_version_blog',), self._repository.get_feed_version_blog)
+
+    def get_messages_blog(self, message_ids:List[str])->List[Optional[Message]]:
+        return self.__single_flight(('get_messages_blog', tuple(message_ids)),
+                                    lambda: self._repository.get_messages_blog(message_ids))
+
+    def get_comments_blog(self, message_id:str, comments_limit:int, cursor:str = '')->List[Comment]:
+        return self.__single_flight(('get_comments_blog', message_id, comments_limit, cursor),
+                                    lambda: self._repository.get_comments_blog(message_id, comments_limit=comments_limit,
+                                                                               cursor=cursor))
+
+    def get_thread_blog(self, message_id:str, max_depth:int, limit:int)->MessageThread:
+        return self.__single_flight(('get_thread_blog', message_id, max_depth, limit),
+                                    lambda: self._repository.get_thread_blog(message_id, max_depth=max_depth, limit=limit))
+
+    def get_message_likes_blog(self, message_id:str, likes_limit:int, cursor:str = '')->List[Like]:
+        return self.__single_flight(('get_message_likes_blog', message_id, likes_limit, cursor),
+                                    lambda: self._repository.get_message_likes_blog(message_id, likes_limit=likes_limit,
+                                                                                    cursor=cursor))
+
+    def create_message_blog(self, content:str, user_id_owner: str, reply_to_message_id:str)->Message:
+        return self.__write(lambda: self._repository.create_message_blog(content=content, user_id_owner=user_id_owner,
+                                                                          reply_to_message_id=reply_to_message_id))
+
+    def create_messages_blog(self, new_messages:List[NewMessage])->List[Union[Message,BlogAppException]]:
+        return self.__write(lambda: self._repository.create_messages_blog(new_messages))
+
+    def edit_message_blog(self, message_id: str, edited_content:str, owner:str = '')->Message:
+        return self.__write(lambda: self._repository.edit_message_blog(message_id, edited_content, owner=owner))
+
+    def delete_message_blog(self, message_id:str, owner:str = '')->Union[Message,None]:
+        return self.__write(lambda: self._repository.delete_message_blog(message_id, owner=owner))
+
+    def add_message_like(self, message_id:str, user_id:str)->bool:
+        return self.__write(lambda: self._repository.add_message_like(message_id, user_id))
+
+    def remove_message_like(self, message_id:str, user_id:str)->bool:
+        return self.__write(lambda: self._repository.remove_message_like(message_id, user_id))
+
+    def stats(self)->Dict[str, float]:
+        """
+        Db reads run and reads coalesced into them, coalesced_ratio is the share of reads saved
+        :return: dict of counter name to value
+        """
+        with self._lock:
+            reads:int = self.calls + self.coalesced
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / reads, 4) if reads else 0,
+                "timeouts": self.timeouts,
+            }
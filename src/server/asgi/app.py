@@ -0,0 +1,688 @@
+from dataclasses import asdict, dataclass, field, is_dataclass
+from functools import wraps
+from pydantic import ValidationError
+from src.db.odm_blog import Comment, EncodedMessage, Like, Message, MessageThread, NewMessage, Post, User
+from src.db.pagination import encode_cursor
+from src.server.flask.exceptions import (AuthenticationError, BlogAppException, InputValidationError,
+                                         PayloadTooLargeError, ResourceNotFoundError, ServiceUnavailableError,
+                                         UnauthorizedError)
+from src.server.routes.etag import message_etag, feed_etag
+from src.server.routes.password_hashing import async_hash_password, async_check_password, password_needs_rehash
+from src.server.routes.principal_cache import PRINCIPAL_CACHE, PRINCIPAL_CACHE_MODE
+from src.server.routes.token import decode_jwt, generate_jwt, is_recently_issued
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from werkzeug.http import parse_etags
+import src.db.async_repository as async_repository
+import src.server.routes.input_validation as input_validation
+import json
+import logging
+
+logging.basicConfig(level=logging.INFO)
+
+
+@dataclass
+class Request:
+    """
+    HTTP request read from the ASGI scope and body
+    """
+    method:str
+    path:str
+    headers:Dict[str, str]
+    body:bytes
+    principal:Optional[dict] = None
+
+    def get_json(self)->dict:
+        """
+        Parse request body as json, an empty body is an empty object
+        :return: json body
+        :raises: InputValidationError if body isn't a json object
+        """
+        if self.body==b'':
+            return {}
+        try:
+            json_body = json.loads(self.body)
+        except ValueError as e:
+            raise InputValidationError("Request body must be json") from e
+        if not isinstance(json_body, dict):
+            raise InputValidationError("Request body must be a json object")
+        return json_body
+
+
+@dataclass
+class Response:
+    """
+    HTTP response, body is either bytes or an async iterator of chunks streamed to the client
+    """
+    status:int
+    body:Union[bytes, AsyncIterator[bytes]] = b''
+    headers:List[Tuple[bytes, bytes]] = field(default_factory=list)
+
+
+def json_default(value):
+    """
+    Serialize dataclasses as Flask jsonify does
+    :param value: object json can't serialize
+    :return: dict of dataclass fields
+    :raises: TypeError for any other object
+    """
+    if is_dataclass(value):
+        return asdict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value)->bytes:
+    """
+    Encode value as the compact, key sorted json returned by the Flask app
+    :param value: json serializable value, dataclasses included
+    :return: json bytes
+    """
+    return json.dumps(value, default=json_default, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def json_response(value, status:int = 200)->Response:
+    """
+    Json response of value
+    :param value: json serializable value, dataclasses included
+    :param status: HTTP status code
+    :return: Response
+    """
+    return Response(status, dumps(value), [(b'content-type', b'application/json')])
+
+
+def error_response(exception:BlogAppException)->Response:
+    """
+    Failed JSON response in the format of the Flask blueprints error handlers
+    :param exception: BlogAppException that lead to request failure
+    :return: json with error code and message
+    """
+    return json_response({"error": type(exception).__name__, "message": exception.message}, exception.error_code)
+
+
+Handler = Callable[[Request], Awaitable[Response]]
+ROUTES:Dict[Tuple[str, str], Handler] = {}
+# longest body read for each route, bodies of unknown routes are read up to REQUEST_BODY_LIMIT
+BODY_LIMITS:Dict[Tuple[str, str], int] = {}
+
+
+def route(method:str, path:str, body_limit:int = input_validation.REQUEST_BODY_LIMIT):
+    """
+    Decorator registering an async handler for method and path
+    :param method: HTTP method
+    :param path: full request path
+    :param body_limit: longest request body in bytes, longer requests get 413 without being read
+    :return: decorator for async handler
+    """
+    def decorator(handler:Handler)->Handler:
+        ROUTES[(method, path)] = handler
+        BODY_LIMITS[(method, path)] = body_limit
+        return handler
+    return decorator
+
+
+def repository()->async_repository.AsyncRepository:
+    """
+    Repository of the running app, set on lifespan startup
+    """
+    return async_repository.SERVER_ASYNC_REPOSITORY
+
+
+async def get_verified_user_roles(user_id:str)->List[str]:
+    """
+    Get roles of user_id from the principal cache, or from db on cache miss
+    :param user_id: unique identifier for user
+    :return: roles of user in database
+    :raises: ResourceNotFoundError if user_id doesn't exist in database
+    """
+    if PRINCIPAL_CACHE_MODE!='off':
+        roles:Optional[List[str]] = PRINCIPAL_CACHE.get(user_id)
+        if roles is not None:
+            return roles
+    # taken before the read, roles changed while it runs aren't cached
+    generation:int = PRINCIPAL_CACHE.generation
+    user_odm:User = await repository().get_user_blog(user_id=user_id)
+    if PRINCIPAL_CACHE_MODE!='off':
+        PRINCIPAL_CACHE.put(user_id, user_odm.roles, generation)
+    return user_odm.roles
+
+
+def valid_token_required(handler:Handler)->Handler:
+    """
+    Decorator to verify JWT token as token.valid_token_required does, the payload is set on request.principal
+    :param handler: async handler of api request
+    :return: async handler
+    :raises AuthenticationError if token or roles are invalid
+    """
+    @wraps(handler)
+    async def verify_token(request:Request)->Response:
+        authorization:str = request.headers.get('authorization', '')
+        if authorization=='':
+            raise AuthenticationError("Token is missing")
+        try:
+            payload:dict = decode_jwt(authorization.split(" ")[1])
+            if PRINCIPAL_CACHE_MODE=='trust_claims' and is_recently_issued(payload):
+                PRINCIPAL_CACHE.record_trusted()
+            else:
+                user_roles:List[str] = await get_verified_user_roles(payload['user_id'])
+                if payload['roles']!=[] and not set(payload['roles']).issubset(set(user_roles)):
+                    raise AuthenticationError("Invalid User Roles")
+        except BlogAppException as e:
+            raise e
+        except Exception as e:
+            raise AuthenticationError("Bad Token") from e
+
+        request.principal = payload
+        return await handler(request)
+    return verify_token
+
+
+def is_not_modified(request:Request, etag:str)->bool:
+    """
+    Check if the request If-None-Match holds etag, with the weak comparison of etag.is_not_modified
+    :param request: http request
+    :param etag: current ETag of the requested resource
+    :return: True if the client already has the current representation
+    """
+    return parse_etags(request.headers.get('if-none-match')).contains_weak(etag)
+
+
+def with_etag(response:Response, etag:str, weak:bool = False)->Response:
+    """
+    Set the ETag header of response
+    :param response: response of the resource
+    :param etag: ETag value without quotes
+    :param weak: True for a weak ETag
+    :return: response
+    """
+    response.headers.append((b'etag', f'{"W/" if weak else ""}"{etag}"'.encode('ascii')))
+    return response
+
+
+@route('POST', '/api/v0/auth/login')
+async def login(request:Request)->Response:
+    """
+    Verify user_id and password, as routes.auth.login
+    :return: json response with generated JWT token for API calls
+    """
+    user_id = request.get_json().get('user_id','')
+    password = request.get_json().get('password','')
+    try:
+        input_validation.CredentialsValidation(user_id=user_id, password=password)
+        user:User = await repository().get_user_blog(user_id)
+        if not await async_check_password(user.password, password):
+            raise AuthenticationError("Invalid Credentials")
+    except ServiceUnavailableError as e:
+        raise e
+    except Exception as e:
+        logging.info(str(e))
+        raise AuthenticationError("Invalid Credentials") from e
+
+    if password_needs_rehash(user.password):
+        try:
+            user = await repository().update_user_details_blog(user.user_id, password=await async_hash_password(password))
+        except BlogAppException as e:
+            logging.warning(f"User {user.user_id} password rehash failed: {e.message}")
+        finally:
+            # as PrincipalCacheRepository of the WSGI app, the db layer doesn't know about the principal cache
+            PRINCIPAL_CACHE.invalidate(user.user_id)
+    return json_response({'token': generate_jwt(user.user_id, user.password, user.roles)})
+
+
+@route('POST', '/api/v0/auth/register')
+async def register(request:Request)->Response:
+    """
+    Create user_id, password user with inputed roles, as routes.auth.register
+    :return: empty response
+    """
+    json_body:dict = request.get_json()
+    user_id:str = json_body.get('user_id','')
+    password:str = json_body.get('password','')
+    roles:List[str] = json_body.get('roles',[])
+    input_validation.CredentialsValidation(user_id=user_id, password=password)
+    input_validation.RolesValidation(roles=roles)
+    await repository().create_user_blog(user_id=user_id, name=json_body.get('name',''), email=json_body.get('email',''),
+                                        password=await async_hash_password(password), roles=roles)
+    return Response(204)
+
+
+@route('DELETE', '/api/v0/auth/account/delete')
+async def delete_user_account(request:Request)->Response:
+    """
+    Delete user account, as routes.auth.delete_user_account
+    :return: empty response, or json message if user doesn't exist
+    """
+    user_id:str = request.get_json().get('user_id','')
+    try:
+        deleted_user:Optional[User] = await repository().delete_user_blog(user_id)
+    finally:
+        # as PrincipalCacheRepository of the WSGI app, even if the outcome of the delete is unknown
+        PRINCIPAL_CACHE.invalidate(user_id)
+    if deleted_user is None:
+        return json_response({"message": f"User {user_id} doesn't exist"})
+    return Response(204)
+
+
+@route('GET', '/api/v0/messages/posts')
+@valid_token_required
+async def get_posts_blog(request:Request)->Response:
+    """
+    Get a page of Posts, newest first, as routes.messages.get_posts_blog
+    :return: json response with a list of Post objects and the next_cursor, or 304
+    """
+    json_body:dict = request.get_json()
+    start_index = int(json_body.get('start_index',0))
+    limit:int = int(json_body.get('limit', input_validation.POSTS_GET_LIMIT))
+    cursor:str = json_body.get('cursor','')
+    stream:bool = json_body.get('stream', False) is True
+    try:
+        input_validation.PostsGetRequest(start_index=start_index, posts_limit=limit, cursor=cursor)
+    except ValidationError as e:
+        raise InputValidationError from e
+    etag:str = feed_etag(await repository().get_feed_version_blog(),
+                         start_index=start_index, limit=limit, cursor=cursor, stream=stream)
+    if is_not_modified(request, etag):
+        return with_etag(Response(304), etag, weak=True)
+    if stream:
+        return with_etag(await stream_posts_blog(start_index, limit, cursor), etag, weak=True)
+    posts:List[EncodedMessage] = await repository().get_posts_json_blog(start_index=start_index, posts_limit=limit, cursor=cursor)
+    next_cursor:Optional[str] = encode_cursor(posts[-1].message_id) if posts and len(posts)==limit else None
+    return with_etag(Response(200, b'{"next_cursor":' + dumps(next_cursor) + b',"posts":['
+                              + b','.join(post.data for post in posts) + b']}',
+                              [(b'content-type', b'application/json')]), etag, weak=True)
+
+
+async def next_post(posts:AsyncIterator[Post])->Optional[Post]:
+    """
+    Next post of an async iterator, the anext builtin needs Python 3.10 and the Docker image runs 3.8
+    :param posts: async iterator of posts
+    :return: next Post, or None once posts are exhausted
+    """
+    try:
+        return await posts.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def stream_posts_blog(start_index:int, limit:int, cursor:str)->Response:
+    """
+    Stream the json of get_posts_blog as posts are read from the db, as the Flask stream_posts_blog.
+    The first Post is read before the response starts, so db errors still return an error status
+    :param start_index: starting post index, ignored if cursor is given
+    :param limit: post limit for pagination
+    :param cursor: opaque cursor of the last post of the previous page
+    :return: streamed json response with a list of Post objects and the next_cursor
+    """
+    posts:AsyncIterator[Post] = repository().iter_posts_blog(start_index=start_index, posts_limit=limit, cursor=cursor)
+    first_post:Optional[Post] = await next_post(posts)
+
+    async def generate_posts_json()->AsyncIterator[bytes]:
+        yield b'{"posts":['
+        post:Optional[Post] = first_post
+        posts_count:int = 0
+        while post is not None:
+            yield (b',' if posts_count else b'') + dumps(post)
+            posts_count += 1
+            last_post:Post = post
+            post = await next_post(posts)
+        next_cursor:Optional[str] = encode_cursor(last_post.message_id) if posts_count and posts_count==limit else None
+        yield b'],"next_cursor":' + dumps(next_cursor) + b'}'
+
+    return Response(200, generate_posts_json(), [(b'content-type', b'application/json')])
+
+
+@route('POST', '/api/v0/messages/create')
+@valid_token_required
+async def create_message_blog(request:Request)->Response:
+    """
+    Create a Post or Comment owned by the requesting user, as routes.messages.create_message_blog
+    :return: json response with created Post/Comment
+    """
+    user_id_owner:str = request.principal['user_id']
+    content = request.get_json().get('content', '')
+    reply_to_message_id = request.get_json().get('reply_to_message_id','')
+    if reply_to_message_id=='' and 'post_user' not in request.principal['roles']:
+        raise UnauthorizedError
+    try:
+        input_validation.MessageCreateRequest(user_id_owner=user_id_owner, content=content, reply_to_message_id=reply_to_message_id)
+    except ValidationError as e:
+        raise InputValidationError from e
+    created_message:Message = await repository().create_message_blog(content=content, user_id_owner=user_id_owner,
+                                                                      reply_to_message_id=reply_to_message_id)
+    return json_response(created_message)
+
+
+@route('POST', '/api/v0/messages/bulk-create', body_limit=input_validation.MESSAGES_BULK_CREATE_BODY_LIMIT)
+@valid_token_required
+async def create_messages_bulk(request:Request)->Response:
+    """
+    Create a batch of messages owned by the requesting user, as routes.messages.create_messages_bulk.
+    Its body is limited to MESSAGES_BULK_CREATE_BODY_LIMIT bytes by read_body
+    :return: json response with an item for each message in request order
+    """
+    user_id_owner:str = request.principal['user_id']
+    items = request.get_json().get('messages', [])
+    if not isinstance(items, list) or len(items) > input_validation.MESSAGES_BULK_CREATE_LIMIT:
+        raise InputValidationError(f"messages must be a list of up to {input_validation.MESSAGES_BULK_CREATE_LIMIT} messages")
+
+    results:List[Union[Message,BlogAppException,None]] = [None] * len(items)
+    new_messages:List[NewMessage] = []
+    new_message_indexes:List[int] = []
+    for index, item in enumerate(items):
+        try:
+            message_item = input_validation.MessageBulkCreateItem(**item)
+            if message_item.reply_to_message_id=='' and 'post_user' not in request.principal['roles']:
+                raise UnauthorizedError("Creating a Post requires post_user role")
+        except BlogAppException as e:
+            results[index] = e
+            continue
+        except (ValidationError, TypeError) as e:
+            results[index] = InputValidationError(str(e))
+            continue
+        new_messages.append(NewMessage(content=message_item.content, user_id_owner=user_id_owner,
+                                       reply_to_message_id=message_item.reply_to_message_id))
+        new_message_indexes.append(index)
+    if new_messages:
+        for index, result in zip(new_message_indexes, await repository().create_messages_blog(new_messages)):
+            results[index] = result
+
+    return json_response({"results": [{"index": index, "error": type(result).__name__, "message": result.message}
+                                      if isinstance(result, BlogAppException) else {"index": index, "created": result}
+                                      for index, result in enumerate(results)]})
+
+
+@route('POST', '/api/v0/messages/edit')
+@valid_token_required
+async def edit_message_blog(request:Request)->Response:
+    """
+    Edit a message that the requesting user owns, as routes.messages.edit_message_blog
+    :return: json response with edited Post/Comment
+    """
+    message_id = request.get_json().get('message_id','')
+    content = request.get_json().get('content','')
+    try:
+        input_validation.MessageEditRequest(message_id={"message_id":message_id}, content=content)
+    except ValidationError as e:
+        raise InputValidationError from e
+    return json_response(await repository().edit_message_blog(message_id, content, owner=request.principal['user_id']))
+
+
+@route('DELETE', '/api/v0/messages/delete')
+@valid_token_required
+async def delete_message_blog(request:Request)->Response:
+    """
+    Delete a message that the requesting user owns, as routes.messages.delete_message_blog
+    :return: json response with deleted Post/Comment, or a message if it doesn't exist
+    """
+    message_id = request.get_json().get('message_id','')
+    try:
+        input_validation.MessageDeleteRequest(message_id={"message_id":message_id})
+    except ValidationError as e:
+        raise InputValidationError from e
+    deleted_message:Optional[Message] = await repository().delete_message_blog(message_id, owner=request.principal['user_id'])
+    if deleted_message is None:
+        return json_response({"message": "Message doesn't exist in db"})
+    return json_response(deleted_message)
+
+
+@route('PUT', '/api/v0/messages/like/add')
+@valid_token_required
+async def add_message_like(request:Request)->Response:
+    """
+    Add like to message from user, as routes.messages.add_message_like
+    :return: empty response
+    """
+    user_id:str = request.principal['user_id']
+    message_id = request.get_json().get('message_id','')
+    try:
+        input_validation.MessageLikeRequest(message_id={"message_id":message_id}, user_id=user_id)
+    except ValidationError as e:
+        raise InputValidationError from e
+    await repository().add_message_like(message_id, user_id)
+    return Response(204)
+
+
+@route('PUT', '/api/v0/messages/like/remove')
+@valid_token_required
+async def remove_message_like(request:Request)->Response:
+    """
+    Remove like from message from user, as routes.messages.remove_message_like
+    :return: empty response
+    """
+    user_id:str = request.principal['user_id']
+    message_id = request.get_json().get('message_id','')
+    try:
+        input_validation.MessageLikeRequest(message_id={"message_id":message_id}, user_id=user_id)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    await repository().remove_message_like(message_id, user_id)
+    return Response(204)
+
+
+@route('GET', '/api/v0/messages/batch-get')
+@valid_token_required
+async def get_messages_batch(request:Request)->Response:
+    """
+    Search for several message_ids at once, as routes.messages.get_messages_batch
+    :return: json response with an item for each message_id in request order
+    """
+    message_ids = request.get_json().get('message_ids',[])
+    try:
+        input_validation.MessagesBatchGetRequest(message_ids=[{"message_id":message_id} for message_id in message_ids])
+    except (ValidationError, TypeError) as e:
+        raise InputValidationError(str(e)) from e
+    messages:List[Optional[Message]] = await repository().get_messages_blog(message_ids)
+    return json_response({"messages": [{"message_id": message_id, "found": False} if message is None
+                                       else {"message_id": message_id, "found": True, "message": message}
+                                       for message_id, message in zip(message_ids, messages)]})
+
+
+@route('GET', '/api/v0/messages/comments')
+@valid_token_required
+async def get_message_comments(request:Request)->Response:
+    """
+    Get a page of the comments of a message, oldest first, as routes.messages.get_message_comments
+    :return: json response with a list of Comment objects and the next_cursor
+    """
+    json_body:dict = request.get_json()
+    message_id = json_body.get('message_id','')
+    limit:int = int(json_body.get('limit', input_validation.COMMENTS_GET_LIMIT))
+    cursor:str = json_body.get('cursor','')
+    try:
+        input_validation.CommentsGetRequest(message_id={"message_id":message_id}, comments_limit=limit, cursor=cursor)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    comments:List[Comment] = await repository().get_comments_blog(message_id, comments_limit=limit, cursor=cursor)
+    next_cursor:Optional[str] = encode_cursor(comments[-1].message_id) if comments and len(comments)==limit else None
+    return json_response({"comments": comments, "next_cursor": next_cursor})
+
+
+@route('GET', '/api/v0/messages/thread')
+@valid_token_required
+async def get_message_thread(request:Request)->Response:
+    """
+    Get a message with the nested tree of its replies, as routes.messages.get_message_thread
+    :return: json response with MessageThread
+    """
+    json_body:dict = request.get_json()
+    message_id = json_body.get('message_id','')
+    max_depth:int = int(json_body.get('max_depth', input_validation.THREAD_MAX_DEPTH))
+    limit:int = int(json_body.get('limit', input_validation.THREAD_REPLIES_LIMIT))
+    try:
+        input_validation.ThreadGetRequest(message_id={"message_id":message_id}, max_depth=max_depth, replies_limit=limit)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    thread:MessageThread = await repository().get_thread_blog(message_id, max_depth=max_depth, limit=limit)
+    return json_response(thread)
+
+
+@route('GET', '/api/v0/messages/likes')
+@valid_token_required
+async def get_message_likes(request:Request)->Response:
+    """
+    Get a page of the likes of a message, newest first, as routes.messages.get_message_likes
+    :return: json response with a list of Like objects and the next_cursor
+    """
+    json_body:dict = request.get_json()
+    message_id = json_body.get('message_id','')
+    limit:int = int(json_body.get('limit', input_validation.LIKES_GET_LIMIT))
+    cursor:str = json_body.get('cursor','')
+    try:
+        input_validation.LikesGetRequest(message_id={"message_id":message_id}, likes_limit=limit, cursor=cursor)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    likes:List[Like] = await repository().get_message_likes_blog(message_id, likes_limit=limit, cursor=cursor)
+    next_cursor:Optional[str] = encode_cursor(likes[-1].like_id) if likes and len(likes)==limit else None
+    return json_response({"likes": likes, "next_cursor": next_cursor})
+
+
+@route('GET', '/api/v0/messages/like/status')
+@valid_token_required
+async def get_message_like_status(request:Request)->Response:
+    """
+    Check if requesting user likes message, as routes.messages.get_message_like_status
+    :return: json response with liked True or False
+    """
+    user_id:str = request.principal['user_id']
+    message_id = request.get_json().get('message_id','')
+    try:
+        input_validation.MessageLikeRequest(message_id={"message_id":message_id}, user_id=user_id)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    return json_response({"message_id": message_id, "liked": await repository().is_message_liked(message_id, user_id)})
+
+
+@route('GET', '/api/v0/messages/get')
+@valid_token_required
+async def get_message(request:Request)->Response:
+    """
+    Get a message with its ETag, as routes.messages.get_message_like
+    :return: json response with the Message, or 304
+    """
+    message_id = request.get_json().get('message_id','')
+    try:
+        input_validation.MessageId(message_id=message_id)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    if 'if-none-match' in request.headers:
+        etag:str = message_etag(message_id, await repository().get_message_version_blog(message_id))
+        if is_not_modified(request, etag):
+            return with_etag(Response(304), etag)
+    encoded_message:EncodedMessage = await repository().get_message_json_blog(message_id)
+    return with_etag(Response(200, encoded_message.data, [(b'content-type', b'application/json')]),
+                     message_etag(encoded_message.message_id, encoded_message.version))
+
+
+async def handle_request(request:Request)->Response:
+    """
+    Run the handler of request, errors are returned in the format of the Flask app
+    :param request: http request
+    :return: response of the handler, or the error response
+    """
+    handler:Optional[Handler] = ROUTES.get((request.method, request.path))
+    if handler is None:
+        if any(path==request.path for _, path in ROUTES):
+            return error_response(BlogAppException(f"Method {request.method} not allowed", 405))
+        return error_response(ResourceNotFoundError(f"Path {request.path} not found"))
+    try:
+        return await handler(request)
+    except BlogAppException as e:
+        return error_response(e)
+    except Exception as e:
+        logging.exception(f"{request.method} {request.path} failed")
+        return error_response(BlogAppException(f"Internal server error: {type(e).__name__}", 500))
+
+
+async def read_body(receive, headers:Dict[str, str], body_limit:int)->bytes:
+    """
+    Read the whole request body from ASGI http.request messages, up to body_limit bytes.
+    A body announced longer by Content-Length isn't read at all, otherwise reading stops at the chunk crossing the limit
+    :param receive: ASGI receive callable
+    :param headers: request headers, lower case names
+    :param body_limit: longest body in bytes
+    :return: request body
+    :raises: PayloadTooLargeError if the body is longer than body_limit
+    """
+    if headers.get('content-length', '').isdigit() and int(headers['content-length']) > body_limit:
+        raise PayloadTooLargeError(f"Request body is limited to {body_limit} bytes")
+    chunks:List[bytes] = []
+    body_size:int = 0
+    while True:
+        message:dict = await receive()
+        chunk:bytes = message.get('body', b'')
+        body_size += len(chunk)
+        if body_size > body_limit:
+            raise PayloadTooLargeError(f"Request body is limited to {body_limit} bytes")
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def send_response(send, response:Response)->None:
+    """
+    Send response with ASGI http.response messages, streaming it when its body is an async iterator
+    :param send: ASGI send callable
+    :param response: response to send
+    :return: None
+    """
+    if isinstance(response.body, bytes):
+        await send({'type': 'http.response.start', 'status': response.status,
+                    'headers': response.headers + [(b'content-length', str(len(response.body)).encode('ascii'))]})
+        await send({'type': 'http.response.body', 'body': response.body})
+        return
+    await send({'type': 'http.response.start', 'status': response.status, 'headers': response.headers})
+    try:
+        async for chunk in response.body:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    except BlogAppException as e:
+        # status was already sent, the client gets truncated json
+        logging.error(f"Streamed response failed: {e.message}")
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send)->None:
+    """
+    Create the async repository on startup, in the event loop of the server, and close it on shutdown
+    :param receive: ASGI receive callable
+    :param send: ASGI send callable
+    :return: None
+    """
+    while True:
+        message:dict = await receive()
+        if message['type']=='lifespan.startup':
+            try:
+                if async_repository.SERVER_ASYNC_REPOSITORY is None:
+                    from src.db.mongo_db.async_mongo_repository import AsyncMongoDBRepository
+                    async_repository.SERVER_ASYNC_REPOSITORY = AsyncMongoDBRepository()
+                    await async_repository.SERVER_ASYNC_REPOSITORY.ping()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type']=='lifespan.shutdown':
+            if hasattr(async_repository.SERVER_ASYNC_REPOSITORY, 'close'):
+                await async_repository.SERVER_ASYNC_REPOSITORY.close()
+            async_repository.SERVER_ASYNC_REPOSITORY = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send)->None:
+    """
+    ASGI application serving the /api/v0 auth and messages routes of the Flask app, run with e.g.
+        uvicorn src.server.asgi.app:app
+    :param scope: ASGI connection scope
+    :param receive: ASGI receive callable
+    :param send: ASGI send callable
+    :return: None
+    """
+    if scope['type']=='lifespan':
+        return await lifespan(receive, send)
+    if scope['type']!='http':
+        return
+    headers:Dict[str, str] = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    try:
+        body:bytes = await read_body(receive, headers, BODY_LIMITS.get((scope['method'], scope['path']),
+                                                                       input_validation.REQUEST_BODY_LIMIT))
+    except PayloadTooLargeError as e:
+        return await send_response(send, error_response(e))
+    request:Request = Request(method=scope['method'], path=scope['path'], headers=headers, body=body)
+    await send_response(send, await handle_request(request))
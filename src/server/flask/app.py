@@ -1,30 +1,203 @@
-from flask import Flask
+import time
+_IMPORT_STARTED_AT:float = time.perf_counter()
+from flask import Flask, jsonify
+from threading import Lock
+from typing import Dict, List, Mapping, Optional
 from flask_login import LoginManager
 import os
 from src.server.routes.messages import messages_bp
+from src.server.routes.messages_v1 import messages_v1_bp
 import src.db.repository as repository
+from src.db.repository import Repository
 from src.db.mongo_db.mongo_repository import MongoDBRepository
+from src.db.delegating_repository import DelegatingRepository
+from src.db.caching_repository import CachingRepository, REPOSITORY_CACHE_ENABLED
+from src.db.front_page_repository import FrontPageRepository, FRONT_PAGE_SIZE
+from src.db.single_flight_repository import SingleFlightRepository, SINGLE_FLIGHT_ENABLED
 from src.server.routes.auth import auth_bp
+from src.server.routes.batch import batch_bp
+from src.server.routes.health import health_bp
+from src.server.routes.principal_cache import PRINCIPAL_CACHE, PrincipalCacheRepository
+from src.server.routes.password_hashing import password_hashing_stats
+from src.server.flask.compression import init_compression, compression_stats
+from src.server.flask.exceptions import BlogAppException
 import logging
 
 logging.basicConfig(level=logging.INFO)
-app:Flask = Flask(__name__)
 login_manager:LoginManager = LoginManager()
-repository.SERVER_REPOSITORY = MongoDBRepository()
+_server_repository_lock:Lock = Lock()
+
+
+def create_server_repository()->Repository:
+    """
+    Create MongoDBRepository wrapped in the enabled repository layers, and the principal cache invalidation of user writes,
+    without waiting for MongoDB
+    :return: server repository
+    """
+    server_repository:Repository = MongoDBRepository()
+    if SINGLE_FLIGHT_ENABLED:
+        server_repository = SingleFlightRepository(server_repository)
+    if FRONT_PAGE_SIZE > 0:
+        server_repository = FrontPageRepository(server_repository)
+    if REPOSITORY_CACHE_ENABLED:
+        server_repository = CachingRepository(server_repository)
+    return PrincipalCacheRepository(server_repository)
+
+
+def init_server_repository()->None:
+    """
+    Create the server repository on first use in this process.
+    Run before every request, so a pre-fork server creates MongoClient in each worker after fork
+    :return: None
+    """
+    if repository.SERVER_REPOSITORY is None:
+        with _server_repository_lock:
+            if repository.SERVER_REPOSITORY is None:
+                repository.SERVER_REPOSITORY = create_server_repository()
+
+
+def reset_server_repository()->None:
+    """
+    Drop the server repository and MongoClient inherited from the parent, called in a forked child process
+    :return: None
+    """
+    global _server_repository_lock
+    _server_repository_lock = Lock()
+    repository.SERVER_REPOSITORY = None
+    MongoDBRepository.reset_after_fork()
+
+
+os.register_at_fork(after_in_child=reset_server_repository)
+
+
+def check_config()->None:
+    """
+    Check configuration needed to serve requests, without connecting to MongoDB
+    :return: None
+    :raises: BlogAppException if JWT_SECRET_KEY isn't set
+    """
+    if not os.environ.get('JWT_SECRET_KEY'):
+        raise BlogAppException("JWT_SECRET_KEY isn't set", 500)
+
+
+def preflight()->None:
+    """
+    Check configuration and MongoDB before a deployment: MongoDB is reachable and indexes exist.
+    The client is closed afterwards, so it isn't held by the process running the check
+    :return: None
+    :raises:
+        BlogAppException if JWT_SECRET_KEY isn't set
+        DatabaseError if MongoDB can't be reached
+    """
+    check_config()
+    start:float = time.perf_counter()
+    try:
+        MongoDBRepository().ping()
+        MongoDBRepository.create_indexes()
+    finally:
+        MongoDBRepository.close()
+    logging.info(f"Preflight passed, MongoDB reachable and indexes created in {(time.perf_counter() - start) * 1000:.0f}ms")
+
 
-@app.route('/')
 def home():
     """
     Default home route
     """
     return "Welcome to Blog App home route!"
 
-app.register_blueprint(messages_bp, url_prefix='/api/v0/messages')
-app.register_blueprint(auth_bp, url_prefix='/api/v0/auth')
+def repository_stats()->dict:
+    """
+    Counters of every layer wrapped around the server repository
+    :return: dict of repository layer class name to its counters
+    """
+    stats:dict = {}
+    layer = repository.SERVER_REPOSITORY
+    while isinstance(layer, DelegatingRepository):
+        stats[type(layer).__name__] = layer.stats()
+        layer = layer.wrapped_repository
+    return stats
 
-if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=int(os.getenv("FLASK_PORT", 5000)))
+def metrics():
+    """
+    Counters of the in process caches, used to follow saved db round trips
+    """
+    return jsonify({"principal_cache": PRINCIPAL_CACHE.stats(),
+                    "password_hashing": password_hashing_stats(),
+                    "like_write_buffer": MongoDBRepository().like_write_buffer_stats(),
+                    "compression": compression_stats(),
+                    "repository": repository_stats()})
 
+def backfill_message_ancestors():
+    """
+    Migration setting ancestor_ids on existing messages, needed to delete their threads
+    """
+    mongo_repository:MongoDBRepository = MongoDBRepository()
+    mongo_repository.create_indexes()
+    updated_count:int = mongo_repository.backfill_ancestor_ids()
+    logging.info(f"Backfilled ancestor_ids of {updated_count} messages")
 
+def migrate_message_likes():
+    """
+    Migration moving user_likes arrays of existing messages to the likes collection
+    """
+    mongo_repository:MongoDBRepository = MongoDBRepository()
+    # upserted likes rely on the unique index of likes, which may not be created yet by the background thread
+    mongo_repository.create_indexes()
+    migrated_count:int = mongo_repository.migrate_user_likes()
+    logging.info(f"Migrated likes of {migrated_count} messages")
 
+def backfill_like_threads():
+    """
+    Migration setting thread_ids on existing likes, needed to delete them with their thread
+    """
+    mongo_repository:MongoDBRepository = MongoDBRepository()
+    mongo_repository.create_indexes()
+    updated_count:int = mongo_repository.backfill_like_thread_ids()
+    logging.info(f"Backfilled thread_ids of {updated_count} likes")
 
+def index_drift_report():
+    """
+    Report indexes differing from the index registry, exits with status 1 if any index is missing or changed.
+    Extra indexes are reported only, they may be dropped by hand once no deployed version needs them
+    """
+    drift:Dict[str, Dict[str, List[str]]] = MongoDBRepository().index_drift()
+    for collection, collection_drift in drift.items():
+        logging.info(f"Index drift of {collection}: {collection_drift}")
+    if any(collection_drift["missing"] or collection_drift["changed"] for collection_drift in drift.values()):
+        raise SystemExit(1)
+    logging.info("Indexes match the index registry" if not drift else "No index missing or changed")
+
+
+def create_app(config:Optional[Mapping[str, any]] = None)->Flask:
+    """
+    Create the Flask app. The server repository isn't created here but before the first request of each process,
+    so the app can be imported by a pre-fork server master
+    :param config: Flask config values, SERVER_REPOSITORY sets the repository used instead of MongoDB
+    :return: Flask app
+    """
+    app:Flask = Flask(__name__)
+    app.config.from_mapping(config or {})
+    if app.config.get('SERVER_REPOSITORY') is not None:
+        repository.SERVER_REPOSITORY = app.config['SERVER_REPOSITORY']
+    app.before_request(init_server_repository)
+    app.add_url_rule('/', view_func=home)
+    app.add_url_rule('/metrics', view_func=metrics)
+    app.cli.command('backfill-message-ancestors')(backfill_message_ancestors)
+    app.cli.command('migrate-message-likes')(migrate_message_likes)
+    app.cli.command('backfill-like-threads')(backfill_like_threads)
+    app.cli.command('preflight')(preflight)
+    app.cli.command('index-drift')(index_drift_report)
+    app.register_blueprint(messages_bp, url_prefix='/api/v0/messages')
+    app.register_blueprint(auth_bp, url_prefix='/api/v0/auth')
+    app.register_blueprint(batch_bp, url_prefix='/api/v0/batch')
+    app.register_blueprint(messages_v1_bp, url_prefix='/api/v1')
+    app.register_blueprint(health_bp)
+    init_compression(app)
+    return app
+
+
+app:Flask = create_app()
+logging.info(f"App created in {(time.perf_counter() - _IMPORT_STARTED_AT) * 1000:.0f}ms")
+
+if __name__ == '__main__':
+    app.run(host="0.0.0.0", port=int(os.getenv("FLASK_PORT", 5000)))
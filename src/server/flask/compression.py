@@ -0,0 +1,156 @@
+from flask import Flask, Request, Response, request
+from typing import Callable, Dict, Iterable, Iterator, Optional
+import gzip
+import logging
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logging.basicConfig(level=logging.INFO)
+
+RESPONSE_COMPRESSION:bool = os.environ.get('RESPONSE_COMPRESSION', 'true').lower()=='true'
+# smaller bodies are sent as is, their compression saves fewer bytes than the cpu it costs
+COMPRESSION_MIN_SIZE:int = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL:int = int(os.environ.get('GZIP_LEVEL', 6))
+ZSTD_LEVEL:int = int(os.environ.get('ZSTD_LEVEL', 3))
+# uncompressed bytes of a streamed response buffered by the compressor before it is flushed to the client
+COMPRESSION_STREAM_FLUSH_SIZE:int = int(os.environ.get('COMPRESSION_STREAM_FLUSH_SIZE', 16384))
+COMPRESSIBLE_MIMETYPES:set = {'application/json', 'text/html', 'text/plain'}
+
+_compression_counters:Dict[str, int] = {"compressed": 0, "streamed": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def supported_encodings()->list:
+    """
+    Content encodings the server can send, in order of preference
+    :return: list of encodings, zstd only when zstandard is installed
+    """
+    return ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+
+
+def negotiate_encoding(http_request:Request)->Optional[str]:
+    """
+    Choose the content encoding with the highest Accept-Encoding quality, zstd wins ties
+    :param http_request: http request
+    :return: chosen encoding or None if the client accepts none of the supported encodings
+    """
+    return http_request.accept_encodings.best_match(supported_encodings())
+
+
+def compress_body(data:bytes, encoding:str, level:Optional[int] = None)->bytes:
+    """
+    Compress a whole response body
+    :param data: response body
+    :param encoding: gzip or zstd
+    :param level: compression level, GZIP_LEVEL/ZSTD_LEVEL by default
+    :return: compressed body
+    """
+    if encoding=='zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL if level is None else level).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level)
+
+
+def compress_stream(chunks:Iterable[bytes], encoding:str, level:Optional[int] = None)->Iterator[bytes]:
+    """
+    Compress a streamed response body chunk by chunk.
+    The first chunk is flushed at once to keep time to first byte, later ones every COMPRESSION_STREAM_FLUSH_SIZE bytes,
+    since each flush costs compression ratio
+    :param chunks: response body chunks
+    :param encoding: gzip or zstd
+    :param level: compression level, GZIP_LEVEL/ZSTD_LEVEL by default
+    :return: iterator of compressed chunks
+    """
+    if encoding=='zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL if level is None else level).compressobj()
+        flush_chunk:Callable[[], bytes] = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    else:
+        # wbits 16 + MAX_WBITS writes a gzip header and trailer
+        compressor = zlib.compressobj(GZIP_LEVEL if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        flush_chunk = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+    flushes:int = 0
+    unflushed_size:int = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            compressed_chunk:bytes = compressor.compress(chunk)
+            _compression_counters["bytes_in"] += len(chunk)
+            unflushed_size += len(chunk)
+            if flushes==0 or unflushed_size >= COMPRESSION_STREAM_FLUSH_SIZE:
+                compressed_chunk += flush_chunk()
+                flushes += 1
+                unflushed_size = 0
+            if compressed_chunk:
+                _compression_counters["bytes_out"] += len(compressed_chunk)
+                yield compressed_chunk
+        compressed_chunk = compressor.flush()
+        _compression_counters["bytes_out"] += len(compressed_chunk)
+        yield compressed_chunk
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response:Response)->Response:
+    """
+    after_request hook compressing the response with the encoding negotiated from Accept-Encoding.
+    Streamed responses are always compressed, others only from COMPRESSION_MIN_SIZE bytes.
+    Strong ETags become weak, the compressed body isn't byte for byte the resource representation
+    :param response: response of the request
+    :return: response, compressed when possible
+    """
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers or request.method=='HEAD'):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not response.is_streamed and (response.content_length or 0) < COMPRESSION_MIN_SIZE:
+        return response
+    encoding:Optional[str] = negotiate_encoding(request)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+        _compression_counters["streamed"] += 1
+    else:
+        data:bytes = response.get_data()
+        compressed_data:bytes = compress_body(data, encoding)
+        if len(compressed_data) >= len(data):
+            return response
+        response.set_data(compressed_data)
+        _compression_counters["bytes_in"] += len(data)
+        _compression_counters["bytes_out"] += len(compressed_data)
+    response.headers['Content-Encoding'] = encoding
+    _compression_counters["compressed"] += 1
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_compression(app:Flask)->None:
+    """
+    Register response compression on app, unless RESPONSE_COMPRESSION is disabled
+    :param app: flask app
+    :return: None
+    """
+    if not RESPONSE_COMPRESSION:
+        return
+    app.after_request(compress_response)
+    logging.info(f"Response compression enabled with {', '.join(supported_encodings())}")
+
+
+def compression_stats()->Dict[str, int]:
+    """
+    Counters of compressed responses
+    :return: dict of counter name to value
+    """
+    return dict(_compression_counters, enabled=RESPONSE_COMPRESSION, min_size=COMPRESSION_MIN_SIZE)
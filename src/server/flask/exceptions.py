@@ -55,4 +55,18 @@ class TimeoutError(BlogAppException):
     def __init__(self, message="Timeout passed"):
         self.message = message
         self.error_code = 408
-        super().__init__(self.message, self.error_code)
\ No newline at end of file
+        super().__init__(self.message, self.error_code)
+
+class ServiceUnavailableError(BlogAppException):
+    """Raised when the server is too busy to handle the request"""
+    def __init__(self, message="Service unavailable"):
+        self.message = message
+        self.error_code = 503
+        super().__init__(self.message, self.error_code)
+
+class PayloadTooLargeError(BlogAppException):
+    """Raised when the request body is larger than allowed"""
+    def __init__(self, message="Payload too large"):
+        self.message = message
+        self.error_code = 413
+        super().__init__(self.message, self.error_code)
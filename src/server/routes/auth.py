@@ -1,10 +1,10 @@
 from flask import Blueprint, request, jsonify, make_response
-from src.server.flask.exceptions import AuthenticationError, BlogAppException, InputValidationError
+from src.server.flask.exceptions import AuthenticationError, BlogAppException, InputValidationError, ServiceUnavailableError
 import src.db.repository as repository
 from src.db.odm_blog import User
 from src.server.routes.token import generate_jwt
 import src.server.routes.input_validation as input_validation
-import bcrypt
+from src.server.routes.password_hashing import hash_password, check_password, password_needs_rehash
 import logging
 from typing import List
 
@@ -12,37 +12,22 @@ logging.basicConfig(level=logging.INFO)
 
 auth_bp = Blueprint('auth',__name__)
 
-def hash_password(password: str) -> str:
+def rehash_password_if_needed(user:User, password:str)->User:
     """
-    hash password to be stored in the database
-    :param password: unhashed password
-    :return: hashed password
+    Store password hashed with the configured bcrypt cost if the stored hash uses a different cost.
+    Rehash failures are logged and don't fail the login
+    :param user: User with verified password
+    :param password: verified unhashed password
+    :return: User object with the stored password hash
     """
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed_password.decode('utf-8')
-
-
-def check_password(stored_hash: str, password: str) -> bool:
-    """
-    compare between stored_hash password and unhashed password using bycrypt
-    :param stored_hash: database stored hashed password
-    :param password: unhashed password
-    :return: True if passwords are the same and False otherwise
-    """
-    return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
-
-
-def verify_credentials(user_id_input:str, password_input:str)-> bool:
-    """
-    Verify inputed user_id and password match information in database
-    :param user_id_input: inputed unique user identifier
-    :param password_input: inputed matching password
-    :return: False if the user_id and password don't match
-    :raise: ResourceNotFoundError if user_id doesn't exist in database
-    """
-    user:User = repository.SERVER_REPOSITORY.get_user_blog(user_id_input)
-    return check_password(user.password, password_input)
+    if not password_needs_rehash(user.password):
+        return user
+    try:
+        user = repository.SERVER_REPOSITORY.update_user_details_blog(user.user_id, password=hash_password(password))
+        logging.info(f"User {user.user_id} password rehashed")
+    except BlogAppException as e:
+        logging.warning(f"User {user.user_id} password rehash failed: {e.message}")
+    return user
 
 @auth_bp.errorhandler(BlogAppException)
 def handle_blog_app_exception(exception:BlogAppException):
@@ -71,13 +56,16 @@ def login():
     logging.info(f"User {user_id} Login started")
     try:
         input_validation.CredentialsValidation(user_id=user_id, password=password)
-        if not verify_credentials(user_id, password):
-            raise AuthenticationError("Invalid Credentials")
         user:User = repository.SERVER_REPOSITORY.get_user_blog(user_id)
+        if not check_password(user.password, password):
+            raise AuthenticationError("Invalid Credentials")
+    except ServiceUnavailableError as e:
+        raise e
     except Exception as e:
         logging.info(str(e))
         raise AuthenticationError("Invalid Credentials") from e
 
+    user = rehash_password_if_needed(user, password)
     token = generate_jwt(user.user_id, user.password, user.roles)
     logging.info(f"User {user_id} Login success, returning JWT")
     return jsonify({'token': token}), 200
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify, current_app, Response
+from werkzeug.exceptions import HTTPException, NotFound
+import src.server.routes.input_validation as input_validation
+from src.server.flask.exceptions import InputValidationError, BlogAppException
+from src.server.routes.messages import messages_bp, handle_blog_app_exception
+from src.server.routes.token import valid_token_required, get_payload_from_request
+import logging
+logging.basicConfig(level=logging.INFO)
+
+
+batch_bp = Blueprint('batch',__name__)
+
+
+@batch_bp.errorhandler(BlogAppException)
+def handle_batch_exception(exception:BlogAppException):
+    """
+    Returns any error raised as a failed JSON response
+    :param exception: BlogAppException that lead to request failure
+    :return: json with error code and message
+    """
+    return handle_blog_app_exception(exception)
+
+
+def run_operation(operation:dict)->Response:
+    """
+    Run a single batch operation on its messages_bp route, with the Authorization header of the batch request.
+    The operation is dispatched in its own request context with full_dispatch_request, so the route reads its body,
+    and its before/after request hooks and error handlers run, as for a standalone request
+    :param operation: dict with method, path (e.g. /api/v0/messages/like/add) and optional json body
+    :return: response of the route, or the error response of the operation
+    """
+    try:
+        if not isinstance(operation, dict):
+            raise InputValidationError("operation must be an object with method, path and body")
+        method:str = str(operation.get('method', 'GET')).upper()
+        path:str = str(operation.get('path', ''))
+        body = operation.get('body', {})
+        endpoint, _ = current_app.url_map.bind('localhost').match(path, method=method)
+        if endpoint.split('.')[0]!=messages_bp.name:
+            raise NotFound(f"{path} is not a messages route")
+        with current_app.test_request_context(path, method=method, json=body,
+                                              headers={"Authorization": request.headers['Authorization']}):
+            return current_app.full_dispatch_request()
+    except BlogAppException as e:
+        return current_app.make_response(handle_blog_app_exception(e))
+    except HTTPException as e:
+        return current_app.make_response((jsonify({"error": type(e).__name__, "message": e.description}), e.code))
+    except Exception as e:
+        logging.error(f"Batch operation failed: {e}")
+        return current_app.make_response((jsonify({"error": type(e).__name__, "message": "Internal Server Error"}), 500))
+
+
+@batch_bp.route('',methods=['POST'])
+@valid_token_required
+def run_batch():
+    """
+    Runs a list of messages operations in order with a single authentication,
+    each operation succeeds or fails on its own as if it was sent as a separate request
+    :return: json response with status and body of each operation in request order
+    """
+    payload = get_payload_from_request(request)
+    operations = request.get_json().get('operations', [])
+    if not isinstance(operations, list) or len(operations) > input_validation.BATCH_OPERATIONS_LIMIT:
+        raise InputValidationError(f"operations must be a list of up to {input_validation.BATCH_OPERATIONS_LIMIT} operations")
+
+    results:list[dict] = []
+    for operation in operations:
+        response:Response = run_operation(operation)
+        results.append({"status": response.status_code, "body": response.get_json(silent=True)})
+    logging.info(f"Batch of {len(operations)} operations by {payload['user_id']}")
+    return jsonify({"results": results})
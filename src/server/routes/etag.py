@@ -0,0 +1,54 @@
+from flask import Response, make_response, request
+import hashlib
+import json
+import os
+import time
+
+# edits and likes don't change the feed version, a feed page ETag still changes at least this often so they show
+FEED_ETAG_STALENESS_SECONDS:int = int(os.environ.get('FEED_ETAG_STALENESS_SECONDS', 30))
+
+
+def message_etag(message_id:str, version:int)->str:
+    """
+    Strong ETag of a message, changes whenever the message is edited or liked
+    :param message_id: unique identifier for message
+    :param version: message version
+    :return: ETag value without quotes
+    """
+    return f"{message_id}.{version}"
+
+
+def feed_etag(feed_version:int, **page:any)->str:
+    """
+    Weak ETag of a posts feed page, changes whenever a post is created or deleted, and every FEED_ETAG_STALENESS_SECONDS.
+    Pages with the same ETag have the same posts, with edits and like counts up to FEED_ETAG_STALENESS_SECONDS old
+    :param feed_version: posts feed version
+    :param page: parameters selecting the page, e.g. limit and cursor
+    :return: ETag value without quotes
+    """
+    page_digest:str = hashlib.sha1(json.dumps(page, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    # wall clock periods, so every process gives the same ETag at the same time
+    staleness_period:int = int(time.time() // FEED_ETAG_STALENESS_SECONDS)
+    return f"feed.{feed_version}.{staleness_period}.{page_digest}"
+
+
+def is_not_modified(etag:str)->bool:
+    """
+    Check if the request If-None-Match holds etag.
+    Weak comparison is used as for any If-None-Match, so ETags weakened by compression still match
+    :param etag: current ETag of the requested resource
+    :return: True if the client already has the current representation
+    """
+    return request.if_none_match.contains_weak(etag)
+
+
+def not_modified_response(etag:str, weak:bool = False)->Response:
+    """
+    Empty 304 response for a client that already has the current representation
+    :param etag: current ETag of the requested resource
+    :param weak: True for a weak ETag
+    :return: 304 response with ETag
+    """
+    response:Response = make_response('', 304)
+    response.set_etag(etag, weak=weak)
+    return response
@@ -0,0 +1,84 @@
+from flask import Blueprint, jsonify
+from threading import Lock
+from typing import Dict, Optional
+import src.db.repository as repository
+from src.server.flask.exceptions import BlogAppException
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+# how long a readiness result is reused, bounds db pings of frequent health checks to one per interval
+READINESS_CACHE_SECONDS:float = float(os.environ.get('READINESS_CACHE_SECONDS', 2))
+
+
+health_bp = Blueprint('health',__name__)
+
+
+class ReadinessCheck:
+    """
+    Cached result of pinging the server repository and checking its indexes are created.
+    A single request pings when the result expired, concurrent checks reuse the previous result meanwhile
+    """
+    def __init__(self, cache_seconds:float = READINESS_CACHE_SECONDS):
+        self._cache_seconds:float = cache_seconds
+        self._ready:bool = False
+        self._error:Optional[str] = None
+        self._checked_at:Optional[float] = None
+        self._lock:Lock = Lock()
+        self.pings:int = 0
+
+    def check(self)->Dict[str, any]:
+        """
+        Readiness of the server repository, pinged if the cached result is older than cache_seconds
+        :return: dict with ready, error of the last failed ping and age_ms of the result
+        """
+        if self.__expired() and self._lock.acquire(blocking=self._checked_at is None):
+            try:
+                if self.__expired():
+                    self.__ping()
+            finally:
+                self._lock.release()
+        return {"ready": self._ready, "error": self._error,
+                "age_ms": round((time.monotonic() - self._checked_at) * 1000)}
+
+    def __expired(self)->bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self._cache_seconds
+
+    def __ping(self)->None:
+        self.pings += 1
+        try:
+            if repository.SERVER_REPOSITORY is None:
+                raise BlogAppException("Server repository isn't created", 503)
+            repository.SERVER_REPOSITORY.ping()
+            # unique indexes enforce one like per user and one user per user_id, writes before them may duplicate
+            if not repository.SERVER_REPOSITORY.indexes_created():
+                raise BlogAppException("Indexes aren't created yet", 503)
+            self._ready, self._error = True, None
+        except Exception as e:
+            if self._ready:
+                logging.warning(f"Readiness check failed: {e}")
+            self._ready, self._error = False, str(e)
+        self._checked_at = time.monotonic()
+
+
+READINESS_CHECK:ReadinessCheck = ReadinessCheck()
+
+
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness route: the process serves requests, the db isn't checked
+    """
+    return jsonify({"status": "ok"}), 200
+
+
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness route: 200 while the db is reachable and its indexes are created, else 503 so load balancers skip this process
+    """
+    readiness:Dict[str, any] = READINESS_CHECK.check()
+    return jsonify({"status": "ready" if readiness["ready"] else "unavailable", **readiness}), \
+        200 if readiness["ready"] else 503
@@ -1,12 +1,34 @@
 from bson import ObjectId
 from bson.errors import InvalidId
 from pydantic import BaseModel, Field, ValidationError, validator
-import src.db.repository as repository
+from src.db.pagination import decode_cursor
 from src.server.flask.exceptions import InputValidationError
 from typing import List
 
 INPUT_LENGTH_LIMIT:int = 1000
 POSTS_GET_LIMIT:int = 1000
+LIKES_GET_LIMIT:int = 1000
+COMMENTS_GET_LIMIT:int = 1000
+MESSAGES_BATCH_GET_LIMIT:int = 100
+MESSAGES_BULK_CREATE_LIMIT:int = 1000
+MESSAGES_BULK_CREATE_BODY_LIMIT:int = 4 * 1024 * 1024
+# body of every other route, a message content of INPUT_LENGTH_LIMIT characters fits many times
+REQUEST_BODY_LIMIT:int = 64 * 1024
+THREAD_MAX_DEPTH:int = 20
+THREAD_REPLIES_LIMIT:int = 100
+BATCH_OPERATIONS_LIMIT:int = 20
+
+
+def validate_cursor(cursor:str)->str:
+    """
+    Validate optional pagination cursor
+    :param cursor: cursor string or '' for the first page
+    :return: cursor
+    :raises: InputValidationError if cursor is malformed
+    """
+    if cursor != '':
+        decode_cursor(cursor)
+    return cursor
 
 class MessageId(BaseModel):
     """
@@ -22,31 +44,57 @@ class MessageId(BaseModel):
             raise InputValidationError from e
 
 
+class MessagesBatchGetRequest(BaseModel):
+    """
+    Validate input for getting a batch of messages
+    """
+    message_ids:List[MessageId] = Field(...,min_length=1,max_length=MESSAGES_BATCH_GET_LIMIT)
+
+
 class PostsGetRequest(BaseModel):
     """
     Validate input for a get posts request
     """
     start_index:int = Field(...,ge=0)
-    posts_limit:int = Field(...,ge=0,le=POSTS_GET_LIMIT)
+    posts_limit:int = Field(...,ge=1,le=POSTS_GET_LIMIT)
+    cursor:str = Field('', max_length=INPUT_LENGTH_LIMIT)
+    _validate_cursor = validator('cursor', allow_reuse=True)(validate_cursor)
+
+
+def validate_reply_to_message_id(reply_to_message_id:str)->str:
+    """
+    Validate reply_to_message_id is empty or a valid message_id.
+    Existence of the replied message is verified by the repository when the message is created
+    :param reply_to_message_id: message_id of message being replied or '' for a Post
+    :return: reply_to_message_id
+    :raises: InputValidationError if reply_to_message_id isn't a valid message_id
+    """
+    try:
+        if reply_to_message_id != '':
+            ObjectId(reply_to_message_id)
+        return reply_to_message_id
+    except InvalidId as e:
+        raise InputValidationError from e
 
 
 class MessageCreateRequest(BaseModel):
     """
     Validate input for a creating a message
-    reply_to_message_id needs to be empty or a valid message_id that exists in database
+    reply_to_message_id needs to be empty or a valid message_id
     """
     content: str = Field(...,min_length=1, max_length=INPUT_LENGTH_LIMIT)
     user_id_owner: str = Field(...,min_length=1, max_length=INPUT_LENGTH_LIMIT)
     reply_to_message_id:str = None
-    @validator('reply_to_message_id')
-    def message_id_exists(cls, reply_to_message_id):
-        try:
-            if reply_to_message_id != '':
-                ObjectId(reply_to_message_id)
-                repository.SERVER_REPOSITORY.get_message_blog(reply_to_message_id)
-            return reply_to_message_id
-        except InvalidId as e:
-            raise InputValidationError from e
+    _validate_reply_to_message_id = validator('reply_to_message_id', allow_reuse=True)(validate_reply_to_message_id)
+
+
+class MessageBulkCreateItem(BaseModel):
+    """
+    Validate input of a single message of a bulk create request
+    """
+    content: str = Field(...,min_length=1, max_length=INPUT_LENGTH_LIMIT)
+    reply_to_message_id:str = ''
+    _validate_reply_to_message_id = validator('reply_to_message_id', allow_reuse=True)(validate_reply_to_message_id)
 
 
 class MessageEditRequest(BaseModel):
@@ -71,6 +119,32 @@ class MessageLikeRequest(BaseModel):
     message_id:MessageId
     user_id: str = Field(...,min_length=1, max_length=INPUT_LENGTH_LIMIT)
 
+class LikesGetRequest(BaseModel):
+    """
+    Validate input for a get message likes request
+    """
+    message_id:MessageId
+    likes_limit:int = Field(...,ge=1,le=LIKES_GET_LIMIT)
+    cursor:str = Field('', max_length=INPUT_LENGTH_LIMIT)
+    _validate_cursor = validator('cursor', allow_reuse=True)(validate_cursor)
+
+class CommentsGetRequest(BaseModel):
+    """
+    Validate input for a get message comments request
+    """
+    message_id:MessageId
+    comments_limit:int = Field(...,ge=1,le=COMMENTS_GET_LIMIT)
+    cursor:str = Field('', max_length=INPUT_LENGTH_LIMIT)
+    _validate_cursor = validator('cursor', allow_reuse=True)(validate_cursor)
+
+class ThreadGetRequest(BaseModel):
+    """
+    Validate input for a get message thread request
+    """
+    message_id:MessageId
+    max_depth:int = Field(...,ge=0,le=THREAD_MAX_DEPTH)
+    replies_limit:int = Field(...,ge=0,le=THREAD_REPLIES_LIMIT)
+
 class CredentialsValidation(BaseModel):
     """
     Validate input for credentials
@@ -1,14 +1,16 @@
-from flask import Blueprint, request, jsonify, make_response
-from src.db.odm_blog import Post, Message
+from flask import Blueprint, request, jsonify, make_response, current_app, Response, stream_with_context
+from src.db.odm_blog import Post, Comment, EncodedMessage, Message, MessageThread, NewMessage, Like
 from dataclasses import asdict
 import src.db.repository as repository
+from src.db.pagination import encode_cursor
 from pydantic import ValidationError
 import src.server.routes.input_validation as input_validation
-from src.server.flask.exceptions import InputValidationError, BlogAppException
-from src.server.routes.token import valid_token_required,role_required,message_user_id_owner_required
+from src.server.flask.exceptions import InputValidationError, BlogAppException, PayloadTooLargeError, UnauthorizedError
+from src.server.routes.token import valid_token_required,role_required
 import logging
 from src.server.routes.token import get_payload_from_request
-from typing import Union
+from src.server.routes.etag import message_etag, feed_etag, is_not_modified, not_modified_response
+from typing import Iterator, Union
 logging.basicConfig(level=logging.INFO)
 
 
@@ -43,18 +45,83 @@ def __verify_post_user_if_no_reply_to_message_id():
 @valid_token_required
 def get_posts_blog():
     """
-    Get a lists of Posts that exist in the blog database
-    :return: json response with a list of Post objects
+    Get a page of Posts that exist in the blog database, newest first.
+    next_cursor is passed back as cursor to get the following page, start_index is a fallback.
+    The weak page ETag follows the feed version, a request with a matching If-None-Match gets 304 without reading posts
+    :return: json response with a list of Post objects and the next_cursor
     """
     start_index = int(request.get_json().get('start_index',0))
     limit:int = int(request.get_json().get('limit', input_validation.POSTS_GET_LIMIT))
+    cursor:str = request.get_json().get('cursor','')
+    stream:bool = request.get_json().get('stream', False) is True
+    return posts_page_response(start_index, limit, cursor, stream)
+
+
+def posts_page_response(start_index:int, limit:int, cursor:str, stream:bool)->Response:
+    """
+    Response of a posts feed page, shared by the v0 and v1 routes
+    :param start_index: starting post index, ignored if cursor is given
+    :param limit: post limit for pagination
+    :param cursor: opaque cursor of the last post of the previous page
+    :param stream: True to stream the posts as they are read from the db
+    :return: json response with a list of Post objects and the next_cursor, or 304
+    :raises: InputValidationError for invalid page parameters
+    """
     try:
-        input_validation.PostsGetRequest(start_index=start_index, posts_limit=limit)
-        posts:list[Post] = repository.SERVER_REPOSITORY.get_posts_blog(start_index=start_index, posts_limit=limit)
-    except ValidationError or TypeError as e:
+        input_validation.PostsGetRequest(start_index=start_index, posts_limit=limit, cursor=cursor)
+    except (ValidationError, TypeError) as e:
         raise InputValidationError from e
-    logging.info("GET Posts Blog success")
-    return jsonify(posts), 200
+    # read before the posts, a post changed in between only makes the next request miss the ETag
+    etag:str = feed_etag(repository.SERVER_REPOSITORY.get_feed_version_blog(),
+                         start_index=start_index, limit=limit, cursor=cursor, stream=stream)
+    if is_not_modified(etag):
+        return not_modified_response(etag, weak=True)
+    if stream:
+        response = stream_posts_blog(start_index, limit, cursor)
+    else:
+        # posts come encoded from the repository, the page json is joined around them in key order as jsonify would
+        posts:list[EncodedMessage] = repository.SERVER_REPOSITORY.get_posts_json_blog(start_index=start_index, posts_limit=limit, cursor=cursor)
+        next_cursor:Union[str,None] = encode_cursor(posts[-1].message_id) if posts and len(posts)==limit else None
+        logging.info("GET Posts Blog success")
+        response = Response(b'{"next_cursor":' + current_app.json.dumps(next_cursor).encode('utf-8') + b',"posts":['
+                            + b','.join(post.data for post in posts) + b']}', status=200, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    return response
+
+
+def stream_posts_blog(start_index:int, limit:int, cursor:str)->Response:
+    """
+    Stream the same json as get_posts_blog, writing each Post as it is read from the db,
+    so time to first byte and memory per request don't grow with limit.
+    The first Post is read before the response starts, so db errors still return an error status.
+    Input is validated by get_posts_blog
+    :param start_index: starting post index, ignored if cursor is given
+    :param limit: post limit for pagination
+    :param cursor: opaque cursor of the last post of the previous page
+    :return: streamed json response with a list of Post objects and the next_cursor
+    """
+    posts:Iterator[Post] = repository.SERVER_REPOSITORY.iter_posts_blog(start_index=start_index, posts_limit=limit, cursor=cursor)
+    first_post:Union[Post,None] = next(posts, None)
+
+    def generate_posts_json()->Iterator[str]:
+        yield '{"posts":['
+        post:Union[Post,None] = first_post
+        posts_count:int = 0
+        try:
+            while post is not None:
+                yield (',' if posts_count else '') + current_app.json.dumps(post)
+                posts_count += 1
+                last_post:Post = post
+                post = next(posts, None)
+        except BlogAppException as e:
+            # status was already sent, the client gets truncated json
+            logging.error(f"GET Posts Blog stream failed after {posts_count} posts: {e.message}")
+            raise
+        next_cursor:Union[str,None] = encode_cursor(last_post.message_id) if posts_count and posts_count==limit else None
+        yield '],"next_cursor":' + current_app.json.dumps(next_cursor) + '}'
+        logging.info("GET Posts Blog stream success")
+
+    return Response(stream_with_context(generate_posts_json()), status=200, mimetype='application/json')
 
 
 @messages_bp.route('create', methods=['POST'])
@@ -81,19 +148,64 @@ def create_message_blog():
     return jsonify(asdict(created_message)), 200
 
 
+@messages_bp.route('bulk-create', methods=['POST'])
+@valid_token_required
+def create_messages_bulk():
+    """
+    Creates a batch of messages owned by requesting user, each message is created or fails on its own.
+    Only 'post_user' role can create Posts
+    :return: json response with an item for each message in request order, with the created Post/Comment or the error
+    """
+    if request.content_length is None or request.content_length > input_validation.MESSAGES_BULK_CREATE_BODY_LIMIT:
+        raise PayloadTooLargeError(f"Bulk create body is limited to {input_validation.MESSAGES_BULK_CREATE_BODY_LIMIT} bytes")
+    payload = get_payload_from_request(request)
+    user_id_owner:str = payload['user_id']
+    items = request.get_json().get('messages', [])
+    if not isinstance(items, list) or len(items) > input_validation.MESSAGES_BULK_CREATE_LIMIT:
+        raise InputValidationError(f"messages must be a list of up to {input_validation.MESSAGES_BULK_CREATE_LIMIT} messages")
+
+    results:list[Union[Message,BlogAppException,None]] = [None] * len(items)
+    new_messages:list[NewMessage] = []
+    new_message_indexes:list[int] = []
+    for index, item in enumerate(items):
+        try:
+            message_item = input_validation.MessageBulkCreateItem(**item)
+            if message_item.reply_to_message_id=='' and 'post_user' not in payload['roles']:
+                raise UnauthorizedError("Creating a Post requires post_user role")
+        except BlogAppException as e:
+            results[index] = e
+            continue
+        except (ValidationError, TypeError) as e:
+            results[index] = InputValidationError(str(e))
+            continue
+        new_messages.append(NewMessage(content=message_item.content, user_id_owner=user_id_owner,
+                                       reply_to_message_id=message_item.reply_to_message_id))
+        new_message_indexes.append(index)
+    if new_messages:
+        for index, result in zip(new_message_indexes, repository.SERVER_REPOSITORY.create_messages_blog(new_messages)):
+            results[index] = result
+
+    response_items:list[dict] = [{"index": index, "error": type(result).__name__, "message": result.message}
+                                 if isinstance(result, BlogAppException) else {"index": index, "created": result}
+                                 for index, result in enumerate(results)]
+    logging.info(f"Bulk created messages by {user_id_owner}")
+    return jsonify({"results": response_items}), 200
+
+
 @messages_bp.route('edit',methods=['POST'])
-@message_user_id_owner_required
 @valid_token_required
 def edit_message_blog():
     """
     Edits a message that requesting user owns.
+    Ownership is checked by the repository as part of the edit
     :return: json response with edited Post/Comment
     """
+    user_id:str = get_payload_from_request(request)['user_id']
     message_id = request.get_json().get('message_id','')
     content = request.get_json().get('content','')
     try:
         input_validation.MessageEditRequest(message_id={"message_id":message_id}, content=content)
-        edited_message:Message = repository.SERVER_REPOSITORY.edit_message_blog(message_id, content)
+        edited_message:Message = repository.SERVER_REPOSITORY.edit_message_blog(message_id, content, owner=user_id)
     except ValidationError as e:
         raise InputValidationError from e
 
@@ -102,17 +214,18 @@ def edit_message_blog():
 
 
 @messages_bp.route('delete', methods=['DELETE'])
-@message_user_id_owner_required
 @valid_token_required
 def delete_message_blog():
     """
     Delete a message that requesting user owns.
+    Ownership is checked by the repository as part of the delete
     :return: json response with deleted Post/Comment or None if message doesn't exist
     """
+    user_id:str = get_payload_from_request(request)['user_id']
     message_id = request.get_json().get('message_id','')
     try:
         input_validation.MessageDeleteRequest(message_id={"message_id":message_id})
-        deleted_message:Union[Message|None] = repository.SERVER_REPOSITORY.delete_message_blog(message_id)
+        deleted_message:Union[Message|None] = repository.SERVER_REPOSITORY.delete_message_blog(message_id, owner=user_id)
     except ValidationError as e:
         raise InputValidationError from e
 
@@ -157,19 +270,166 @@ def remove_message_like():
     return make_response(f'User {user_id} Like Removed', 204)
 
 
+@messages_bp.route('batch-get', methods=['GET'])
+@valid_token_required
+def get_messages_batch():
+    """
+    Search for several message_ids at once
+    :return: json response with an item for each message_id in request order, with found and the Message if found
+    """
+    message_ids = request.get_json().get('message_ids',[])
+    try:
+        input_validation.MessagesBatchGetRequest(message_ids=[{"message_id":message_id} for message_id in message_ids])
+        messages:list[Union[Message,None]] = repository.SERVER_REPOSITORY.get_messages_blog(message_ids)
+    except (ValidationError, TypeError) as e:
+        raise InputValidationError(str(e)) from e
+    items:list[dict] = [{"message_id": message_id, "found": False} if message is None
+                        else {"message_id": message_id, "found": True, "message": message}
+                        for message_id, message in zip(message_ids, messages)]
+
+    return jsonify({"messages": items}), 200
+
+@messages_bp.route('comments', methods=['GET'])
+@valid_token_required
+def get_message_comments():
+    """
+    Get a page of the comments that replied to a message, oldest first
+    :return: json response with a list of Comment objects and the next_cursor
+    """
+    message_id = request.get_json().get('message_id','')
+    limit:int = int(request.get_json().get('limit', input_validation.COMMENTS_GET_LIMIT))
+    cursor:str = request.get_json().get('cursor','')
+    return comments_page_response(message_id, limit, cursor)
+
+
+def comments_page_response(message_id:str, limit:int, cursor:str)->Response:
+    """
+    Response of a page of comments, shared by the v0 and v1 routes
+    :param message_id: unique identifier for replied message
+    :param limit: comment limit for pagination
+    :param cursor: opaque cursor of the last comment of the previous page
+    :return: json response with a list of Comment objects and the next_cursor
+    :raises: InputValidationError for invalid page parameters
+    """
+    try:
+        input_validation.CommentsGetRequest(message_id={"message_id":message_id}, comments_limit=limit, cursor=cursor)
+        comments:list[Comment] = repository.SERVER_REPOSITORY.get_comments_blog(message_id, comments_limit=limit, cursor=cursor)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    next_cursor:Union[str,None] = encode_cursor(comments[-1].message_id) if comments and len(comments)==limit else None
+
+    return make_response(jsonify({"comments": comments, "next_cursor": next_cursor}), 200)
+
+@messages_bp.route('thread', methods=['GET'])
+@valid_token_required
+def get_message_thread():
+    """
+    Get a message with the nested tree of its replies
+    :return: json response with MessageThread, truncated marks messages with replies left out
+    """
+    message_id = request.get_json().get('message_id','')
+    max_depth:int = int(request.get_json().get('max_depth', input_validation.THREAD_MAX_DEPTH))
+    limit:int = int(request.get_json().get('limit', input_validation.THREAD_REPLIES_LIMIT))
+    return thread_response(message_id, max_depth, limit)
+
+
+def thread_response(message_id:str, max_depth:int, limit:int)->Response:
+    """
+    Response of a message thread, shared by the v0 and v1 routes
+    :param message_id: unique identifier for the thread's top message
+    :param max_depth: number of reply levels to return
+    :param limit: maximum replies returned for each message
+    :return: json response with MessageThread
+    :raises: InputValidationError for invalid thread parameters
+    """
+    try:
+        input_validation.ThreadGetRequest(message_id={"message_id":message_id}, max_depth=max_depth, replies_limit=limit)
+        thread:MessageThread = repository.SERVER_REPOSITORY.get_thread_blog(message_id, max_depth=max_depth, limit=limit)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+
+    return make_response(jsonify(asdict(thread)), 200)
+
+@messages_bp.route('likes', methods=['GET'])
+@valid_token_required
+def get_message_likes():
+    """
+    Get a page of the likes of a message, newest first
+    :return: json response with a list of Like objects and the next_cursor
+    """
+    message_id = request.get_json().get('message_id','')
+    limit:int = int(request.get_json().get('limit', input_validation.LIKES_GET_LIMIT))
+    cursor:str = request.get_json().get('cursor','')
+    return likes_page_response(message_id, limit, cursor)
+
+
+def likes_page_response(message_id:str, limit:int, cursor:str)->Response:
+    """
+    Response of a page of likes, shared by the v0 and v1 routes
+    :param message_id: unique identifier for message
+    :param limit: like limit for pagination
+    :param cursor: opaque cursor of the last like of the previous page
+    :return: json response with a list of Like objects and the next_cursor
+    :raises: InputValidationError for invalid page parameters
+    """
+    try:
+        input_validation.LikesGetRequest(message_id={"message_id":message_id}, likes_limit=limit, cursor=cursor)
+        likes:list[Like] = repository.SERVER_REPOSITORY.get_message_likes_blog(message_id, likes_limit=limit, cursor=cursor)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+    next_cursor:Union[str,None] = encode_cursor(likes[-1].like_id) if likes and len(likes)==limit else None
+
+    return make_response(jsonify({"likes": likes, "next_cursor": next_cursor}), 200)
+
+@messages_bp.route('like/status', methods=['GET'])
+@valid_token_required
+def get_message_like_status():
+    """
+    Check if requesting user likes message
+    :return: json response with liked True or False
+    """
+    payload = get_payload_from_request(request)
+    user_id:str = payload['user_id']
+    message_id = request.get_json().get('message_id','')
+    try:
+        input_validation.MessageLikeRequest(message_id={"message_id":message_id}, user_id=user_id)
+        liked:bool = repository.SERVER_REPOSITORY.is_message_liked(message_id, user_id)
+    except ValidationError as e:
+        raise InputValidationError(str(e)) from e
+
+    return jsonify({"message_id": message_id, "liked": liked}), 200
+
+
 @messages_bp.route('get', methods=['GET'])
 @valid_token_required
 def get_message_like():
     """
-    Search for message_id and return Message object if found
+    Search for message_id and return Message object if found.
+    A request with If-None-Match reads only the message version, and gets 304 if it matches the message ETag
     :return: Message object
     """
     message_id = request.get_json().get('message_id','')
+    return message_response(message_id)
+
+
+def message_response(message_id:str)->Response:
+    """
+    Response of a single message, shared by the v0 and v1 routes
+    :param message_id: unique identifier for message
+    :return: json response with the Message, or 304
+    :raises: InputValidationError for invalid message_id
+    """
     try:
         input_validation.MessageId(message_id=message_id)
-        message:Message = repository.SERVER_REPOSITORY.get_message_blog(message_id)
     except ValidationError as e:
         raise InputValidationError(str(e)) from e
+    if request.if_none_match:
+        etag:str = message_etag(message_id, repository.SERVER_REPOSITORY.get_message_version_blog(message_id))
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+    encoded_message:EncodedMessage = repository.SERVER_REPOSITORY.get_message_json_blog(message_id)
 
-    return jsonify(asdict(message)), 200
+    response = Response(encoded_message.data, status=200, mimetype='application/json')
+    response.set_etag(message_etag(encoded_message.message_id, encoded_message.version))
+    return response
 
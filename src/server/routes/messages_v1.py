@@ -0,0 +1,137 @@
+from flask import Blueprint, request, Response
+from functools import wraps
+import src.server.routes.input_validation as input_validation
+from src.server.flask.exceptions import InputValidationError, BlogAppException
+from src.server.routes.messages import (handle_blog_app_exception, posts_page_response, message_response,
+                                        comments_page_response, thread_response, likes_page_response)
+from src.server.routes.token import valid_token_required
+import logging
+import os
+logging.basicConfig(level=logging.INFO)
+
+# how long shared caches may serve a response before revalidating it with its ETag
+FEED_CACHE_MAX_AGE_SECONDS:int = int(os.environ.get('FEED_CACHE_MAX_AGE_SECONDS', 5))
+MESSAGE_CACHE_MAX_AGE_SECONDS:int = int(os.environ.get('MESSAGE_CACHE_MAX_AGE_SECONDS', 30))
+
+
+messages_v1_bp = Blueprint('messages_v1',__name__)
+
+
+@messages_v1_bp.errorhandler(BlogAppException)
+def handle_v1_exception(exception:BlogAppException):
+    """
+    Returns any error raised as a failed JSON response, same as v0 routes
+    :param exception: BlogAppException that lead to request failure
+    :return: json with error code and message
+    """
+    return handle_blog_app_exception(exception)
+
+
+@messages_v1_bp.after_request
+def add_vary_authorization(response:Response)->Response:
+    """
+    Responses depend on the request token, so caches must keep them apart per Authorization header.
+    Responses that weren't marked cacheable, like errors, are never stored
+    :param response: response of the request
+    :return: response with Vary and Cache-Control headers
+    """
+    response.vary.add('Authorization')
+    if response.status_code not in (200, 304) or response.cache_control.max_age is None:
+        response.cache_control.no_store = True
+    return response
+
+
+def cacheable(max_age:int):
+    """
+    Decorator marking a GET route response as cacheable by shared caches for max_age seconds
+    :param max_age: seconds the response may be served from cache
+    :return: decorator for function of api request
+    """
+    def decorator(api_request):
+        @wraps(api_request)
+        def set_cache_control(*args, **kwargs):
+            response:Response = api_request(*args, **kwargs)
+            response.cache_control.public = True
+            response.cache_control.max_age = max_age
+            return response
+        return set_cache_control
+    return decorator
+
+
+def int_query_arg(name:str, default:int)->int:
+    """
+    Read an integer query string argument
+    :param name: argument name
+    :param default: value if argument is missing
+    :return: argument value
+    :raises: InputValidationError if argument isn't an integer
+    """
+    try:
+        return int(request.args.get(name, default))
+    except ValueError as e:
+        raise InputValidationError(f"{name} must be an integer") from e
+
+
+@messages_v1_bp.route('posts', methods=['GET'])
+@valid_token_required
+@cacheable(FEED_CACHE_MAX_AGE_SECONDS)
+def get_posts():
+    """
+    Get a page of Posts, newest first: GET /api/v1/posts?cursor=&limit=
+    :return: json response with a list of Post objects and the next_cursor
+    """
+    return posts_page_response(start_index=int_query_arg('start_index', 0),
+                               limit=int_query_arg('limit', input_validation.POSTS_GET_LIMIT),
+                               cursor=request.args.get('cursor', ''),
+                               stream=request.args.get('stream', 'false').lower()=='true')
+
+
+@messages_v1_bp.route('messages/<message_id>', methods=['GET'])
+@valid_token_required
+@cacheable(MESSAGE_CACHE_MAX_AGE_SECONDS)
+def get_message(message_id:str):
+    """
+    Get a message: GET /api/v1/messages/<message_id>
+    :param message_id: unique identifier for message
+    :return: json response with the Message
+    """
+    return message_response(message_id)
+
+
+@messages_v1_bp.route('messages/<message_id>/comments', methods=['GET'])
+@valid_token_required
+@cacheable(MESSAGE_CACHE_MAX_AGE_SECONDS)
+def get_message_comments(message_id:str):
+    """
+    Get a page of the comments of a message, oldest first: GET /api/v1/messages/<message_id>/comments?cursor=&limit=
+    :param message_id: unique identifier for replied message
+    :return: json response with a list of Comment objects and the next_cursor
+    """
+    return comments_page_response(message_id, limit=int_query_arg('limit', input_validation.COMMENTS_GET_LIMIT),
+                                  cursor=request.args.get('cursor', ''))
+
+
+@messages_v1_bp.route('messages/<message_id>/thread', methods=['GET'])
+@valid_token_required
+@cacheable(MESSAGE_CACHE_MAX_AGE_SECONDS)
+def get_message_thread(message_id:str):
+    """
+    Get a message with the nested tree of its replies: GET /api/v1/messages/<message_id>/thread?max_depth=&limit=
+    :param message_id: unique identifier for the thread's top message
+    :return: json response with MessageThread
+    """
+    return thread_response(message_id, max_depth=int_query_arg('max_depth', input_validation.THREAD_MAX_DEPTH),
+                           limit=int_query_arg('limit', input_validation.THREAD_REPLIES_LIMIT))
+
+
+@messages_v1_bp.route('messages/<message_id>/likes', methods=['GET'])
+@valid_token_required
+@cacheable(MESSAGE_CACHE_MAX_AGE_SECONDS)
+def get_message_likes(message_id:str):
+    """
+    Get a page of the likes of a message, newest first: GET /api/v1/messages/<message_id>/likes?cursor=&limit=
+    :param message_id: unique identifier for message
+    :return: json response with a list of Like objects and the next_cursor
+    """
+    return likes_page_response(message_id, limit=int_query_arg('limit', input_validation.LIKES_GET_LIMIT),
+                               cursor=request.args.get('cursor', ''))
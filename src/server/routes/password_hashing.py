@@ -0,0 +1,150 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from src.server.flask.exceptions import ServiceUnavailableError
+from typing import Callable, Dict, TypeVar
+import bcrypt
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+
+BCRYPT_ROUNDS:int = int(os.environ.get('BCRYPT_ROUNDS', 12))
+# request threads of a gunicorn worker, see gunicorn.conf.py, each of them waits on at most one hashing task
+GUNICORN_THREADS:int = int(os.environ.get('GUNICORN_THREADS', 8))
+# hashing tasks running or waiting are bounded to half the request threads, the others keep serving other routes
+PASSWORD_HASH_SLOTS:int = max(GUNICORN_THREADS // 2, 1)
+PASSWORD_HASH_WORKERS:int = int(os.environ.get('PASSWORD_HASH_WORKERS', min(os.cpu_count() or 1, PASSWORD_HASH_SLOTS)))
+# number of hashing tasks that may wait for a free worker before requests are rejected with 503
+PASSWORD_HASH_QUEUE_LIMIT:int = int(os.environ.get('PASSWORD_HASH_QUEUE_LIMIT',
+                                                   max(PASSWORD_HASH_SLOTS - PASSWORD_HASH_WORKERS, 0)))
+
+_password_hash_executor:ThreadPoolExecutor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                                                 thread_name_prefix='password_hash')
+_password_hash_slots:BoundedSemaphore = BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT)
+_rejected_tasks:int = 0
+_rejected_tasks_lock:Lock = Lock()
+
+
+def _reset_password_hash_executor()->None:
+    """
+    Executor threads don't survive fork, a forked worker process starts its own executor
+    :return: None
+    """
+    global _password_hash_executor, _password_hash_slots, _rejected_tasks_lock
+    _password_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password_hash')
+    _password_hash_slots = BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_LIMIT)
+    _rejected_tasks_lock = Lock()
+
+
+os.register_at_fork(after_in_child=_reset_password_hash_executor)
+
+T = TypeVar('T')
+
+
+def _submit_to_password_hash_executor(task:Callable[..., T], *args)->Future:
+    """
+    Submit bcrypt task to the bounded password hashing executor
+    :param task: function to run
+    :param args: task arguments
+    :return: future of the task result
+    :raises: ServiceUnavailableError if the executor queue is full
+    """
+    global _rejected_tasks
+    if not _password_hash_slots.acquire(blocking=False):
+        with _rejected_tasks_lock:
+            _rejected_tasks += 1
+        raise ServiceUnavailableError("Password hashing queue is full, retry later")
+    try:
+        future:Future = _password_hash_executor.submit(task, *args)
+    except Exception:
+        _password_hash_slots.release()
+        raise
+    future.add_done_callback(lambda _: _password_hash_slots.release())
+    return future
+
+
+def _run_on_password_hash_executor(task:Callable[..., T], *args)->T:
+    """
+    Run bcrypt task on the bounded password hashing executor and wait for its result
+    :param task: function to run
+    :param args: task arguments
+    :return: task result
+    :raises: ServiceUnavailableError if the executor queue is full
+    """
+    return _submit_to_password_hash_executor(task, *args).result()
+
+
+def _hash_password(password:str)->str:
+    salt = bcrypt.gensalt(rounds=BCRYPT_ROUNDS)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+
+def _check_password(stored_hash:str, password:str)->bool:
+    return bcrypt.checkpw(password.encode('utf-8'), stored_hash.encode('utf-8'))
+
+
+def hash_password(password:str)->str:
+    """
+    hash password with BCRYPT_ROUNDS cost on the password hashing executor
+    :param password: unhashed password
+    :return: hashed password
+    :raises: ServiceUnavailableError if the executor queue is full
+    """
+    return _run_on_password_hash_executor(_hash_password, password)
+
+
+def check_password(stored_hash:str, password:str)->bool:
+    """
+    compare between stored_hash password and unhashed password on the password hashing executor
+    :param stored_hash: database stored hashed password
+    :param password: unhashed password
+    :return: True if passwords are the same and False otherwise
+    :raises: ServiceUnavailableError if the executor queue is full
+    """
+    return _run_on_password_hash_executor(_check_password, stored_hash, password)
+
+
+async def async_hash_password(password:str)->str:
+    """
+    hash_password for coroutines, the event loop keeps serving other requests while bcrypt runs
+    :param password: unhashed password
+    :return: hashed password
+    :raises: ServiceUnavailableError if the executor queue is full
+    """
+    return await asyncio.wrap_future(_submit_to_password_hash_executor(_hash_password, password))
+
+
+async def async_check_password(stored_hash:str, password:str)->bool:
+    """
+    check_password for coroutines, the event loop keeps serving other requests while bcrypt runs
+    :param stored_hash: database stored hashed password
+    :param password: unhashed password
+    :return: True if passwords are the same and False otherwise
+    :raises: ServiceUnavailableError if the executor queue is full
+    """
+    return await asyncio.wrap_future(_submit_to_password_hash_executor(_check_password, stored_hash, password))
+
+
+def password_needs_rehash(stored_hash:str)->bool:
+    """
+    Check if stored_hash was created with a bcrypt cost different from BCRYPT_ROUNDS
+    :param stored_hash: database stored hashed password, in $2b$<cost>$<salt+hash> format
+    :return: True if password should be hashed again with the configured cost
+    """
+    try:
+        return int(stored_hash.split('$')[2])!=BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+
+def password_hashing_stats()->Dict[str, int]:
+    """
+    Counters of the password hashing executor
+    :return: dict of counter name to value
+    """
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "queue_limit": PASSWORD_HASH_QUEUE_LIMIT,
+        "rejected": _rejected_tasks,
+    }
@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple, Union
+from src.db.delegating_repository import DelegatingRepository
+from src.db.odm_blog import User
+from src.db.repository import Repository
+import logging
+import os
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+# verify: check token roles against cached db roles
+# trust_claims: trust roles of tokens issued less than PRINCIPAL_REVALIDATE_SECONDS ago, then verify
+# off: check token roles against db on every request
+PRINCIPAL_CACHE_MODE:str = os.environ.get('PRINCIPAL_CACHE_MODE', 'verify')
+PRINCIPAL_CACHE_TTL_SECONDS:float = float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', 60))
+PRINCIPAL_CACHE_MAX_SIZE:int = int(os.environ.get('PRINCIPAL_CACHE_MAX_SIZE', 10000))
+PRINCIPAL_REVALIDATE_SECONDS:float = float(os.environ.get('PRINCIPAL_REVALIDATE_SECONDS', 30))
+
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of verified user roles keyed by user_id, entries expire after ttl_seconds.
+    Every invalidation advances a generation, roles read from the db before an invalidation aren't cached,
+    so a read racing with a role change can't put back the roles as they were before it
+    """
+    def __init__(self, max_size:int = PRINCIPAL_CACHE_MAX_SIZE, ttl_seconds:float = PRINCIPAL_CACHE_TTL_SECONDS):
+        self._max_size:int = max_size
+        self._ttl_seconds:float = ttl_seconds
+        self._entries:OrderedDict[str, Tuple[List[str], float]] = OrderedDict()
+        self._lock:Lock = Lock()
+        self.hits:int = 0
+        self.misses:int = 0
+        self.trusted:int = 0
+        self._generation:int = 0
+        self.evictions:int = 0
+        self.invalidations:int = 0
+        self.stale_puts:int = 0
+
+    @property
+    def generation(self)->int:
+        """
+        Number of invalidations so far, taken before a db read and passed to put
+        """
+        return self._generation
+
+    def get(self, user_id:str)->Optional[List[str]]:
+        """
+        Get cached roles of user_id
+        :param user_id: unique identifier for user
+        :return: list of roles or None if user_id isn't cached or entry expired
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_id:str, roles:List[str], generation:int)->None:
+        """
+        Cache roles verified against the database for user_id, unless an invalidation happened since the read started
+        :param user_id: unique identifier for user
+        :param roles: roles of user in database
+        :param generation: generation taken before the db read
+        :return: None
+        """
+        if self._max_size <= 0:
+            return
+        with self._lock:
+            if generation!=self._generation:
+                self.stale_puts += 1
+                return
+            self._entries[user_id] = (list(roles), time.monotonic() + self._ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_trusted(self)->None:
+        """
+        Count a request that was authorized from signed token claims without a cache or db lookup
+        :return: None
+        """
+        with self._lock:
+            self.trusted += 1
+
+    def invalidate(self, user_id:str)->None:
+        """
+        Remove user_id from cache, no error if user_id isn't cached
+        :param user_id: unique identifier for user
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self)->None:
+        """
+        Remove all entries from cache
+        :return: None
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self)->Dict[str, int]:
+        """
+        Cache counters, used to follow how many db lookups are saved
+        :return: dict of counter name to value
+        """
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "trusted": self.trusted,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_puts": self.stale_puts,
+            }
+
+
+PRINCIPAL_CACHE:PrincipalCache = PrincipalCache()
+
+
+class PrincipalCacheRepository(DelegatingRepository):
+    """
+    Invalidates the cached roles of a user on every write of the user, wrapped around the server repository
+    so the db layer doesn't know about the principal cache.
+    The entry is invalidated even if the write fails, its outcome may be unknown
+    """
+    def __init__(self, repository:Repository, principal_cache:PrincipalCache = PRINCIPAL_CACHE):
+        super().__init__(repository)
+        self._principal_cache:PrincipalCache = principal_cache
+
+    def update_user_details_blog(self, user_id:str, password:str = '', email:str = '', name:str = '')->User:
+        try:
+            return self._repository.update_user_details_blog(user_id, password=password, email=email, name=name)
+        finally:
+            self._principal_cache.invalidate(user_id)
+
+    def delete_user_blog(self, user_id:str)->Union[User,None]:
+        try:
+            return self._repository.delete_user_blog(user_id)
+        finally:
+            self._principal_cache.invalidate(user_id)
+
+    def add_user_role(self, user_id:str, role:str)->bool:
+        try:
+            return self._repository.add_user_role(user_id, role)
+        finally:
+            self._principal_cache.invalidate(user_id)
+
+    def remove_user_role(self, user_id:str, role:str)->bool:
+        try:
+            return self._repository.remove_user_role(user_id, role)
+        finally:
+            self._principal_cache.invalidate(user_id)
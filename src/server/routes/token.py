@@ -2,13 +2,15 @@ import jwt
 from datetime import timedelta, timezone
 from src.server.flask.exceptions import AuthenticationError, UnauthorizedError, BlogAppException, ResourceNotFoundError
 import src.db.repository as repository
-from src.db.odm_blog import User, Message
+from src.server.routes.principal_cache import PRINCIPAL_CACHE, PRINCIPAL_CACHE_MODE, PRINCIPAL_REVALIDATE_SECONDS
+from src.db.odm_blog import User
 from datetime import datetime
-from flask import request, Flask
+from flask import request, Flask, g
 from functools import wraps
 import logging
 import os
-from typing import List
+import time
+from typing import List, Optional
 
 logging.basicConfig(level=logging.INFO)
 
@@ -26,6 +28,7 @@ def generate_jwt(user_id:str, password:str, roles: List[str])->str:
         'user_id': user_id,
         'password': password,
         'roles': roles,
+        'iat': datetime.now(timezone.utc),
         'exp': datetime.now(timezone.utc) + timedelta(seconds=os.environ.get('JWT_EXPIRATION_TIME',3600))
     }
     token:str = jwt.encode(payload=payload, key=os.environ.get('JWT_SECRET_KEY'), algorithm=jwt_algorithm)
@@ -49,7 +52,9 @@ def decode_jwt(token: str):
 
 def get_payload_from_request(request):
     """
-    Get jwt token from http request and decode payload
+    Get jwt token from http request and decode payload.
+    The decoded payload is kept on flask.g as the request principal,
+    so decorators and route bodies of the same request share a single decode
     :param request: http request
     :return: payload
     :raises AuthenticationError if jwt is not valid
@@ -59,7 +64,39 @@ def get_payload_from_request(request):
         token = request.headers['Authorization'].split(" ")[1]
     if not token:
         raise AuthenticationError("Token is missing")
-    return decode_jwt(token)
+    if g.get('jwt_token')!=token:
+        g.principal = decode_jwt(token)
+        g.jwt_token = token
+    return g.principal
+
+
+def get_verified_user_roles(user_id:str)->List[str]:
+    """
+    Get roles of user_id from the principal cache, or from db on cache miss
+    :param user_id: unique identifier for user
+    :return: roles of user in database
+    :raises: ResourceNotFoundError if user_id doesn't exist in database
+    """
+    if PRINCIPAL_CACHE_MODE!='off':
+        roles:Optional[List[str]] = PRINCIPAL_CACHE.get(user_id)
+        if roles is not None:
+            return roles
+    # taken before the read, roles changed while it runs aren't cached
+    generation:int = PRINCIPAL_CACHE.generation
+    user_odm:User = repository.SERVER_REPOSITORY.get_user_blog(user_id=user_id)
+    if PRINCIPAL_CACHE_MODE!='off':
+        PRINCIPAL_CACHE.put(user_id, user_odm.roles, generation)
+    return user_odm.roles
+
+
+def is_recently_issued(payload:dict)->bool:
+    """
+    Check if token was issued less than PRINCIPAL_REVALIDATE_SECONDS ago
+    :param payload: decoded jwt payload
+    :return: True if the signed claims can be trusted without verification
+    """
+    issued_at = payload.get('iat')
+    return issued_at is not None and time.time() - issued_at < PRINCIPAL_REVALIDATE_SECONDS
 
 
 def valid_token_required(api_request):
@@ -67,6 +104,8 @@ def valid_token_required(api_request):
     Decorator to verify JWT token is valid:
      - valid and not expired
      - contains legal role permissions for user_id
+    Roles are checked against the principal cache based on PRINCIPAL_CACHE_MODE,
+    a token verified once is not verified again during the same request (e.g. batch sub operations)
 
     :param api_request: api function request to be performed
     :return: api_request function
@@ -77,15 +116,21 @@ def valid_token_required(api_request):
     def verify_token(*args, **kwargs):
         try:
             payload = get_payload_from_request(request)
-            user_odm:User = repository.SERVER_REPOSITORY.get_user_blog(user_id=payload['user_id'])
-            if payload['roles']!=[] and not set(payload['roles']).issubset(set(user_odm.roles)):
-                raise AuthenticationError("Invalid User Roles")
+            if g.get('verified_token')==g.jwt_token:
+                pass
+            elif PRINCIPAL_CACHE_MODE=='trust_claims' and is_recently_issued(payload):
+                PRINCIPAL_CACHE.record_trusted()
+            else:
+                user_roles:List[str] = get_verified_user_roles(payload['user_id'])
+                if payload['roles']!=[] and not set(payload['roles']).issubset(set(user_roles)):
+                    raise AuthenticationError("Invalid User Roles")
         except BlogAppException as e:
             raise e
         except Exception as e:
             raise AuthenticationError("Bad Token") from e
 
-        logging.info(f"Token verification success for {user_odm.user_id}")
+        g.verified_token = g.jwt_token
+        logging.info(f"Token verification success for {payload['user_id']}")
         return api_request(*args, **kwargs)
     return verify_token
 
@@ -107,24 +152,3 @@ def role_required(required_role:str):
             return api_request(*args, **kwargs)
         return check_required_role
     return decorator
-
-
-def message_user_id_owner_required(api_request):
-    """
-    Decorator to verify user_id_owner of the message_id input matches user_id from jwt
-    :param api_request: function of api request
-    :return: api_request
-    :raise: UnathorizedError if user_id is not message owner
-    """
-    @wraps(api_request)
-    def verify_message_owner(*args, **kwargs):
-        payload = get_payload_from_request(request)
-        user_id: str = payload['user_id']
-        message_id:str = request.get_json().get('message_id','')
-        message:Message = repository.SERVER_REPOSITORY.get_message_blog(message_id=message_id)
-        if message.user_id_owner!=user_id:
-            raise UnauthorizedError(f"User ID {user_id} is not owner of message_id {message_id}")
-
-        logging.info(f"User {user_id} is verified as message owner of {message_id}")
-        return api_request(*args, **kwargs)
-    return verify_message_owner
@@ -0,0 +1,77 @@
+"""
+Test helper checking the query plans of MongoDB commands: records the commands a MongoClient sends,
+then explains each of them and reports those whose winning plan scans a whole collection.
+"""
+from typing import Dict, Iterator, List, Mapping, Tuple
+from pymongo import MongoClient, monitoring
+
+# commands with a query plan, with the field holding their statements for write commands
+EXPLAINED_COMMANDS:Dict[str, str] = {"find": "", "findAndModify": "", "count": "", "distinct": "", "aggregate": "",
+                                     "update": "updates", "delete": "deletes"}
+# fields set by the driver on every command, not accepted inside explain
+DRIVER_FIELDS = {"lsid", "txnNumber", "$clusterTime", "$db", "$readPreference", "writeConcern", "readConcern",
+                 "ordered"}
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """
+    Records commands with a query plan sent while recording, as (database, command)
+    """
+    def __init__(self):
+        self.recording = False
+        self.commands:List[Tuple[str, dict]] = []
+
+    def started(self, event):
+        if self.recording and event.command_name in EXPLAINED_COMMANDS:
+            self.commands.append((event.database_name, dict(event.command)))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def explainable_commands(command:Mapping[str, any])->Iterator[dict]:
+    """
+    Split a command in commands explain accepts: a single statement per update or delete, no driver fields
+    """
+    command = {name: value for name, value in command.items() if name not in DRIVER_FIELDS}
+    statements_field:str = EXPLAINED_COMMANDS[next(iter(command))]
+    if statements_field=='':
+        yield command
+        return
+    for statement in command[statements_field]:
+        yield {**command, statements_field: [statement]}
+
+
+def plan_stages(plan:any)->Iterator[str]:
+    """
+    Stages of the winning plans in an explain result, aggregate pipelines nest them in their stages
+    """
+    if isinstance(plan, Mapping):
+        if "stage" in plan:
+            yield plan["stage"]
+        for name, value in plan.items():
+            if name!="rejectedPlans":
+                yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from plan_stages(value)
+
+
+def collection_scans(client:MongoClient, commands:List[Tuple[str, dict]])->List[dict]:
+    """
+    Explain commands and return those whose winning plan has a COLLSCAN stage
+    :param client: MongoClient to explain commands with, without a QueryRecorder recording
+    :param commands: (database, command) of QueryRecorder
+    :return: commands scanning a whole collection
+    """
+    scans:List[dict] = []
+    for database, command in commands:
+        for explainable_command in explainable_commands(command):
+            explain:Mapping[str, any] = client[database].command({"explain": explainable_command,
+                                                                  "verbosity": "queryPlanner"})
+            if "COLLSCAN" in plan_stages(explain):
+                scans.append(explainable_command)
+    return scans
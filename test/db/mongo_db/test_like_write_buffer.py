@@ -0,0 +1,75 @@
+"""
+Retry tests of LikeWriteBuffer flushes against collection doubles, no MongoDB needed:
+    python -m pytest test/db/mongo_db/test_like_write_buffer.py
+"""
+from unittest import mock
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from src.db.mongo_db.like_write_buffer import LikeWriteBuffer
+
+POST_ID, OTHER_POST_ID = ObjectId("6750000000000000000000aa"), ObjectId("6750000000000000000000bb")
+
+
+def create_like_write_buffer(existing_message_ids):
+    messages_collection, likes_collection = mock.Mock(), mock.Mock()
+    messages_collection.find.side_effect = lambda query, projection: [
+        {"_id": message_id} for message_id in query["_id"]["$in"] if message_id in existing_message_ids]
+    likes_collection.delete_many.return_value.deleted_count = 1
+    likes_collection.bulk_write.return_value.upserted_ids = {0: ObjectId()}
+    # flushed by the tests only
+    like_write_buffer = LikeWriteBuffer(messages_collection, likes_collection, flush_interval_ms=3600000)
+    return like_write_buffer, messages_collection, likes_collection
+
+
+def applied_like_counts(messages_collection):
+    return [{update._filter["_id"]: update._doc["$inc"]["like_count"] for update in call.args[0]}
+            for call in messages_collection.bulk_write.call_args_list]
+
+
+def test_failed_upsert_is_retried_without_repeating_deletes():
+    like_write_buffer, messages_collection, likes_collection = create_like_write_buffer({POST_ID, OTHER_POST_ID})
+    like_write_buffer.add(POST_ID, "remover", False)
+    like_write_buffer.add(POST_ID, "duplicate", True)
+    like_write_buffer.add(OTHER_POST_ID, "liker", True)
+    likes_collection.bulk_write.side_effect = BulkWriteError({"writeErrors": [
+        {"index": 0, "code": 11000, "errmsg": "duplicate key"},
+        {"index": 1, "code": 91, "errmsg": "shutdown in progress"}], "upserted": []})
+    like_write_buffer.flush()
+    assert applied_like_counts(messages_collection)==[{POST_ID: -1}]
+    assert like_write_buffer.pending_like(OTHER_POST_ID, "liker") is True
+    assert like_write_buffer.pending_like(POST_ID, "remover") is None
+    likes_collection.bulk_write.side_effect = None
+    like_write_buffer.flush()
+    assert likes_collection.delete_many.call_count==1
+    assert applied_like_counts(messages_collection)[1]=={OTHER_POST_ID: 1}
+
+
+def test_only_failed_like_counts_are_retried():
+    like_write_buffer, messages_collection, likes_collection = create_like_write_buffer({POST_ID, OTHER_POST_ID})
+    like_write_buffer.add(POST_ID, "remover", False)
+    like_write_buffer.add(OTHER_POST_ID, "remover", False)
+    messages_collection.bulk_write.side_effect = [
+        BulkWriteError({"writeErrors": [{"index": 1, "code": 91, "errmsg": "shutdown in progress"}]}), None]
+    like_write_buffer.flush()
+    like_write_buffer.flush()
+    assert applied_like_counts(messages_collection)==[{POST_ID: -1, OTHER_POST_ID: -1}, {OTHER_POST_ID: -1}]
+
+
+def test_likes_of_message_deleted_during_flush_are_deleted():
+    existing_message_ids = {POST_ID}
+    like_write_buffer, _, likes_collection = create_like_write_buffer(existing_message_ids)
+    like_write_buffer.add(POST_ID, "liker", True)
+    def upsert_racing_with_delete(upserts, ordered):
+        existing_message_ids.clear()
+        return mock.Mock(upserted_ids={0: ObjectId()})
+    likes_collection.bulk_write.side_effect = upsert_racing_with_delete
+    like_write_buffer.flush()
+    likes_collection.delete_many.assert_called_once_with({"message_id": {"$in": [POST_ID]}})
+
+
+def test_likes_of_deleted_message_are_skipped():
+    like_write_buffer, messages_collection, likes_collection = create_like_write_buffer(set())
+    like_write_buffer.add(POST_ID, "liker", True)
+    like_write_buffer.flush()
+    likes_collection.bulk_write.assert_not_called()
+    messages_collection.bulk_write.assert_not_called()
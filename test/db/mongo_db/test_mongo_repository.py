@@ -0,0 +1,90 @@
+"""
+Round trip tests of MongoDBRepository write methods, counting commands with a pymongo command listener.
+Needs the MongoDB of docker compose and its environment variables (see .env), skipped otherwise:
+    MONGO_HOST=127.0.0.1 MONGO_PORT=27017 SERVER_API_USER=root SERVER_API_PASSWORD=password python -m pytest test/db
+"""
+import os
+import uuid
+import pytest
+from pymongo import MongoClient, monitoring
+from src.db.mongo_db.mongo_repository import MongoDBRepository
+from src.server.flask.exceptions import ResourceNotFoundError, UnauthorizedError
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        # commands of the background index creation aren't sent by the counted calls
+        if event.command_name not in ("createIndexes", "listIndexes"):
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def count(self, function, *args, **kwargs):
+        self.commands.clear()
+        result = function(*args, **kwargs)
+        return result, list(self.commands)
+
+
+COMMAND_COUNTER = CommandCounter()
+# registered before the repository MongoClient is created so it observes its commands
+monitoring.register(COMMAND_COUNTER)
+
+
+@pytest.fixture(scope="module")
+def mongo_repository():
+    connection_string = (f"mongodb://{os.getenv('SERVER_API_USER')}:{os.getenv('SERVER_API_PASSWORD')}"
+                         f"@{os.getenv('MONGO_HOST')}:{os.getenv('MONGO_PORT')}/")
+    try:
+        MongoClient(connection_string, serverSelectionTimeoutMS=1000).server_info()
+    except Exception:
+        pytest.skip("MongoDB is not reachable")
+    return MongoDBRepository()
+
+
+def test_create_message_single_round_trip(mongo_repository):
+    post, commands = COMMAND_COUNTER.count(mongo_repository.create_message_blog, "post", "owner", "")
+    # the insert is the only round trip on messages, creating a post also bumps the feed version
+    assert commands == ["insert", "update"]
+    assert post.content == "post"
+    mongo_repository.delete_message_blog(post.message_id)
+
+
+def test_edit_message_single_round_trip(mongo_repository):
+    post = mongo_repository.create_message_blog("post", "owner", "")
+    edited_post, commands = COMMAND_COUNTER.count(mongo_repository.edit_message_blog, post.message_id, "edited")
+    assert commands == ["findAndModify"]
+    assert edited_post.content == "edited"
+    mongo_repository.delete_message_blog(post.message_id)
+
+
+def test_user_writes_single_round_trip(mongo_repository):
+    user_id = f"test_user_{uuid.uuid4().hex}"
+    user, commands = COMMAND_COUNTER.count(mongo_repository.create_user_blog, user_id, "hash", "", "", [])
+    assert commands == ["insert"]
+    assert user.user_id == user_id
+    updated_user, commands = COMMAND_COUNTER.count(mongo_repository.update_user_details_blog, user_id, name="name")
+    assert commands == ["findAndModify"]
+    assert updated_user.name == "name"
+    mongo_repository.delete_user_blog(user_id)
+
+
+def test_owner_checked_edit_single_round_trip(mongo_repository):
+    post = mongo_repository.create_message_blog("post", "owner", "")
+    edited_post, commands = COMMAND_COUNTER.count(mongo_repository.edit_message_blog, post.message_id, "edited",
+                                                  owner="owner")
+    assert commands == ["findAndModify"]
+    assert edited_post.content == "edited"
+    with pytest.raises(UnauthorizedError):
+        mongo_repository.edit_message_blog(post.message_id, "edited", owner="other")
+    with pytest.raises(UnauthorizedError):
+        mongo_repository.delete_message_blog(post.message_id, owner="other")
+    assert mongo_repository.delete_message_blog(post.message_id, owner="owner").message_id == post.message_id
+    with pytest.raises(ResourceNotFoundError):
+        mongo_repository.edit_message_blog(post.message_id, "edited", owner="owner")
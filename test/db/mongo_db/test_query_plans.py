@@ -0,0 +1,95 @@
+"""
+Query plan tests of MongoDBRepository: every query run by the repository methods is explained,
+and must be served by an index of indexes.COLLECTION_INDEXES instead of a collection scan.
+Needs the MongoDB of docker compose and its environment variables (see .env), skipped otherwise:
+    MONGO_HOST=127.0.0.1 MONGO_PORT=27017 SERVER_API_USER=root SERVER_API_PASSWORD=password python -m pytest test/db
+"""
+import os
+import uuid
+import pytest
+from pymongo import MongoClient, monitoring
+from src.db.mongo_db.indexes import index_drift
+from src.db.mongo_db.mongo_repository import MongoDBRepository
+from src.db.odm_blog import NewMessage
+from src.db.pagination import encode_cursor
+from query_plans import QueryRecorder, collection_scans
+
+QUERY_RECORDER = QueryRecorder()
+# registered before the repository MongoClient is created so it observes its commands
+monitoring.register(QUERY_RECORDER)
+
+
+@pytest.fixture(scope="module")
+def mongo_client():
+    connection_string = (f"mongodb://{os.getenv('SERVER_API_USER')}:{os.getenv('SERVER_API_PASSWORD')}"
+                         f"@{os.getenv('MONGO_HOST')}:{os.getenv('MONGO_PORT')}/")
+    try:
+        client = MongoClient(connection_string, serverSelectionTimeoutMS=1000)
+        client.server_info()
+    except Exception:
+        pytest.skip("MongoDB is not reachable")
+    return client
+
+
+@pytest.fixture(scope="module")
+def mongo_repository(mongo_client):
+    mongo_repository = MongoDBRepository()
+    mongo_repository.create_indexes()
+    return mongo_repository
+
+
+def run_repository_queries(mongo_repository:MongoDBRepository):
+    """
+    Call every MongoDBRepository read and write method, with and without cursors and owners
+    """
+    user_id = f"plan_user_{uuid.uuid4().hex}"
+    mongo_repository.create_user_blog(user_id, "hash", "", "", [])
+    mongo_repository.get_user_blog(user_id)
+    mongo_repository.update_user_details_blog(user_id, name="name")
+    mongo_repository.add_user_role(user_id, "role")
+    mongo_repository.remove_user_role(user_id, "role")
+    post = mongo_repository.create_message_blog("post", user_id, "")
+    reply = mongo_repository.create_message_blog("reply", user_id, post.message_id)
+    batch = mongo_repository.create_messages_blog([NewMessage("batch post", user_id),
+                                                   NewMessage("batch reply", user_id, reply.message_id)])
+    mongo_repository.get_posts_blog(10)
+    mongo_repository.get_posts_blog(10, start_index=1)
+    mongo_repository.get_posts_blog(10, cursor=encode_cursor(post.message_id))
+    list(mongo_repository.iter_posts_blog(10))
+    mongo_repository.get_message_blog(post.message_id)
+    mongo_repository.get_message_blog(post.message_id, user_id_owner=user_id)
+    mongo_repository.get_message_version_blog(post.message_id)
+    mongo_repository.get_feed_version_blog()
+    mongo_repository.get_messages_blog([post.message_id, reply.message_id])
+    mongo_repository.get_comments_blog(post.message_id, 10)
+    mongo_repository.get_comments_blog(post.message_id, 10, cursor=encode_cursor(reply.message_id))
+    mongo_repository.get_thread_blog(post.message_id, max_depth=3, limit=10)
+    mongo_repository.get_message_descendant_ids_blog(post.message_id)
+    mongo_repository.edit_message_blog(post.message_id, "edited")
+    mongo_repository.edit_message_blog(post.message_id, "edited", owner=user_id)
+    mongo_repository.add_message_like(post.message_id, user_id)
+    mongo_repository.is_message_liked(post.message_id, user_id)
+    mongo_repository.get_message_likes_blog(post.message_id, 10)
+    mongo_repository.get_message_likes_blog(post.message_id, 10, cursor=encode_cursor(post.message_id))
+    mongo_repository.remove_message_like(post.message_id, user_id)
+    mongo_repository.delete_message_blog(reply.message_id, owner=user_id)
+    mongo_repository.delete_message_blog(post.message_id)
+    mongo_repository.delete_message_blog(batch[0].message_id)
+    mongo_repository.delete_user_blog(user_id)
+
+
+def test_repository_queries_use_indexes(mongo_client, mongo_repository):
+    QUERY_RECORDER.commands.clear()
+    QUERY_RECORDER.recording = True
+    try:
+        run_repository_queries(mongo_repository)
+    finally:
+        QUERY_RECORDER.recording = False
+    assert QUERY_RECORDER.commands
+    assert collection_scans(mongo_client, QUERY_RECORDER.commands) == []
+
+
+def test_no_missing_or_changed_indexes(mongo_client, mongo_repository):
+    for collection_drift in index_drift(mongo_client).values():
+        assert collection_drift["missing"] == []
+        assert collection_drift["changed"] == []
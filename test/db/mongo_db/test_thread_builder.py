@@ -0,0 +1,85 @@
+"""
+Tests of ThreadBuilder reading a reply tree level by level, pipelines are run against an in-memory tree, no MongoDB needed:
+    python -m pytest test/db/mongo_db/test_thread_builder.py
+"""
+from types import SimpleNamespace
+from typing import Dict, List
+from bson import ObjectId
+from src.db.mongo_db.thread_builder import ThreadBuilder
+from src.db.odm_blog import MessageThread
+
+ROOT_ID = ObjectId("675000000000000000000000")
+
+
+class ReplyTree:
+    """
+    Replies by parent _id, running the $lookup pipelines of ThreadBuilder as MongoDB would
+    """
+    def __init__(self):
+        self.replies:Dict[ObjectId, List[ObjectId]] = {}
+        self.pipelines:List[List[dict]] = []
+
+    def add(self, parent_id:ObjectId, count:int)->List[ObjectId]:
+        reply_ids = [ObjectId() for _ in range(count)]
+        self.replies.setdefault(parent_id, []).extend(reply_ids)
+        return reply_ids
+
+    def aggregate(self, pipeline:List[dict])->List[dict]:
+        self.pipelines.append(pipeline)
+        stages = {name: stage[name] for stage in pipeline for name in stage}
+        replies_per_parent = stages["$lookup"]["pipeline"][1]["$limit"]
+        rows = [{"_id": reply_id, "reply_to_message_id": parent_id}
+                for parent_id in sorted(stages["$match"]["_id"]["$in"])
+                for reply_id in sorted(self.replies.get(parent_id, []))[:replies_per_parent]]
+        return rows[:stages["$limit"]]
+
+
+def build_thread(reply_tree:ReplyTree, max_depth:int, limit:int, messages_limit:int)->MessageThread:
+    thread = MessageThread(message=SimpleNamespace(message_id=str(ROOT_ID)), replies=[])
+    thread_builder = ThreadBuilder(thread, max_depth, limit, messages_limit, "comments",
+                                   lambda message_data: SimpleNamespace(message_id=str(message_data["_id"])))
+    pipeline = thread_builder.next_pipeline()
+    while pipeline is not None:
+        thread_builder.add_replies(reply_tree.aggregate(pipeline))
+        pipeline = thread_builder.next_pipeline()
+    return thread
+
+
+def reply_ids(thread:MessageThread)->List[ObjectId]:
+    return [ObjectId(reply.message.message_id) for reply in thread.replies]
+
+
+def test_every_level_is_bounded_per_message():
+    reply_tree = ReplyTree()
+    first_ids = reply_tree.add(ROOT_ID, 3)
+    second_ids = reply_tree.add(first_ids[0], 5)
+    reply_tree.add(first_ids[1], 1)
+    thread = build_thread(reply_tree, max_depth=3, limit=2, messages_limit=1000)
+    assert reply_ids(thread)==first_ids[:2] and thread.truncated
+    assert reply_ids(thread.replies[0])==second_ids[:2] and thread.replies[0].truncated
+    assert len(thread.replies[1].replies)==1 and not thread.replies[1].truncated
+    # a level query never reads more than limit + 1 replies of a message
+    assert all(stage["$lookup"]["pipeline"][1]["$limit"]<=3
+               for pipeline in reply_tree.pipelines for stage in pipeline if "$lookup" in stage)
+
+
+def test_every_message_below_max_depth_is_marked_truncated():
+    reply_tree = ReplyTree()
+    first_ids = reply_tree.add(ROOT_ID, 3)
+    reply_tree.add(first_ids[0], 1)
+    reply_tree.add(first_ids[2], 1)
+    thread = build_thread(reply_tree, max_depth=1, limit=10, messages_limit=1000)
+    assert reply_ids(thread)==first_ids and not thread.truncated
+    assert [reply.truncated for reply in thread.replies]==[True, False, True]
+    assert all(reply.replies==[] for reply in thread.replies)
+
+
+def test_messages_whose_replies_are_cut_by_messages_limit_are_marked_truncated():
+    reply_tree = ReplyTree()
+    first_ids = reply_tree.add(ROOT_ID, 3)
+    for first_id in first_ids:
+        reply_tree.add(first_id, 2)
+    thread = build_thread(reply_tree, max_depth=3, limit=10, messages_limit=4)
+    assert reply_ids(thread)==first_ids
+    assert [len(reply.replies) for reply in thread.replies]==[1, 0, 0]
+    assert [reply.truncated for reply in thread.replies]==[True, True, True]
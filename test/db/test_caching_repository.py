@@ -0,0 +1,93 @@
+"""
+Tests of CachingRepository against a repository double, no MongoDB needed:
+    python -m pytest test/db/test_caching_repository.py
+"""
+from unittest import mock
+import pytest
+from src.db.caching_repository import CachingRepository, EncodedMessageCache
+from src.db.odm_blog import EncodedMessage
+from src.db.repository import Repository
+from src.server.flask.exceptions import ResourceNotFoundError
+
+POST_ID, REPLY_ID = "6750000000000000000000aa", "6750000000000000000000bb"
+
+
+def create_caching_repository(max_size:int = 10, ttl_seconds:float = 60, revalidate_seconds:float = 60):
+    wrapped_repository = mock.Mock(spec=Repository)
+    wrapped_repository.get_message_json_blog.side_effect = \
+        lambda message_id: EncodedMessage(message_id=message_id, version=0, data=b'{}',
+                                          reply_to_message_id=POST_ID if message_id==REPLY_ID else None)
+    wrapped_repository.get_message_version_blog.return_value = 0
+    return (CachingRepository(wrapped_repository, EncodedMessageCache(max_size, ttl_seconds, revalidate_seconds)),
+            wrapped_repository)
+
+
+def test_read_through():
+    caching_repository, wrapped_repository = create_caching_repository()
+    first = caching_repository.get_message_json_blog(POST_ID)
+    assert caching_repository.get_message_json_blog(POST_ID) is first
+    assert caching_repository.get_message_version_blog(POST_ID)==0
+    assert wrapped_repository.get_message_json_blog.call_count==1
+    wrapped_repository.get_message_version_blog.assert_not_called()
+    assert caching_repository.stats()["hits"]==2
+
+
+def test_writes_invalidate():
+    caching_repository, wrapped_repository = create_caching_repository()
+    for write, args in [(caching_repository.edit_message_blog, (POST_ID, "edited")),
+                        (caching_repository.add_message_like, (POST_ID, "user")),
+                        (caching_repository.remove_message_like, (POST_ID, "user"))]:
+        caching_repository.get_message_json_blog(POST_ID)
+        write(*args)
+        caching_repository.get_message_json_blog(POST_ID)
+    assert wrapped_repository.get_message_json_blog.call_count==4
+
+
+def test_delete_invalidates_replies():
+    caching_repository, wrapped_repository = create_caching_repository()
+    caching_repository.get_message_json_blog(POST_ID)
+    caching_repository.get_message_json_blog(REPLY_ID)
+    caching_repository.delete_message_blog(POST_ID)
+    assert caching_repository.stats()["size"]==0
+    wrapped_repository.get_message_descendant_ids_blog.assert_not_called()
+
+
+def test_write_of_another_process_is_revalidated():
+    caching_repository, wrapped_repository = create_caching_repository(revalidate_seconds=0)
+    caching_repository.get_message_json_blog(POST_ID)
+    assert caching_repository.get_message_json_blog(POST_ID).version==0
+    assert wrapped_repository.get_message_json_blog.call_count==1
+    # edited by another process, which can't invalidate this cache
+    wrapped_repository.get_message_version_blog.return_value = 1
+    wrapped_repository.get_message_json_blog.side_effect = lambda message_id: EncodedMessage(message_id, 1, b'{}')
+    assert caching_repository.get_message_version_blog(POST_ID)==1
+    assert caching_repository.get_message_json_blog(POST_ID).version==1
+    assert caching_repository.stats()["stale_entries"]==1
+
+
+def test_message_deleted_by_another_process_isnt_served():
+    caching_repository, wrapped_repository = create_caching_repository(revalidate_seconds=0)
+    caching_repository.get_message_json_blog(REPLY_ID)
+    wrapped_repository.get_message_version_blog.side_effect = ResourceNotFoundError("Message not found")
+    with pytest.raises(ResourceNotFoundError):
+        caching_repository.get_message_json_blog(REPLY_ID)
+    assert caching_repository.stats()["size"]==0
+
+
+def test_read_racing_with_write_isnt_cached():
+    caching_repository, wrapped_repository = create_caching_repository()
+    wrapped_repository.get_message_json_blog.side_effect = lambda message_id: (
+        caching_repository.edit_message_blog(message_id, "edited"), EncodedMessage(message_id, 0, b'{}'))[1]
+    caching_repository.get_message_json_blog(POST_ID)
+    assert caching_repository.stats()["size"]==0
+
+
+def test_size_and_ttl_bounds():
+    caching_repository, _ = create_caching_repository(max_size=1)
+    caching_repository.get_message_json_blog(POST_ID)
+    caching_repository.get_message_json_blog(REPLY_ID)
+    assert caching_repository.stats()["evictions"]==1
+    caching_repository, wrapped_repository = create_caching_repository(ttl_seconds=0)
+    caching_repository.get_message_json_blog(POST_ID)
+    caching_repository.get_message_json_blog(POST_ID)
+    assert wrapped_repository.get_message_json_blog.call_count==2
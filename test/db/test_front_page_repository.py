@@ -0,0 +1,109 @@
+"""
+Tests of FrontPageRepository against a repository double, no MongoDB needed:
+    python -m pytest test/db/test_front_page_repository.py
+"""
+from bson import ObjectId
+import threading
+from unittest import mock
+from src.db.front_page_repository import FrontPageRepository
+from src.db.odm_blog import Post
+from src.db.pagination import encode_cursor
+from src.db.repository import Repository
+
+
+def create_post(index:int)->Post:
+    return Post(message_id=str(ObjectId(f"{index:024x}")), user_id_owner="user", content=f"post {index}", like_count=0)
+
+
+def create_front_page_repository(posts_count:int = 5, front_page_size:int = 3):
+    # newest first, as read from the db
+    posts = [create_post(index) for index in range(posts_count, 0, -1)]
+    wrapped_repository = mock.Mock(spec=Repository)
+    wrapped_repository.get_feed_version_blog.return_value = 7
+    wrapped_repository.get_posts_blog.side_effect = \
+        lambda posts_limit, start_index=0, cursor='': posts[start_index:start_index + posts_limit]
+    front_page_repository = FrontPageRepository(wrapped_repository, front_page_size=front_page_size,
+                                                revalidate_seconds=60, warm=False)
+    front_page_repository.reload()
+    wrapped_repository.get_posts_blog.reset_mock()
+    return front_page_repository, wrapped_repository, posts
+
+
+def test_pages_inside_window_are_served_from_memory():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    assert front_page_repository.get_posts_blog(posts_limit=2, start_index=1)==posts[1:3]
+    cursor = encode_cursor(posts[0].message_id)
+    assert [encoded.message_id for encoded in front_page_repository.get_posts_json_blog(posts_limit=2, cursor=cursor)] \
+        ==[post.message_id for post in posts[1:3]]
+    wrapped_repository.get_posts_blog.assert_not_called()
+    assert front_page_repository.get_posts_blog(posts_limit=4)==posts[:4]
+    assert wrapped_repository.get_posts_blog.call_count==1
+
+
+def test_local_writes_update_window():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    new_post = create_post(6)
+    wrapped_repository.create_message_blog.return_value = new_post
+    wrapped_repository.delete_message_blog.return_value = posts[0]
+    front_page_repository.create_message_blog("post 6", "user", "")
+    front_page_repository.delete_message_blog(posts[0].message_id)
+    wrapped_repository.delete_message_blog.assert_called_once()
+    assert front_page_repository.get_posts_blog(posts_limit=2)==[new_post, posts[1]]
+    wrapped_repository.get_posts_blog.assert_not_called()
+
+
+def test_newer_db_version_falls_back_to_db():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    wrapped_repository.get_feed_version_blog.return_value = 8
+    assert front_page_repository.get_feed_version_blog()==8
+    assert front_page_repository.get_posts_blog(posts_limit=2)==posts[:2]
+    assert wrapped_repository.get_posts_blog.call_count==1
+    assert front_page_repository.stats()["misses"]==1
+
+
+def test_local_likes_update_window_in_place():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    liked_post = Post(message_id=posts[1].message_id, user_id_owner="user", content="post 4", like_count=1, version=1)
+    wrapped_repository.get_message_blog.return_value = liked_post
+    front_page_repository.add_message_like(posts[1].message_id, "liker")
+    # likes don't change the feed version
+    assert front_page_repository.get_feed_version_blog()==7
+    assert front_page_repository.get_posts_blog(posts_limit=2)==[posts[0], liked_post]
+    wrapped_repository.get_posts_blog.assert_not_called()
+    assert front_page_repository.stats()["reloads"]==1
+
+
+def test_reload_runs_off_the_request_thread():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    front_page_repository._revalidate_seconds = 0
+    reload_threads = []
+    reloaded = threading.Event()
+
+    def get_posts_blog(posts_limit, start_index=0, cursor=''):
+        if posts_limit==3:
+            reload_threads.append(threading.current_thread())
+            reloaded.set()
+        return posts[start_index:start_index + posts_limit]
+    wrapped_repository.get_posts_blog.side_effect = get_posts_blog
+    wrapped_repository.get_feed_version_blog.return_value = 8
+    front_page_repository.get_feed_version_blog()
+    assert front_page_repository.get_posts_blog(posts_limit=2)==posts[:2]
+    assert reloaded.wait(5)
+    assert reload_threads[0] is not threading.current_thread()
+
+
+def test_unlimited_page_is_read_from_db():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    assert front_page_repository.get_posts_blog(posts_limit=0)==[]
+    wrapped_repository.get_posts_blog.assert_called_once_with(posts_limit=0, start_index=0, cursor='')
+
+
+def test_window_older_than_max_age_is_reloaded():
+    front_page_repository, wrapped_repository, posts = create_front_page_repository()
+    front_page_repository._revalidate_seconds = 0
+    front_page_repository._max_age_seconds = 0
+    reloaded = threading.Event()
+    wrapped_repository.get_posts_blog.side_effect = lambda posts_limit, start_index=0, cursor='': \
+        reloaded.set() or posts[start_index:start_index + posts_limit]
+    assert front_page_repository.get_posts_blog(posts_limit=2)==posts[:2]
+    assert reloaded.wait(5)
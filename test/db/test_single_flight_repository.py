@@ -0,0 +1,106 @@
+"""
+Tests of SingleFlightRepository against a repository double, no MongoDB needed:
+    python -m pytest test/db/test_single_flight_repository.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+from unittest import mock
+import pytest
+from src.db.caching_repository import CachingRepository, EncodedMessageCache
+from src.db.odm_blog import EncodedMessage
+from src.db.repository import Repository
+from src.db.single_flight_repository import SingleFlightRepository
+from src.server.flask.exceptions import ResourceNotFoundError, TimeoutError
+
+POST_ID = "6750000000000000000000aa"
+READERS = 8
+
+
+def run_concurrent_reads(single_flight_repository:SingleFlightRepository, release:Event):
+    """
+    Start READERS identical reads, release the db read once all of them wait for it
+    :return: list of each read's result or exception
+    """
+    def read():
+        try:
+            return single_flight_repository.get_message_json_blog(POST_ID)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(READERS) as executor:
+        futures = [executor.submit(read) for _ in range(READERS)]
+        while single_flight_repository.stats()["coalesced"] < READERS - 1:
+            pass
+        release.set()
+        return [future.result() for future in futures]
+
+
+def create_single_flight_repository(read, timeout_seconds:float = 5):
+    wrapped_repository = mock.Mock(spec=Repository)
+    wrapped_repository.get_message_json_blog.side_effect = read
+    return SingleFlightRepository(wrapped_repository, timeout_seconds=timeout_seconds), wrapped_repository
+
+
+def test_identical_reads_share_one_db_call():
+    release = Event()
+    single_flight_repository, wrapped_repository = create_single_flight_repository(
+        lambda message_id: release.wait() and EncodedMessage(message_id, 0, b'{}'))
+    results = run_concurrent_reads(single_flight_repository, release)
+    assert all(result is results[0] for result in results)
+    assert wrapped_repository.get_message_json_blog.call_count==1
+    assert single_flight_repository.stats()["in_flight"]==0
+    single_flight_repository.get_message_json_blog(POST_ID)
+    assert wrapped_repository.get_message_json_blog.call_count==2
+
+
+def test_error_reaches_every_waiter():
+    release = Event()
+    def read(message_id):
+        release.wait()
+        raise ResourceNotFoundError("Message not found")
+    single_flight_repository, _ = create_single_flight_repository(read)
+    results = run_concurrent_reads(single_flight_repository, release)
+    assert all(isinstance(result, ResourceNotFoundError) for result in results)
+
+
+def test_waiters_time_out():
+    release = Event()
+    single_flight_repository, _ = create_single_flight_repository(
+        lambda message_id: release.wait(1) and EncodedMessage(message_id, 0, b'{}'), timeout_seconds=0.01)
+    with ThreadPoolExecutor(1) as executor:
+        leader = executor.submit(single_flight_repository.get_message_json_blog, POST_ID)
+        while single_flight_repository.stats()["in_flight"]==0:
+            pass
+        with pytest.raises(TimeoutError):
+            single_flight_repository.get_message_json_blog(POST_ID)
+        release.set()
+        assert leader.result().message_id==POST_ID
+    assert single_flight_repository.stats()["timeouts"]==1
+
+
+def test_read_started_after_write_doesnt_join_older_read():
+    release = Event()
+    wrapped_repository = mock.Mock(spec=Repository)
+    # the first read starts before the edit and returns the message as it was, later reads see the edit
+    versions = iter([0, 1, 1])
+    def read(message_id):
+        version = next(versions)
+        if version==0:
+            release.wait()
+        return EncodedMessage(message_id, version, b'{}')
+    wrapped_repository.get_message_json_blog.side_effect = read
+    wrapped_repository.get_message_version_blog.return_value = 1
+    single_flight_repository = SingleFlightRepository(wrapped_repository)
+    caching_repository = CachingRepository(single_flight_repository, EncodedMessageCache())
+    with ThreadPoolExecutor(2) as executor:
+        read_before_edit = executor.submit(caching_repository.get_message_json_blog, POST_ID)
+        while single_flight_repository.stats()["in_flight"]==0:
+            pass
+        caching_repository.edit_message_blog(POST_ID, "edited")
+        read_after_edit = executor.submit(caching_repository.get_message_json_blog, POST_ID)
+        while not read_after_edit.done() and single_flight_repository.stats()["coalesced"]==0:
+            pass
+        release.set()
+        assert read_before_edit.result().version==0
+        assert read_after_edit.result().version==1
+    assert single_flight_repository.stats()["coalesced"]==0
+    assert caching_repository.get_message_json_blog(POST_ID).version==1
@@ -0,0 +1,95 @@
+"""
+Tests of the ASGI app against a repository double, no MongoDB or ASGI server needed:
+    python -m pytest test/server/asgi/test_asgi_app.py
+"""
+import asyncio
+import json
+import os
+from unittest import mock
+import pytest
+import src.db.async_repository as async_repository
+from src.db.async_repository import AsyncRepository
+from src.db.odm_blog import EncodedMessage, Post, User
+from src.server.asgi.app import app
+import src.server.routes.input_validation as input_validation
+from src.server.routes.token import generate_jwt
+
+POST_ID = "6750000000000000000000aa"
+
+
+def call_app(method:str, path:str, body:dict = None, headers:dict = None, messages:list = None):
+    """
+    Send one request to the ASGI app
+    :param messages: http.request messages sent instead of body
+    :return: status, headers and body of the response
+    """
+    if messages is None:
+        messages = [{'type': 'http.request', 'body': b'' if body is None else json.dumps(body).encode(),
+                     'more_body': False}]
+    sent = []
+    async def receive():
+        return messages.pop(0)
+    async def send(message):
+        sent.append(message)
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+    asyncio.run(app(scope, receive, send))
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(message.get('body', b'') for message in sent[1:])
+
+
+@pytest.fixture
+def repository():
+    os.environ.setdefault('JWT_SECRET_KEY', 'asgi_test_secret_key_at_least_32_bytes')
+    repository = mock.AsyncMock(spec=AsyncRepository)
+    repository.get_user_blog.return_value = User(user_id="user", password="", email="", name="", roles=["post_user"])
+    async_repository.SERVER_ASYNC_REPOSITORY = repository
+    yield repository
+    async_repository.SERVER_ASYNC_REPOSITORY = None
+
+
+def authorization()->dict:
+    return {"Authorization": f"Bearer {generate_jwt('user', '', ['post_user'])}"}
+
+
+def test_error_format(repository):
+    status, _, body = call_app('GET', '/api/v0/messages/get', {"message_id": POST_ID})
+    assert status==401
+    assert json.loads(body)=={"error": "AuthenticationError", "message": "Token is missing"}
+    status, _, body = call_app('GET', '/api/v0/messages/get', {"message_id": "bad"}, authorization())
+    assert status==400 and json.loads(body)["error"]=="InputValidationError"
+
+
+def test_get_message_and_etag(repository):
+    repository.get_message_json_blog.return_value = EncodedMessage(POST_ID, 3, b'{"content":"post"}')
+    repository.get_message_version_blog.return_value = 3
+    status, headers, body = call_app('GET', '/api/v0/messages/get', {"message_id": POST_ID}, authorization())
+    assert (status, body)==(200, b'{"content":"post"}')
+    status, _, _ = call_app('GET', '/api/v0/messages/get', {"message_id": POST_ID},
+                            {**authorization(), "If-None-Match": headers[b'etag'].decode()})
+    assert status==304
+
+
+def test_create_post_matches_flask_json(repository):
+    repository.create_message_blog.return_value = Post(message_id=POST_ID, user_id_owner="user", content="post", like_count=0)
+    status, _, body = call_app('POST', '/api/v0/messages/create', {"content": "post"}, authorization())
+    assert status==200
+    assert body==b'{"content":"post","like_count":0,"message_id":"' + POST_ID.encode() \
+        + b'","reply_to_message_id":null,"user_id_owner":"user","version":0}'
+
+
+def test_body_longer_than_limit_is_not_read_past_limit(repository):
+    chunk = b'x' * (input_validation.REQUEST_BODY_LIMIT // 2)
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for _ in range(4)]
+    status, _, _ = call_app("POST", "/api/v0/messages/create", headers=authorization(), messages=messages)
+    assert status==413
+    # reading stopped at the chunk crossing the limit
+    assert len(messages)==1
+    repository.create_message_blog.assert_not_called()
+
+
+def test_body_announced_longer_than_limit_is_not_read(repository):
+    messages = [{'type': 'http.request', 'body': b'{}', 'more_body': False}]
+    status, _, _ = call_app("POST", "/api/v0/messages/create", messages=messages,
+                            headers={**authorization(), "Content-Length": str(input_validation.REQUEST_BODY_LIMIT + 1)})
+    assert status==413
+    assert len(messages)==1
@@ -0,0 +1,125 @@
+"""
+Load benchmark of the WSGI (Flask) app against the ASGI app: requests/sec and latency percentiles of
+GET /api/v0/messages/posts with CONNECTIONS concurrent keep-alive connections.
+Uses only asyncio streams, so 1k connections don't need 1k client threads.
+Runs against live servers on the same MongoDB, both as deployed with the same number of worker processes.
+The WSGI app runs under gunicorn with the in-memory layers the ASGI app doesn't have turned off,
+so both read every page of posts from MongoDB, e.g.
+    FRONT_PAGE_SIZE=0 REPOSITORY_CACHE_ENABLED=false SINGLE_FLIGHT_ENABLED=false GUNICORN_WORKERS=4 \
+        gunicorn -c gunicorn.conf.py --bind 127.0.0.1:5000
+    uvicorn src.server.asgi.app:app --port 8000 --workers 4
+    python test/server/bench_asgi_vs_wsgi.py http://127.0.0.1:5000 http://127.0.0.1:8000
+Raise the open files limit first (ulimit -n 4096), each connection is a socket on both sides.
+"""
+import asyncio
+import json
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+CONNECTIONS = 1000
+DURATION_SECONDS = 20
+USER_ID, PASSWORD = "bench_user", "bench_password"
+FEED_BODY = json.dumps({"limit": 10}).encode()
+
+
+def post_json(url:str, body:dict)->Optional[dict]:
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read() or b'null')
+    except urllib.error.HTTPError:
+        return None
+
+
+def login(base_url:str)->str:
+    post_json(f"{base_url}/api/v0/auth/register", {"user_id": USER_ID, "password": PASSWORD, "roles": []})
+    return post_json(f"{base_url}/api/v0/auth/login", {"user_id": USER_ID, "password": PASSWORD})["token"]
+
+
+async def read_response(reader:asyncio.StreamReader)->Tuple[int, bool]:
+    """
+    Read one HTTP/1.1 response with a Content-Length or chunked body
+    :return: status code, and False if the server closes the connection after it
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding')=='chunked':
+        while (size := int((await reader.readline()).strip(), 16)) > 0:
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    keep_alive = headers.get('connection', '').lower()!='close' and not status_line.startswith(b'HTTP/1.0')
+    return int(status_line.split()[1]), keep_alive
+
+
+async def run_connection(host:str, port:int, request:bytes, deadline:float,
+                         latencies:List[float], errors:List[str])->None:
+    """
+    Send requests one after the other on a keep-alive connection until deadline, reconnecting if it is closed
+    """
+    writer:Optional[asyncio.StreamWriter] = None
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await read_response(reader)
+            if status!=200:
+                errors.append(str(status))
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+            if not keep_alive:
+                writer.close()
+                writer = None
+        except (ConnectionError, asyncio.IncompleteReadError, OSError) as e:
+            errors.append(type(e).__name__)
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def load(base_url:str, jwt_token:str)->Tuple[List[float], List[str], float]:
+    url = urlsplit(base_url)
+    request = (f"GET /api/v0/messages/posts HTTP/1.1\r\nHost: {url.netloc}\r\n"
+               f"Authorization: Bearer {jwt_token}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(FEED_BODY)}\r\n\r\n").encode() + FEED_BODY
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[run_connection(url.hostname, url.port, request, start + DURATION_SECONDS, latencies, errors)
+                           for _ in range(CONNECTIONS)])
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(title:str, latencies:List[float], errors:List[str], elapsed:float):
+    latencies = sorted(latencies)
+    if not latencies:
+        print(f"{title}: no successful requests, {len(errors)} errors")
+        return
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"{title}: {len(latencies) / elapsed:.0f} req/s, p50 {statistics.median(latencies):.1f}ms, "
+          f"p99 {p99:.1f}ms, {len(errors)} errors {sorted(set(errors))[:5]}")
+
+
+def run_benchmark(base_urls:List[str]):
+    for base_url in base_urls:
+        latencies, errors, elapsed = asyncio.run(load(base_url, login(base_url)))
+        report(f"{base_url} with {CONNECTIONS} connections", latencies, errors, elapsed)
+
+
+if __name__=="__main__":
+    run_benchmark(sys.argv[1:] or ["http://127.0.0.1:5000", "http://127.0.0.1:8000"])
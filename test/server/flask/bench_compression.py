@@ -0,0 +1,93 @@
+"""
+Benchmark of bytes on the wire and cpu per request of /messages/posts pages for each response encoding.
+Runs in process against an in memory repository double, no server or MongoDB needed.
+zstd rows need the optional zstandard package. Run from the project root:
+    PYTHONPATH=. python test/server/flask/bench_compression.py
+"""
+import os
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark_secret_key_of_at_least_32_bytes")
+
+import random
+import time
+from unittest import mock
+from bson import ObjectId
+from flask import Flask
+import src.db.repository as repository
+from src.db.repository import encode_message
+import src.server.routes.token as token
+import src.server.flask.compression as compression
+from src.db.odm_blog import Post, User
+from src.server.routes.messages import messages_bp
+
+USER_ID = "bench_user"
+PAGE_SIZES = [10, 100, 1000]
+WORDS = "the a blog post about flask mongo index cursor page feed like comment reply thread user".split()
+# (label, Accept-Encoding header, compression level patched on the module)
+ENCODINGS = [
+    ("identity", "identity", None),
+    ("gzip level 1", "gzip", ("GZIP_LEVEL", 1)),
+    ("gzip level 6", "gzip", ("GZIP_LEVEL", 6)),
+    ("gzip level 9", "gzip", ("GZIP_LEVEL", 9)),
+    ("zstd level 1", "zstd", ("ZSTD_LEVEL", 1)),
+    ("zstd level 3", "zstd", ("ZSTD_LEVEL", 3)),
+    ("zstd level 9", "zstd", ("ZSTD_LEVEL", 9)),
+]
+
+
+def create_posts(posts_count:int)->list:
+    random.seed(posts_count)
+    return [Post(message_id=str(ObjectId()), user_id_owner=f"user_{random.randrange(1000)}",
+                 content=" ".join(random.choices(WORDS, k=random.randint(10, 60))),
+                 like_count=random.randrange(500)) for _ in range(posts_count)]
+
+
+def create_repository_double(posts:list)->mock.Mock:
+    repository_double = mock.Mock()
+    repository_double.get_user_blog.return_value = User(user_id=USER_ID, email="", name="", password="", roles=["post_user"])
+    repository_double.get_posts_blog.side_effect = lambda posts_limit, **kwargs: posts[:posts_limit]
+    repository_double.iter_posts_blog.side_effect = lambda posts_limit, **kwargs: iter(posts[:posts_limit])
+    encoded_posts = [encode_message(post) for post in posts]
+    repository_double.get_posts_json_blog.side_effect = lambda posts_limit, **kwargs: encoded_posts[:posts_limit]
+    repository_double.get_feed_version_blog.return_value = 0
+    return repository_double
+
+
+def measure(client, headers:dict, body:dict)->tuple:
+    iterations = max(10, 2000 // body["limit"])
+    response = client.get("/api/v0/messages/posts", json=body, headers=headers)
+    wire_bytes = len(response.get_data())
+    start = time.process_time()
+    for _ in range(iterations):
+        client.get("/api/v0/messages/posts", json=body, headers=headers).get_data()
+    cpu_ms = (time.process_time() - start) / iterations * 1000
+    return response.headers.get("Content-Encoding", "identity"), wire_bytes, cpu_ms
+
+
+def run_benchmark():
+    app = Flask(__name__)
+    app.register_blueprint(messages_bp, url_prefix='/api/v0/messages')
+    with mock.patch.object(compression, "RESPONSE_COMPRESSION", True):
+        compression.init_compression(app)
+    client = app.test_client()
+    repository.SERVER_REPOSITORY = create_repository_double(create_posts(max(PAGE_SIZES)))
+    auth_header = f"Bearer {token.generate_jwt(USER_ID, '', ['post_user'])}"
+
+    print(f"{'page':>6}{'mode':>8}  {'encoding':<14}{'bytes':>10}{'ratio':>8}{'cpu ms/request':>16}")
+    for page_size in PAGE_SIZES:
+        for stream in (False, True):
+            identity_bytes = None
+            for label, accept_encoding, level in ENCODINGS:
+                if accept_encoding=="zstd" and compression.zstandard is None:
+                    continue
+                headers = {"Authorization": auth_header, "Accept-Encoding": accept_encoding}
+                patch = mock.patch.object(compression, *level) if level else mock.patch.object(compression, "GZIP_LEVEL", compression.GZIP_LEVEL)
+                with patch:
+                    encoding, wire_bytes, cpu_ms = measure(client, headers, {"limit": page_size, "stream": stream})
+                assert encoding==accept_encoding, f"expected {accept_encoding} response, got {encoding}"
+                identity_bytes = identity_bytes or wire_bytes
+                print(f"{page_size:>6}{'stream' if stream else 'full':>8}  {label:<14}{wire_bytes:>10}"
+                      f"{identity_bytes / wire_bytes:>8.1f}{cpu_ms:>16.3f}")
+
+
+if __name__=="__main__":
+    run_benchmark()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of jwt decodes per request for every messages endpoint.
+Runs in process against an in memory repository double, no server or MongoDB needed.
+Run from the project root:
+    PYTHONPATH=. python test/server/routes/bench_jwt_decode.py
+"""
+import os
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark_secret_key_of_at_least_32_bytes")
+
+import time
+from unittest import mock
+from flask import Flask
+import jwt
+import src.db.repository as repository
+from src.db.repository import encode_message
+import src.server.routes.token as token
+from src.db.odm_blog import Post, Comment, User
+import src.server.routes.messages as messages
+from src.server.routes.messages import messages_bp
+
+MESSAGE_ID = "6750000000000000000000aa"
+USER_ID = "bench_user"
+ITERATIONS = 1000
+
+
+def create_repository_double()->mock.Mock:
+    repository_double = mock.Mock()
+    post = Post(message_id=MESSAGE_ID, user_id_owner=USER_ID, content="post", like_count=0)
+    comment = Comment(message_id=MESSAGE_ID, user_id_owner=USER_ID, content="comment", like_count=0,
+                      reply_to_message_id=MESSAGE_ID)
+    repository_double.get_user_blog.return_value = User(user_id=USER_ID, email="", name="", password="", roles=["post_user"])
+    repository_double.get_message_blog.return_value = post
+    repository_double.get_message_json_blog.return_value = encode_message(post)
+    repository_double.get_message_version_blog.return_value = post.version
+    repository_double.get_posts_blog.return_value = [post]
+    repository_double.get_posts_json_blog.return_value = [encode_message(post)]
+    repository_double.get_feed_version_blog.return_value = 0
+    repository_double.create_message_blog.return_value = comment
+    repository_double.edit_message_blog.return_value = post
+    repository_double.delete_message_blog.return_value = post
+    return repository_double
+
+
+ENDPOINTS = [
+    ("GET", "/api/v0/messages/posts", {"limit": 10}),
+    ("GET", "/api/v0/messages/get", {"message_id": MESSAGE_ID}),
+    ("POST", "/api/v0/messages/create", {"content": "post"}),
+    ("POST", "/api/v0/messages/create", {"content": "comment", "reply_to_message_id": MESSAGE_ID}),
+    ("POST", "/api/v0/messages/edit", {"message_id": MESSAGE_ID, "content": "edited"}),
+    ("DELETE", "/api/v0/messages/delete", {"message_id": MESSAGE_ID}),
+    ("PUT", "/api/v0/messages/like/add", {"message_id": MESSAGE_ID}),
+    ("PUT", "/api/v0/messages/like/remove", {"message_id": MESSAGE_ID}),
+]
+
+
+def run_benchmark():
+    app = Flask(__name__)
+    app.register_blueprint(messages_bp, url_prefix='/api/v0/messages')
+    client = app.test_client()
+    repository.SERVER_REPOSITORY = create_repository_double()
+    headers = {"Authorization": f"Bearer {token.generate_jwt(USER_ID, '', ['post_user'])}"}
+
+    print(f"{'endpoint':<45}{'decodes before':>16}{'decodes after':>16}{'us/request':>12}")
+    for method, url, body in ENDPOINTS:
+        # before the change every get_payload_from_request call decoded the token
+        lookups_counter = mock.Mock(wraps=token.get_payload_from_request)
+        with mock.patch.object(token, "get_payload_from_request", lookups_counter), \
+                mock.patch.object(messages, "get_payload_from_request", lookups_counter), \
+                mock.patch.object(token.jwt, "decode", wraps=jwt.decode) as decodes_counter:
+            response = client.open(url, method=method, json=body, headers=headers)
+            assert response.status_code in (200, 204), response.text
+            lookups, decoded = lookups_counter.call_count, decodes_counter.call_count
+        start = time.perf_counter()
+        for _ in range(ITERATIONS):
+            client.open(url, method=method, json=body, headers=headers)
+        elapsed_us = (time.perf_counter() - start) / ITERATIONS * 1e6
+        label = f"{method} {url}" + (" (comment)" if "reply_to_message_id" in body else "")
+        print(f"{label:<45}{lookups:>16}{decoded:>16}{elapsed_us:>12.1f}")
+
+
+if __name__=="__main__":
+    run_benchmark()
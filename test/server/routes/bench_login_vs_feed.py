@@ -0,0 +1,67 @@
+"""
+Benchmark of login throughput against GET posts feed latency while both run at once.
+Runs against a live server, see README for running with docker compose:
+    python test/server/routes/bench_login_vs_feed.py
+"""
+import requests
+import statistics
+import threading
+import time
+from typing import List
+
+BASE_URL = "http://127.0.0.1:5000/api/v0"
+USER_ID, PASSWORD = "bench_user", "bench_password"
+LOGIN_THREADS = 16
+DURATION_SECONDS = 10
+
+
+def measure_feed_latency(jwt_token:str, stop:threading.Event, latencies:List[float]):
+    session = requests.Session()
+    headers = {"Authorization": f"Bearer {jwt_token}"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        session.get(f"{BASE_URL}/messages/posts", headers=headers, json={"limit": 10})
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+def login_loop(stop:threading.Event, status_codes:List[int]):
+    session = requests.Session()
+    while not stop.is_set():
+        response = session.post(f"{BASE_URL}/auth/login", json={"user_id": USER_ID, "password": PASSWORD})
+        status_codes.append(response.status_code)
+
+
+def report_feed_latency(title:str, latencies:List[float]):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{title}: {len(latencies)} requests, p50 {statistics.median(latencies):.1f}ms, p99 {p99:.1f}ms")
+
+
+def run_benchmark():
+    requests.post(f"{BASE_URL}/auth/register", json={"user_id": USER_ID, "password": PASSWORD, "roles": []})
+    jwt_token = requests.post(f"{BASE_URL}/auth/login", json={"user_id": USER_ID, "password": PASSWORD}).json()["token"]
+
+    stop, idle_latencies = threading.Event(), []
+    feed_thread = threading.Thread(target=measure_feed_latency, args=(jwt_token, stop, idle_latencies))
+    feed_thread.start()
+    time.sleep(DURATION_SECONDS / 2)
+    stop.set()
+    feed_thread.join()
+    report_feed_latency("GET feed without login load", idle_latencies)
+
+    stop, loaded_latencies, status_codes = threading.Event(), [], []
+    threads = [threading.Thread(target=login_loop, args=(stop, status_codes)) for _ in range(LOGIN_THREADS)]
+    threads.append(threading.Thread(target=measure_feed_latency, args=(jwt_token, stop, loaded_latencies)))
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION_SECONDS)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    report_feed_latency(f"GET feed with {LOGIN_THREADS} login threads", loaded_latencies)
+    logins, rejected = status_codes.count(200), status_codes.count(503)
+    print(f"Login throughput: {logins / DURATION_SECONDS:.1f}/s, rejected with 503: {rejected}")
+
+
+if __name__=="__main__":
+    run_benchmark()
@@ -0,0 +1,79 @@
+"""
+Tests of the batch route against a repository double, no MongoDB needed:
+    python -m pytest test/server/routes/test_batch.py
+"""
+import os
+from unittest import mock
+import pytest
+import src.db.repository as repository
+import src.server.routes.input_validation as input_validation
+from src.db.odm_blog import Post, User
+from src.db.repository import Repository
+from src.server.flask.app import create_app
+from src.server.flask.exceptions import ResourceNotFoundError
+from src.server.routes.token import generate_jwt
+
+POST_ID = "6750000000000000000000aa"
+MISSING_ID = "6750000000000000000000bb"
+
+
+def add_message_like(message_id:str, user_id:str)->bool:
+    if message_id!=POST_ID:
+        raise ResourceNotFoundError(f"Message ID {message_id} not found")
+    return True
+
+
+@pytest.fixture
+def server_repository():
+    os.environ.setdefault('JWT_SECRET_KEY', 'batch_test_secret_key_at_least_32_bytes')
+    previous_repository:Repository = repository.SERVER_REPOSITORY
+    server_repository = mock.Mock(spec=Repository)
+    server_repository.get_user_blog.return_value = User(user_id="user", password="", email="", name="",
+                                                        roles=["post_user"])
+    server_repository.edit_message_blog.side_effect = lambda message_id, content, owner='': \
+        Post(message_id=message_id, content=content, user_id_owner=owner, like_count=0)
+    server_repository.add_message_like.side_effect = add_message_like
+    yield server_repository
+    repository.SERVER_REPOSITORY = previous_repository
+
+
+def run_batch(server_repository, operations):
+    client = create_app({"SERVER_REPOSITORY": server_repository}).test_client()
+    return client.post('/api/v0/batch', json={"operations": operations},
+                       headers={"Authorization": f"Bearer {generate_jwt('user', '', ['post_user'])}"})
+
+
+def test_operations_run_in_order_and_fail_on_their_own(server_repository):
+    response = run_batch(server_repository, [
+        {"method": "PUT", "path": "/api/v0/messages/like/add", "body": {"message_id": MISSING_ID}},
+        {"method": "POST", "path": "/api/v0/messages/edit", "body": {"message_id": POST_ID, "content": "edited"}},
+        {"method": "PUT", "path": "/api/v0/messages/like/add", "body": {"message_id": POST_ID}},
+        {"method": "POST", "path": "/api/v0/messages/edit", "body": {"message_id": "bad", "content": "edited"}},
+    ])
+    assert response.status_code==200
+    results = response.get_json()["results"]
+    assert [result["status"] for result in results]==[404, 200, 204, 400]
+    assert results[0]["body"]["error"]=="ResourceNotFoundError"
+    assert results[1]["body"]["content"]=="edited"
+    assert [call[0] for call in server_repository.mock_calls if call[0]!="get_user_blog"]==\
+        ["add_message_like", "edit_message_blog", "add_message_like"]
+
+
+def test_only_messages_routes_are_run(server_repository):
+    response = run_batch(server_repository, [
+        {"method": "DELETE", "path": "/api/v0/auth/account/delete", "body": {"user_id": "user"}},
+        {"method": "GET", "path": "/api/v0/messages/unknown", "body": {}},
+        {"method": "GET", "path": "/api/v0/messages/like/add", "body": {}},
+        "not an operation",
+    ])
+    assert [result["status"] for result in response.get_json()["results"]]==[404, 404, 405, 400]
+    server_repository.delete_user_blog.assert_not_called()
+
+
+def test_batch_is_limited_to_batch_operations_limit(server_repository):
+    operation = {"method": "PUT", "path": "/api/v0/messages/like/add", "body": {"message_id": POST_ID}}
+    response = run_batch(server_repository, [operation] * (input_validation.BATCH_OPERATIONS_LIMIT + 1))
+    assert response.status_code==400
+    server_repository.add_message_like.assert_not_called()
+    response = run_batch(server_repository, [operation] * input_validation.BATCH_OPERATIONS_LIMIT)
+    assert [result["status"] for result in response.get_json()["results"]]==[204] * input_validation.BATCH_OPERATIONS_LIMIT
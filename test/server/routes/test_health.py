@@ -0,0 +1,56 @@
+"""
+Tests of the liveness and readiness routes against a repository double, no MongoDB needed:
+    python -m pytest test/server/routes/test_health.py
+"""
+from unittest import mock
+import pytest
+import src.db.repository as repository
+from src.db.repository import Repository
+from src.server.flask.app import create_app
+from src.server.flask.exceptions import DatabaseError
+import src.server.routes.health as health
+
+
+@pytest.fixture
+def server_repository():
+    previous_repository:Repository = repository.SERVER_REPOSITORY
+    server_repository = mock.Mock(spec=Repository)
+    server_repository.indexes_created.return_value = True
+    health.READINESS_CHECK = health.ReadinessCheck(cache_seconds=60)
+    yield server_repository
+    repository.SERVER_REPOSITORY = previous_repository
+    health.READINESS_CHECK = health.ReadinessCheck()
+
+
+def test_healthz_does_not_ping_database(server_repository):
+    server_repository.ping.side_effect = DatabaseError("MongoDB Connection Error")
+    client = create_app({"SERVER_REPOSITORY": server_repository}).test_client()
+    response = client.get('/healthz')
+    assert response.status_code==200
+    assert response.get_json()=={"status": "ok"}
+    server_repository.ping.assert_not_called()
+
+
+def test_readyz_reuses_cached_ping(server_repository):
+    client = create_app({"SERVER_REPOSITORY": server_repository}).test_client()
+    responses = [client.get('/readyz') for _ in range(5)]
+    assert [response.status_code for response in responses]==[200] * 5
+    assert responses[0].get_json()["status"]=="ready"
+    assert server_repository.ping.call_count==1
+
+
+def test_readyz_unavailable_when_ping_fails(server_repository):
+    server_repository.ping.side_effect = DatabaseError("MongoDB Connection Error")
+    client = create_app({"SERVER_REPOSITORY": server_repository}).test_client()
+    response = client.get('/readyz')
+    assert response.status_code==503
+    assert response.get_json()["status"]=="unavailable"
+    assert response.get_json()["error"]=="MongoDB Connection Error"
+
+
+def test_readyz_unavailable_until_indexes_are_created(server_repository):
+    server_repository.indexes_created.return_value = False
+    client = create_app({"SERVER_REPOSITORY": server_repository}).test_client()
+    response = client.get('/readyz')
+    assert response.status_code==503
+    assert response.get_json()["error"]=="Indexes aren't created yet"
@@ -9,12 +9,13 @@ def print_response_status(response:requests.Response):
 
 
 
-def get_posts(jwt_token, start_index:int=0, limit:int=10 ):
+def get_posts(jwt_token, start_index:int=0, limit:int=10, cursor:str=''):
     url = "http://127.0.0.1:5000/api/v0/messages/posts"
     headers = { "Authorization": f"Bearer {jwt_token}"}
     data_params = {
         "start_index": start_index,
         "limit": limit,
+        "cursor": cursor,
     }
     response: requests.Response = requests.get(url, headers=headers, json=data_params)
     print_response_status(response)
@@ -90,7 +91,9 @@ def get_message(jwt_token, message_id):
 if __name__=="__main__":
     response = login("user3","password3")
     jwt_token = response.json().get("token")
-    print(get_posts(jwt_token,0,5))
+    first_page = get_posts(jwt_token,0,5).json()
+    print(first_page)
+    print(get_posts(jwt_token, limit=5, cursor=first_page.get("next_cursor") or ''))
     post_response = create_message(jwt_token,"post example from user3")
     post = get_message(jwt_token,post_response.json().get("message_id")).json()
 
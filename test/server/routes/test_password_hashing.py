@@ -0,0 +1,32 @@
+"""
+Tests of the bounded password hashing executor, no MongoDB needed:
+    python -m pytest test/server/routes/test_password_hashing.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import pytest
+import src.server.routes.password_hashing as password_hashing
+from src.server.flask.exceptions import ServiceUnavailableError
+
+
+def test_hashing_tasks_stay_below_request_threads():
+    assert password_hashing.PASSWORD_HASH_WORKERS + password_hashing.PASSWORD_HASH_QUEUE_LIMIT \
+        < password_hashing.GUNICORN_THREADS
+
+
+def test_tasks_beyond_queue_limit_are_rejected_and_counted():
+    release = Event()
+    slots = password_hashing.PASSWORD_HASH_WORKERS + password_hashing.PASSWORD_HASH_QUEUE_LIMIT
+    rejected = password_hashing.password_hashing_stats()["rejected"]
+    futures = [password_hashing._submit_to_password_hash_executor(release.wait) for _ in range(slots)]
+    try:
+        with ThreadPoolExecutor(max_workers=8) as submitters:
+            submit_results = list(submitters.map(
+                lambda _: pytest.raises(ServiceUnavailableError, password_hashing._submit_to_password_hash_executor,
+                                        release.wait), range(100)))
+        assert len(submit_results)==100
+        assert password_hashing.password_hashing_stats()["rejected"]==rejected + 100
+    finally:
+        release.set()
+    for future in futures:
+        future.result()
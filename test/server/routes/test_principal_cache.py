@@ -0,0 +1,45 @@
+"""
+Tests of the principal cache invalidation of user writes against a repository double, no MongoDB needed:
+    python -m pytest test/server/routes/test_principal_cache.py
+"""
+from unittest import mock
+import pytest
+from src.db.repository import Repository
+from src.server.flask.exceptions import DatabaseError
+from src.server.routes.principal_cache import PrincipalCache, PrincipalCacheRepository
+
+
+@pytest.fixture
+def principal_cache():
+    principal_cache = PrincipalCache()
+    principal_cache.put("user", ["post_user"], principal_cache.generation)
+    return principal_cache
+
+
+def test_user_writes_invalidate_cached_roles(principal_cache):
+    wrapped_repository = mock.Mock(spec=Repository)
+    principal_cache_repository = PrincipalCacheRepository(wrapped_repository, principal_cache)
+    for write in (lambda: principal_cache_repository.add_user_role("user", "comment_user"),
+                  lambda: principal_cache_repository.remove_user_role("user", "post_user"),
+                  lambda: principal_cache_repository.update_user_details_blog("user", name="name"),
+                  lambda: principal_cache_repository.delete_user_blog("user")):
+        principal_cache.put("user", ["post_user"], principal_cache.generation)
+        write()
+        assert principal_cache.get("user") is None
+    wrapped_repository.add_user_role.assert_called_once_with("user", "comment_user")
+
+
+def test_failed_user_write_invalidates_cached_roles(principal_cache):
+    wrapped_repository = mock.Mock(spec=Repository)
+    wrapped_repository.add_user_role.side_effect = DatabaseError
+    with pytest.raises(DatabaseError):
+        PrincipalCacheRepository(wrapped_repository, principal_cache).add_user_role("user", "comment_user")
+    assert principal_cache.get("user") is None
+
+
+def test_roles_read_before_an_invalidation_are_not_cached(principal_cache):
+    generation = principal_cache.generation
+    principal_cache.invalidate("user")
+    principal_cache.put("user", ["post_user"], generation)
+    assert principal_cache.get("user") is None
+    assert principal_cache.stats()["stale_puts"]==1